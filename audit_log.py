@@ -0,0 +1,686 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import zlib
+
+from logger import BufferedLogger
+from metrics import timed
+from storage import atomic_write, fsync, quarantine_lines
+
+INDEXED_FIELDS = ("isbn", "user_id")
+SEGMENT_NAME = re.compile(r"^audit-(\d{8})\.(log|log\.z|idx|ent)$")
+DEFAULT_SEGMENT_BYTES = 64 * 2**20
+DEFAULT_BLOCK_BYTES = 64 * 2**10
+BLOOM_BITS_PER_ENTRY = 10  # about 1% false positives with BLOOM_HASHES hashes
+BLOOM_HASHES = 7
+ENTITY_BUCKET_SIZE = 256  # values per '.ent' bucket, so a lookup reads a few kilobytes
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _hashes(field, value):
+    digest = hashlib.blake2b(f"{field}\0{value}".encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def _bloom_positions(hashes, bits):
+    first, second = hashes
+    return [(first + i * second) % bits for i in range(BLOOM_HASHES)]
+
+
+def _bloom_and_buckets(entities):
+    """
+    Builds a Bloom filter over a segment's indexed values and splits its entity
+    map into hash buckets.
+
+    Parameters:
+    entities (dict): Field -> value -> block numbers, as kept by Segment.
+
+    Returns:
+    tuple: The filter as bytes, its size in bits, and the buckets as a list of
+        entity maps holding the values that hash to them.
+    """
+    count = sum(len(values) for values in entities.values())
+    bits = max(64, BLOOM_BITS_PER_ENTRY * count)
+    bloom = bytearray((bits + 7) // 8)
+    buckets = [{} for _ in range(max(1, count // ENTITY_BUCKET_SIZE))]
+    for field, values in entities.items():
+        for value, blocks in values.items():
+            hashes = _hashes(field, value)
+            for position in _bloom_positions(hashes, bits):
+                bloom[position >> 3] |= 1 << (position & 7)
+            buckets[hashes[0] % len(buckets)].setdefault(field, {})[value] = blocks
+    return bytes(bloom), bits, buckets
+
+
+def _path(directory, number, suffix):
+    return os.path.join(directory, f"audit-{number:08d}.{suffix}")
+
+
+class Segment:
+    def __init__(self, directory, number, codec="none"):
+        """
+        Initializes the index of one audit log segment.
+
+        A segment's records are grouped into blocks of about DEFAULT_BLOCK_BYTES.
+        Each block is listed with its position in the file and the earliest and
+        latest timestamp it holds, which is the segment's sparse timestamp index.
+        The entity map lists, for each ISBN and user ID, the blocks that mention it.
+        Sealed segments keep the entity map in a separate '.ent' file split into
+        hash buckets, and a lookup reads the one bucket that can hold the value,
+        only when the segment's Bloom filter says the value may be present.
+
+        Parameters:
+        directory (str): The audit log directory.
+        number (int): The segment number.
+        codec (str): 'none' for a plain JSON Lines file, 'zlib' when each block is
+            compressed on its own.
+        """
+        self.directory = directory
+        self.number = number
+        self.codec = codec
+        self.blocks = []  # [offset, length, first time, last time, records]
+        self.records = 0
+        self.size = 0  # bytes written to the file, while the segment is active
+        self.first = None
+        self.last = None
+        self.entities = None  # field -> value -> block numbers, while the segment is active
+        self.entity_buckets = []  # [offset, length] of each bucket in the '.ent' file
+        self.bloom = None
+        self.bloom_bits = 0
+
+    @property
+    def path(self):
+        return _path(self.directory, self.number, "log.z" if self.codec == "zlib" else "log")
+
+    @classmethod
+    def load(cls, directory, number):
+        """
+        Reads a sealed segment's index file.
+
+        Returns:
+        Segment: The segment, without its entity map.
+        """
+        with open(_path(directory, number, "idx")) as f:
+            data = json.load(f)
+        segment = cls(directory, number, data["codec"])
+        segment.blocks = data["blocks"]
+        segment.records = data["records"]
+        segment.first, segment.last = data["first"], data["last"]
+        segment.bloom = base64.b64decode(data["bloom"])
+        segment.bloom_bits = data["bloom_bits"]
+        segment.entity_buckets = data["entity_buckets"]
+        return segment
+
+    def add(self, timestamp, fields, offset, length, block_bytes):
+        """
+        Indexes a record appended to the segment's file.
+
+        Parameters:
+        timestamp (float): The record's Unix time.
+        fields (dict): The record's structured fields.
+        offset (int): The record's position in the file.
+        length (int): The record's size in bytes.
+        block_bytes (int): The size at which a new block is started.
+        """
+        block = self.blocks[-1] if self.blocks else None
+        if block is None or block[1] >= block_bytes:
+            block = [offset, 0, timestamp, timestamp, 0]
+            self.blocks.append(block)
+        block[1] = offset + length - block[0]
+        if timestamp < block[2]:
+            block[2] = timestamp
+        if timestamp > block[3]:
+            block[3] = timestamp
+        block[4] += 1
+        self.records += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+        number = len(self.blocks) - 1
+        for field in INDEXED_FIELDS:
+            value = fields.get(field)
+            if value is not None:
+                blocks = self.entities[field].setdefault(str(value), [])
+                if not blocks or blocks[-1] != number:
+                    blocks.append(number)
+
+    def entity_blocks(self, field, value):
+        """
+        Returns the numbers of the blocks that mention a field's value.
+
+        Parameters:
+        field (str): One of INDEXED_FIELDS.
+        value (str): The value to look up.
+
+        Returns:
+        list: The block numbers, in order; empty if the value is not in the segment.
+        """
+        if self.entities is not None:
+            return self.entities[field].get(value, [])
+        hashes = _hashes(field, value)
+        if not all(self.bloom[position >> 3] & (1 << (position & 7))
+                   for position in _bloom_positions(hashes, self.bloom_bits)):
+            return []
+        offset, length = self.entity_buckets[hashes[0] % len(self.entity_buckets)]
+        with open(_path(self.directory, self.number, "ent"), 'rb') as f:
+            f.seek(offset)
+            bucket = json.loads(f.read(length))
+        return bucket.get(field, {}).get(value, [])
+
+    def seal(self):
+        """
+        Writes the segment's entity map and then its index file, which marks it
+        sealed, and drops the in-memory entity map.
+        """
+        self.bloom, self.bloom_bits, buckets = _bloom_and_buckets(self.entities)
+        chunks = [_encode(bucket).encode() for bucket in buckets]
+        self.entity_buckets = []
+        offset = 0
+        for chunk in chunks:
+            self.entity_buckets.append([offset, len(chunk)])
+            offset += len(chunk)
+        atomic_write(_path(self.directory, self.number, "ent"), b"".join(chunks))
+        self.write_index()
+        self.entities = None
+
+    def write_index(self):
+        """
+        Writes the segment's index file: its codec, block table and Bloom filter.
+        """
+        atomic_write(_path(self.directory, self.number, "idx"), _encode({
+            "codec": self.codec, "records": self.records, "first": self.first, "last": self.last,
+            "blocks": self.blocks, "bloom": base64.b64encode(self.bloom).decode(), "bloom_bits": self.bloom_bits,
+            "entity_buckets": self.entity_buckets,
+        }))
+
+    def read_block(self, fd, number):
+        """
+        Reads one block of records.
+
+        Parameters:
+        fd (int): An open descriptor of the segment's file.
+        number (int): The block number.
+
+        Returns:
+        bytes: The block's JSON Lines records.
+        """
+        offset, length = self.blocks[number][:2]
+        data = os.pread(fd, length, offset)
+        return zlib.decompress(data) if self.codec == "zlib" else data
+
+
+class AuditLog:
+    def __init__(self, directory="audit", max_segment_bytes=DEFAULT_SEGMENT_BYTES, max_segment_age=None,
+                 block_bytes=DEFAULT_BLOCK_BYTES, compress=True, read_only=False):
+        """
+        Initializes a rotating, indexed log of structured records.
+
+        Records are appended as JSON Lines to the active segment,
+        'audit-<number>.log'. The segment is sealed once it reaches
+        `max_segment_bytes` or is `max_segment_age` seconds old: its index is
+        written and a new segment is started. A background thread then rewrites
+        sealed segments with every block compressed on its own, so a query still
+        reads only the blocks it needs. An active segment left behind by a crash is
+        re-indexed on startup, and a torn final line is cut off.
+
+        A read-only log, as opened by the command line, never changes the files or
+        creates the directory, so it can be queried while another process is writing.
+
+        Parameters:
+        directory (str): Where the segments are kept. Created if missing.
+        max_segment_bytes (int): The size at which the active segment is sealed.
+        max_segment_age (float, optional): Seconds after which the active segment
+            is sealed, checked on each append. Defaults to size-based rotation only.
+        block_bytes (int): The uncompressed size of the blocks a query reads.
+        compress (bool): Whether sealed segments are compressed.
+        read_only (bool): Only query the log; append() is not allowed.
+
+        Raises:
+        FileNotFoundError: If the log is read-only and the directory does not exist.
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.block_bytes = block_bytes
+        self.compress = compress and not read_only
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._compressions = queue.Queue()
+        self._compressor = None
+        if read_only and not os.path.isdir(directory):
+            raise FileNotFoundError(f"No audit log directory at {directory}")
+        os.makedirs(directory, exist_ok=True)
+        numbers = {}
+        for name in os.listdir(directory):
+            match = SEGMENT_NAME.match(name)
+            if match:
+                numbers.setdefault(int(match.group(1)), set()).add(match.group(2))
+        self._segments = []  # sealed, oldest first
+        unsealed = []
+        for number in sorted(numbers):
+            if "idx" in numbers[number]:
+                segment = Segment.load(directory, number)
+                if segment.codec == "zlib" and "log" in numbers[number] and not read_only:
+                    os.remove(_path(directory, number, "log"))  # compressed before a crash
+                self._segments.append(segment)
+                if segment.codec == "none" and self.compress:
+                    self._schedule(segment)
+            elif "log" in numbers[number]:
+                unsealed.append(number)
+        for number in unsealed[:-1]:
+            segment = self._recover(number)
+            if read_only:
+                self._segments.append(segment)
+            else:
+                self._seal(segment)
+        self._active = self._recover(unsealed[-1]) if unsealed else self._new_segment(
+            (max(numbers) + 1) if numbers else 1)
+
+    def _new_segment(self, number):
+        segment = Segment(self.directory, number)
+        segment.entities = {field: {} for field in INDEXED_FIELDS}
+        return segment
+
+    def _recover(self, number):
+        """
+        Re-indexes an unsealed segment from its file, cutting off a torn final line
+        unless the log is read-only. Any other unparsable line is left out of the
+        index; unless the log is read-only it is also moved to '<segment>.corrupt'
+        (see storage.quarantine_lines) and the segment is indexed again.
+
+        Parameters:
+        number (int): The segment number.
+
+        Returns:
+        Segment: The segment with its entity map in memory.
+        """
+        segment = self._new_segment(number)
+        path = segment.path
+        damaged = []
+        offset = 0
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    if not self.read_only:
+                        print(f"Discarding incomplete record at the end of {path}.")
+                        os.truncate(path, offset)
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    print(f"Skipping unreadable line {line_number} of {path}: {e}")
+                    damaged.append((offset, len(line)))
+                else:
+                    segment.add(record["time"], record, offset, len(line), self.block_bytes)
+                offset += len(line)
+        if damaged and not self.read_only:
+            quarantine_lines(path, damaged)
+            return self._recover(number)
+        segment.size = offset
+        return segment
+
+    def _seal(self, segment):
+        """
+        Writes a segment's index and queues it for compression.
+
+        Parameters:
+        segment (Segment): The segment, no longer appended to.
+        """
+        segment.seal()
+        self._segments.append(segment)
+        if self.compress:
+            self._schedule(segment)
+
+    def _schedule(self, segment):
+        if self._compressor is None:
+            self._compressor = threading.Thread(target=self._run_compressor, name=f"audit-{self.directory}",
+                                                daemon=True)
+            self._compressor.start()
+        self._compressions.put(segment.number)
+
+    def _run_compressor(self):
+        while True:
+            number = self._compressions.get()
+            if number is None:
+                return
+            try:
+                self._compress(number)
+            except (IOError, ValueError) as e:
+                print(f"An error occurred while compressing audit segment {number}: {e}")
+            finally:
+                self._compressions.task_done()
+
+    @timed("audit_compress")
+    def _compress(self, number):
+        """
+        Rewrites a sealed segment with each block compressed, then removes the plain file.
+
+        Parameters:
+        number (int): The segment number.
+        """
+        with self._lock:
+            segment = next((s for s in self._segments if s.number == number and s.codec == "none"), None)
+        if segment is None:
+            return
+        compressed = Segment(self.directory, number, "zlib")
+        for name in ("records", "first", "last", "bloom", "bloom_bits", "entity_buckets"):
+            setattr(compressed, name, getattr(segment, name))
+        temp_file = f"{compressed.path}.tmp"
+        fd = os.open(segment.path, os.O_RDONLY)
+        try:
+            with open(temp_file, 'wb') as f:
+                for block in range(len(segment.blocks)):
+                    data = zlib.compress(segment.read_block(fd, block))
+                    compressed.blocks.append([f.tell(), len(data)] + segment.blocks[block][2:])
+                    f.write(data)
+                f.flush()
+                fsync(f.fileno())
+        finally:
+            os.close(fd)
+        os.replace(temp_file, compressed.path)
+        compressed.write_index()
+        with self._lock:
+            self._segments = [compressed if s.number == number else s for s in self._segments]
+        os.remove(segment.path)
+
+    def wait_for_compression(self):
+        """
+        Blocks until every queued segment has been compressed.
+        """
+        if self._compressor is not None:
+            self._compressions.join()
+
+    @timed("audit_append")
+    def append(self, entries):
+        """
+        Appends records to the active segment, sealing it when it is full or old.
+
+        Parameters:
+        entries (iterable): (timestamp, fields, line) tuples, where line is the
+            record's JSON text ending with a newline.
+        """
+        if self.read_only:
+            raise IOError(f"The audit log in {self.directory} was opened read-only")
+        with self._lock:
+            segment = self._active
+            chunks = []
+            size = segment.size
+            for timestamp, fields, line in entries:
+                data = line.encode()
+                segment.add(timestamp, fields, size, len(data), self.block_bytes)
+                size += len(data)
+                chunks.append(data)
+                if size >= self.max_segment_bytes:
+                    self._write(segment, chunks, size)
+                    chunks = []
+                    segment = self._rotate()
+                    size = 0
+            if chunks:
+                self._write(segment, chunks, size)
+            if (self.max_segment_age is not None and segment.records
+                    and time.time() - segment.first >= self.max_segment_age):
+                self._rotate()
+
+    def _write(self, segment, chunks, size):
+        with open(segment.path, 'ab') as f:
+            f.write(b"".join(chunks))
+        segment.size = size
+
+    def _rotate(self):
+        """
+        Seals the active segment and starts the next one.
+
+        Returns:
+        Segment: The new active segment.
+        """
+        with self._lock:
+            self._seal(self._active)
+            self._active = self._new_segment(self._active.number + 1)
+            return self._active
+
+    def rotate(self):
+        """
+        Seals the active segment now, unless it is empty.
+        """
+        with self._lock:
+            if self._active.records:
+                self._rotate()
+
+    def close(self):
+        """
+        Waits for pending compressions and stops the compressor. The active segment
+        stays unsealed and is re-indexed when the log is opened again.
+        """
+        if self._compressor is not None:
+            self._compressions.put(None)
+            self._compressor.join()
+            self._compressor = None
+
+    def segments(self):
+        """
+        Describes the segments, oldest first.
+
+        Returns:
+        list: One dict per segment with its number, codec, record count, file size,
+            first and last timestamps, and whether it is the active segment.
+        """
+        with self._lock:
+            segments = list(self._segments) + [self._active]
+        described = []
+        for segment in segments:
+            try:
+                size = os.path.getsize(segment.path)
+            except FileNotFoundError:
+                size = 0
+            described.append({"number": segment.number, "codec": segment.codec, "records": segment.records,
+                              "bytes": size, "first": segment.first, "last": segment.last,
+                              "active": segment is segments[-1]})
+        return described
+
+    def _candidate_blocks(self, segment, start, end, filters):
+        """
+        Returns the numbers of a segment's blocks that may hold matching records.
+        """
+        blocks = None
+        for field, value in filters.items():
+            if field not in INDEXED_FIELDS:
+                continue
+            found = set(segment.entity_blocks(field, value))
+            if not found:
+                return []
+            blocks = found if blocks is None else blocks & found
+        numbers = range(len(segment.blocks)) if blocks is None else sorted(blocks)
+        return [number for number in numbers
+                if (start is None or segment.blocks[number][3] >= start)
+                and (end is None or segment.blocks[number][2] < end)]
+
+    def _read_blocks(self, segment, numbers):
+        """
+        Yields the records of a segment's blocks as lines of JSON.
+
+        The active segment is read while holding the lock so that no append is half
+        written. A sealed segment that was compressed meanwhile is read from its new
+        file.
+        """
+        if segment is self._active:
+            with self._lock:
+                if segment is self._active:
+                    fd = os.open(segment.path, os.O_RDONLY)
+                    try:
+                        chunks = [segment.read_block(fd, number) for number in numbers]
+                    finally:
+                        os.close(fd)
+                    for chunk in chunks:
+                        yield from chunk.splitlines()
+                    return
+        try:
+            fd = os.open(segment.path, os.O_RDONLY)
+        except FileNotFoundError:
+            segment = Segment.load(self.directory, segment.number)
+            fd = os.open(segment.path, os.O_RDONLY)
+        try:
+            for number in numbers:
+                yield from segment.read_block(fd, number).splitlines()
+        finally:
+            os.close(fd)
+
+    def query(self, start=None, end=None, limit=None, **filters):
+        """
+        Yields the records in a time range that match every filter, oldest segment first.
+
+        Segments and blocks outside the time range are skipped using their
+        timestamps. ISBN and user ID filters also skip the segments whose Bloom
+        filter rules the value out, and the blocks that do not mention it. Only
+        the remaining blocks are read and decompressed.
+
+        Parameters:
+        start (float, optional): The earliest Unix time to include.
+        end (float, optional): The Unix time to stop before.
+        limit (int, optional): The maximum number of records to return.
+        **filters: Field -> required value (e.g., isbn='978...', event='check_out').
+
+        Returns:
+        iterator: The matching records as dicts.
+        """
+        # Lines that do not contain the filtered strings are skipped before parsing.
+        needles = [_encode(value).encode() for value in filters.values() if isinstance(value, str)]
+        filters = {field: str(value) if field in INDEXED_FIELDS else value for field, value in filters.items()}
+        found = 0
+        with self._lock:
+            segments = list(self._segments) + [self._active]
+        for segment in segments:
+            if segment.records == 0 or (start is not None and segment.last < start) or (
+                    end is not None and segment.first >= end):
+                continue
+            if segment.entities is None:
+                blocks = self._candidate_blocks(segment, start, end, filters)
+            else:
+                with self._lock:  # the active segment's entity map is still growing
+                    blocks = self._candidate_blocks(segment, start, end, filters)
+            for line in self._read_blocks(segment, blocks):
+                if not all(needle in line for needle in needles):
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # an unreadable line left in place by a read-only log
+                if start is not None and record["time"] < start or end is not None and record["time"] >= end:
+                    continue
+                if any((str(record.get(field)) if field in INDEXED_FIELDS else record.get(field)) != value
+                       for field, value in filters.items()):
+                    continue
+                yield record
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+
+class AuditLogger(BufferedLogger):
+    def __init__(self, directory="audit", batch_size=100, flush_interval=1.0, max_queue=100000, **options):
+        """
+        Initializes a Logger that writes structured records to an AuditLog.
+
+        Each record is a JSON object with the time (Unix seconds), the level, the
+        message and the structured fields passed to log() or log_custom(). Records
+        are queued and written in batches like BufferedLogger's.
+
+        Parameters:
+        directory (str): The audit log directory.
+        batch_size (int): Number of queued records that triggers a write.
+        flush_interval (float): Maximum number of seconds a record waits in the queue.
+        max_queue (int): Records arriving while this many are queued are dropped.
+        **options: Further AuditLog arguments (e.g., max_segment_bytes, max_segment_age).
+        """
+        self.audit = AuditLog(directory, **options)
+        super().__init__(directory, batch_size, flush_interval, max_queue)
+
+    def _emit(self, log_type, message, fields):
+        now = time.time()
+        record = {"time": now, "level": log_type or "INFO", "message": message}
+        record.update(fields)
+        self._write((now, fields, _encode(record) + "\n"))
+
+    @timed("logging_io")
+    def _write_lines(self, entries):
+        try:
+            self.audit.append(entries)
+        except IOError as e:
+            print(f"An error occurred while writing to the audit log: {e}")
+
+    def close(self):
+        """
+        Flushes the queued records and stops the background writer and compressor.
+        """
+        super().close()
+        self.audit.close()
+
+    def query(self, start=None, end=None, limit=None, **filters):
+        """
+        Flushes the queued records and queries the audit log; see AuditLog.query.
+        """
+        self.flush()
+        return self.audit.query(start, end, limit, **filters)
+
+    def stats(self):
+        """
+        Returns the logger's record counters and the audit log's size.
+
+        Returns:
+        dict: BufferedLogger.stats() plus the number of segments, records and bytes.
+        """
+        stats = super().stats()
+        segments = self.audit.segments()
+        stats.update(segments=len(segments), records=sum(s["records"] for s in segments),
+                     bytes=sum(s["bytes"] for s in segments))
+        return stats
+
+
+def _timestamp(text):
+    """Parses an ISO date or date and time in local time as a Unix timestamp."""
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Query the library's audit log.")
+    parser.add_argument("directory", help="the audit log directory")
+    parser.add_argument("--since", type=_timestamp, help="earliest time, ISO format (e.g. 2024-05-01)")
+    parser.add_argument("--until", type=_timestamp, help="time to stop before, ISO format")
+    parser.add_argument("--isbn")
+    parser.add_argument("--user", help="user ID")
+    parser.add_argument("--event", help="e.g. check_out, check_in, hold_placed")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--json", action="store_true", help="print the records as JSON Lines")
+    parser.add_argument("--segments", action="store_true", help="list the segments instead of querying")
+    args = parser.parse_args(argv)
+
+    try:
+        audit = AuditLog(args.directory, read_only=True)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if args.segments:
+        for segment in audit.segments():
+            first = datetime.datetime.fromtimestamp(segment["first"]) if segment["first"] else "-"
+            last = datetime.datetime.fromtimestamp(segment["last"]) if segment["last"] else "-"
+            print(f"{segment['number']:8d} {segment['codec']:<5}{segment['records']:>10} records"
+                  f"{segment['bytes'] / 2**20:10.1f} MB   {first} .. {last}{'   (active)' if segment['active'] else ''}")
+        return
+    filters = {name: value for name, value in (("isbn", args.isbn), ("user_id", args.user), ("event", args.event))
+               if value is not None}
+    for record in audit.query(args.since, args.until, args.limit, **filters):
+        if args.json:
+            print(_encode(record))
+        else:
+            print(f"{datetime.datetime.fromtimestamp(record['time'])} [{record['level']}] - {record['message']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,150 @@
+"""
+Measures writing and querying the segmented audit log.
+
+Run from the repository root:
+    python -m benchmarks.bench_audit_log [lines] [--keep DIR]
+
+Writes `lines` records (default 50M) spread over a year through
+AuditLog.append in batches, as AuditLogger's background writer does. ISBNs and
+users follow a Zipf-like popularity. The run reports the write rate and the
+size on disk, then times entity and time-range queries against a full scan
+that decompresses every segment and searches it for the ISBN, the way grep
+would. The log is written to a temporary directory unless --keep is given.
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from audit_log import AuditLog
+from logger import Logger
+
+DEFAULT_LINES = 50_000_000
+BATCH = 1_000
+BOOKS = 1_000_000
+USERS = 100_000
+YEAR = 365 * 86_400
+START = 1_704_067_200.0  # 2024-01-01 UTC
+EVENTS = ["check_out", "check_in", "hold_placed", "hold_ready", "update_book", "add_book"]
+EVENT_WEIGHTS = [40, 38, 8, 6, 5, 3]
+
+
+def isbn(number):
+    return f"978{number:010d}"
+
+
+def write(directory, lines, seed=1):
+    """Writes the synthetic log and returns the seconds taken by the appends and by the whole run."""
+    rng = random.Random(seed)
+    book_weights = list(itertools.accumulate(1 / rank ** 0.9 for rank in range(1, BOOKS + 1)))
+    user_weights = list(itertools.accumulate(1 / rank ** 0.7 for rank in range(1, USERS + 1)))
+    event_weights = list(itertools.accumulate(EVENT_WEIGHTS))
+    step = YEAR / lines
+    audit = AuditLog(directory)
+    start = time.perf_counter()
+    for first in range(0, lines, BATCH):
+        count = min(BATCH, lines - first)
+        books = rng.choices(range(BOOKS), cum_weights=book_weights, k=count)
+        users = rng.choices(range(USERS), cum_weights=user_weights, k=count)
+        events = rng.choices(EVENTS, cum_weights=event_weights, k=count)
+        entries = []
+        for offset in range(count):
+            timestamp = START + (first + offset) * step
+            fields = {"event": events[offset], "isbn": isbn(books[offset]), "user_id": f"U{users[offset]:06d}"}
+            line = (f'{{"time":{timestamp},"level":"INFO","message":"Book {fields["event"]}: {fields["isbn"]}",'
+                    f'"event":"{fields["event"]}","isbn":"{fields["isbn"]}","user_id":"{fields["user_id"]}"}}\n')
+            entries.append((timestamp, fields, line))
+        audit.append(entries)
+        if first % 1_000_000 == 0 and first:
+            print(f"  {first:>11,} lines   {first / (time.perf_counter() - start):9,.0f} lines/s", flush=True)
+    audit.rotate()
+    written = time.perf_counter() - start
+    audit.wait_for_compression()
+    audit.close()
+    return written, time.perf_counter() - start
+
+
+def timed_query(audit, **query):
+    start = time.perf_counter()
+    records = sum(1 for _ in audit.query(**query))
+    return records, time.perf_counter() - start
+
+
+def full_scan(audit, needle):
+    """Decompresses every segment and counts the lines containing a string, as grep would."""
+    start = time.perf_counter()
+    matches = 0
+    for segment in list(audit._segments):
+        fd = os.open(segment.path, os.O_RDONLY)
+        try:
+            for number in range(len(segment.blocks)):
+                matches += sum(1 for line in segment.read_block(fd, number).splitlines() if needle in line)
+        finally:
+            os.close(fd)
+    return matches, time.perf_counter() - start
+
+
+def log_call_cost(directory):
+    """Compares the cost of one log() call for the text logger and the audit logger."""
+    from audit_log import AuditLogger
+
+    results = {}
+    for label, logger in (("text Logger", Logger(os.path.join(directory, "text.log"))),
+                          ("AuditLogger", AuditLogger(os.path.join(directory, "calls")))):
+        start = time.perf_counter()
+        for number in range(20_000):
+            logger.log(f"Book checked out: {number}", event="check_out", isbn=isbn(number), user_id="U000001")
+        if hasattr(logger, "close"):
+            logger.close()  # waits for the queued records to be written
+        results[label] = (time.perf_counter() - start) / 20_000 * 1e6
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the segmented audit log.")
+    parser.add_argument("lines", type=int, nargs="?", default=DEFAULT_LINES)
+    parser.add_argument("--keep", help="write the log to this directory and keep it")
+    args = parser.parse_args(argv)
+
+    workdir = args.keep or tempfile.mkdtemp()
+    try:
+        directory = os.path.join(workdir, "audit")
+        print(f"Writing {args.lines:,} lines")
+        written, compressed = write(directory, args.lines)
+        audit = AuditLog(directory, read_only=True)
+        segments = audit.segments()
+        size = sum(segment["bytes"] for segment in segments)
+        print(f"Wrote {args.lines / written:,.0f} lines/s ({written:.0f} s), compression done after {compressed:.0f} s")
+        print(f"{len(segments)} segments, {size / 2**20:,.0f} MB on disk, {size / args.lines:.1f} bytes per line")
+
+        popular, rare, user = isbn(0), isbn(BOOKS // 2), "U000042"
+        month = (START + 5 * YEAR / 12, START + 6 * YEAR / 12)
+        queries = [
+            ("checkouts of a popular ISBN, one month", dict(start=month[0], end=month[1], isbn=popular,
+                                                            event="check_out")),
+            ("checkouts of a rare ISBN, one month", dict(start=month[0], end=month[1], isbn=rare, event="check_out")),
+            ("every record of a rare ISBN", dict(isbn=rare)),
+            ("one user's records, one month", dict(start=month[0], end=month[1], user_id=user)),
+            ("one hour of records", dict(start=month[0], end=month[0] + 3600)),
+        ]
+        print(f"{'':<42}{'records':>10}{'time':>12}")
+        for label, query in queries:
+            records, seconds = timed_query(audit, **query)
+            print(f"  {label:<40}{records:>10,}{seconds * 1e3:10.1f} ms")
+        matches, seconds = full_scan(audit, f'"isbn":"{rare}"'.encode())
+        print(f"  {'full scan for a rare ISBN (grep)':<40}{matches:>10,}{seconds * 1e3:10.1f} ms")
+
+        print("Cost of one log() call, including the background writer's share:")
+        for label, microseconds in log_call_cost(workdir).items():
+            print(f"  {label:<14}{microseconds:8.2f} us")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
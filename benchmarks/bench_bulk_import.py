@@ -0,0 +1,95 @@
+"""
+Compares bulk imports with adding records one at a time.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_import [size ...]
+
+Each run writes a CSV feed of books (with 5% repeated ISBNs, which increment
+counts) and a JSON Lines feed of users, then imports them with add_books_bulk
+and add_users_bulk. The one-at-a-time figure is measured on the first
+SAMPLE records with add_book, since a full run takes quadratic time on the
+JSON engine.
+"""
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bulk_import import read_records
+from check import Library
+from journal import JournalStorage
+from sqlite_storage import SQLiteStorage
+from storage import Storage
+
+DEFAULT_SIZES = [100_000]
+SAMPLE = 300
+GENRES = ["Fantasy", "History", "Mystery", "Poetry", "Romance", "Science"]
+ENGINES = {
+    "json": lambda workdir: Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")),
+    "journal": lambda workdir: JournalStorage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")),
+    "sqlite": lambda workdir: SQLiteStorage(os.path.join(workdir, "library.db")),
+}
+
+
+def write_feeds(size, workdir):
+    books_path = os.path.join(workdir, "books.csv")
+    with open(books_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "author", "isbn", "genre"])
+        for i in range(size):
+            n = i if i % 20 else i // 2  # every 20th row repeats an earlier ISBN
+            writer.writerow([f"Title {n}", f"Author {n % 1000}", f"isbn-{n}", GENRES[n % len(GENRES)]])
+    users_path = os.path.join(workdir, "users.jsonl")
+    with open(users_path, "w") as f:
+        for i in range(size):
+            f.write(json.dumps({"user_id": f"user-{i}", "name": f"User {i}", "location": "City"}) + "\n")
+    return books_path, users_path
+
+
+def run(name, size, workdir):
+    books_path, users_path = write_feeds(size, workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        library = Library(ENGINES[name](os.path.join(workdir, name)))
+        start = time.perf_counter()
+        books = library.add_books_bulk(read_records(books_path))
+        users = library.add_users_bulk(read_records(users_path))
+        bulk_seconds = time.perf_counter() - start
+
+        library = Library(ENGINES[name](os.path.join(workdir, name + "-single")))
+        start = time.perf_counter()
+        for record in itertools.islice(read_records(books_path), SAMPLE):
+            library.add_book(record.pop("title"), record.pop("author"), record.pop("isbn"), **record)
+        single_ms = (time.perf_counter() - start) / SAMPLE * 1000
+
+    if hasattr(library.storage, "close"):
+        library.storage.close()
+    assert books["added"] + books["incremented"] == size and users["added"] == size
+    return bulk_seconds, single_ms
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        print(f"{size} books and {size} users")
+        for name in ENGINES:
+            with tempfile.TemporaryDirectory() as workdir:
+                os.mkdir(os.path.join(workdir, name))
+                os.mkdir(os.path.join(workdir, name + "-single"))
+                cwd = os.getcwd()
+                os.chdir(workdir)  # keep the log files out of the repository
+                try:
+                    bulk_seconds, single_ms = run(name, size, workdir)
+                finally:
+                    os.chdir(cwd)
+            records = 2 * size
+            print(f"  {name:<8} bulk {bulk_seconds:7.2f} s ({records / bulk_seconds:9.0f} records/s)   "
+                  f"one at a time {single_ms:8.3f} ms/record (first {SAMPLE})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
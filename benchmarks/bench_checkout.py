@@ -0,0 +1,75 @@
+"""
+Measures check_out_book/check_in_book latency as the catalog grows.
+
+Run from the repository root:
+    python -m benchmarks.bench_checkout [size ...]
+
+Storage writes are replaced by a no-op so the numbers reflect the in-memory
+lookup path only; the cost of persisting the catalog is benchmarked separately.
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from book import Book
+from catalog import Catalog
+from check import Library
+from storage import Storage
+from user import User
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+OPERATIONS = 10_000
+
+
+class NullStorage(Storage):
+    def save_books(self, books):
+        pass
+
+    def save_users(self, users):
+        pass
+
+    def save_loan_batch(self, opened, closed, loans):
+        pass
+
+
+def build_library(size):
+    books = Catalog((Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", count=OPERATIONS)
+                     for i in range(size)), key="isbn")
+    users = Catalog((User(f"user-{i}", f"User {i}") for i in range(max(size // 10, 1))), key="user_id")
+    return Library(NullStorage(), books=books, users=users)
+
+
+def run(size):
+    library = build_library(size)
+    rng = random.Random(size)
+    isbns = [f"isbn-{rng.randrange(size)}" for _ in range(OPERATIONS)]
+    user_ids = [f"user-{rng.randrange(max(size // 10, 1))}" for _ in range(OPERATIONS)]
+
+    start = time.perf_counter()
+    for isbn, user_id in zip(isbns, user_ids):
+        library.check_out_book(isbn, user_id)
+        library.check_in_book(isbn, user_id)
+    elapsed = time.perf_counter() - start
+    return elapsed / (OPERATIONS * 2) * 1e6
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    latency = run(size)
+                print(f"{size:>10} books: {latency:8.2f} us per checkout/check-in")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
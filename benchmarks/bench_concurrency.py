@@ -0,0 +1,107 @@
+"""
+Stress-tests concurrent checkouts and check-ins and measures throughput.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrency [operations per thread] [json|journal]
+
+Threads repeatedly check out and return copies of a small set of popular
+titles. The run fails if a count goes negative, if more copies are handed out
+than exist, or if the stored catalog disagrees with memory afterwards.
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from check import Library
+from journal import JournalStorage
+from storage import Storage
+
+THREAD_COUNTS = [1, 4, 16]
+TITLES = 20
+COPIES = 3
+DEFAULT_OPERATIONS = 2_000
+ENGINES = {"json": Storage, "journal": JournalStorage}
+
+
+def open_library(engine, workdir):
+    return Library(ENGINES[engine](os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")))
+
+
+def worker(library, seed, operations, errors):
+    rng = random.Random(seed)
+    held = []
+    for _ in range(operations):
+        if held and rng.random() < 0.5:
+            library.check_in_book(held.pop(rng.randrange(len(held))), f"user-{seed}")
+            continue
+        isbn = f"isbn-{rng.randrange(TITLES)}"
+        if library.check_out_book(isbn, f"user-{seed}"):
+            held.append(isbn)
+        count = library.books.get(isbn).count
+        if not 0 <= count <= COPIES:
+            errors.append(f"{isbn} count out of range: {count}")
+    for isbn in held:
+        library.check_in_book(isbn, f"user-{seed}")
+
+
+def run(thread_count, operations, engine, workdir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        library = open_library(engine, workdir)
+        for i in range(TITLES):
+            for _ in range(COPIES):
+                library.add_book(f"Title {i}", f"Author {i}", f"isbn-{i}")
+        for seed in range(thread_count):
+            library.add_user(f"user-{seed}", f"User {seed}")
+        writes_before = library.book_writer.stats()
+
+        errors = []
+        threads = [threading.Thread(target=worker, args=(library, seed, operations, errors))
+                   for seed in range(thread_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        writes_after = library.book_writer.stats()
+        for book in library.books:
+            if book.count != COPIES:
+                errors.append(f"{book.isbn} ended with {book.count} copies instead of {COPIES}")
+        reloaded = open_library(engine, workdir)
+        for book in reloaded.books:
+            if book.count != library.books.get(book.isbn).count:
+                errors.append(f"{book.isbn} stored count {book.count} differs from memory")
+
+    records = writes_after["records"] - writes_before["records"]
+    flushes = writes_after["batches"] - writes_before["batches"]
+    return thread_count * operations / elapsed, records, flushes, errors
+
+
+def main(argv):
+    operations = int(argv[0]) if argv else DEFAULT_OPERATIONS
+    engine = argv[1] if len(argv) > 1 else "journal"
+    failed = False
+    for thread_count in THREAD_COUNTS:
+        with tempfile.TemporaryDirectory() as workdir:
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                throughput, records, flushes, errors = run(thread_count, operations, engine, workdir)
+            finally:
+                os.chdir(cwd)
+        print(f"{thread_count:>3} threads: {throughput:9.0f} ops/s, {records} writes in {flushes} flushes"
+              f"{'' if not errors else f', {len(errors)} errors'}")
+        for error in errors[:5]:
+            print(f"    {error}")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+"""
+Measures the cost of persisting one checkout with the JSON storage engine.
+
+Run from the repository root:
+    python -m benchmarks.bench_delta_save [size ...]
+
+"before" reproduces the previous save_books, which converted every book with
+to_dict() and pretty-printed the whole list. "after" is the current Storage,
+which re-serializes only the books changed since the last save, shown with the
+default indented output and the compact mode.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from book import Book
+from storage import Storage
+
+DEFAULT_SIZES = [500_000]
+CHECKOUTS = 5
+
+
+def legacy_save_books(path, books):
+    with open(path, 'w') as f:
+        json.dump([book.to_dict() for book in books], f, indent=4)
+
+
+def checkout_cost(books, save):
+    start = time.perf_counter()
+    for i in range(CHECKOUTS):
+        book = books[i * 7919 % len(books)]
+        book.count -= 1
+        book.available = book.count > 0
+        save(book)
+    return (time.perf_counter() - start) / CHECKOUTS * 1000
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        books = [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", count=10, genre="Fiction", year=1900 + i % 120)
+                 for i in range(size)]
+        print(f"{size} books")
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "books.json")
+            before = checkout_cost(books, lambda book: legacy_save_books(path, books))
+            print(f"  before            {before:9.1f} ms per checkout   {os.path.getsize(path) / 2**20:6.1f} MB file")
+            for label, indent in [("after", 4), ("after, compact", None)]:
+                storage = Storage(path, os.path.join(workdir, "users.json"), indent=indent)
+                start = time.perf_counter()
+                storage.save_books(books)  # fills the fragment cache
+                first = (time.perf_counter() - start) * 1000
+                cost = checkout_cost(books, lambda book: storage.save_book(book, books))
+                print(f"  {label:<17} {cost:9.1f} ms per checkout   {os.path.getsize(path) / 2**20:6.1f} MB file"
+                      f"   (first save {first:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
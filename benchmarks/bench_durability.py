@@ -0,0 +1,84 @@
+"""
+Compares checkout latency under each storage durability level.
+
+Run from the repository root:
+    python -m benchmarks.bench_durability [books] [operations per thread]
+
+Threads check books out and back in through a Library; every mutation is
+persisted according to the durability level. "always" fsyncs before each call
+returns (concurrent calls share a write through the library's writers),
+"interval" writes in the background every 50 ms, and "shutdown" writes only
+when the storage is closed, which is included in the elapsed time.
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from book import Book
+from catalog import Catalog
+from check import Library
+from journal import JournalStorage
+from storage import DURABILITY_LEVELS, Storage
+
+DEFAULT_BOOKS = 10_000
+DEFAULT_OPERATIONS = 200
+THREADS = 8
+ENGINES = {"json": Storage, "journal": JournalStorage}
+
+
+def worker(library, seed, operations, size, latencies):
+    rng = random.Random(seed)
+    for _ in range(operations):
+        isbn = f"isbn-{rng.randrange(size)}"
+        start = time.perf_counter()
+        library.check_out_book(isbn, "user-0")
+        library.check_in_book(isbn, "user-0")
+        latencies.append((time.perf_counter() - start) / 2)
+
+
+def run(engine, durability, size, operations, workdir):
+    storage = ENGINES[engine](os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json"),
+                              durability=durability)
+    books = Catalog((Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", count=5) for i in range(size)), key="isbn")
+    with contextlib.redirect_stdout(io.StringIO()):
+        library = Library(storage, books=books, users=())
+        library.add_user("user-0", "User 0")
+        storage.save_books(library.books)
+        latencies = []
+        threads = [threading.Thread(target=worker, args=(library, seed, operations, size, latencies))
+                   for seed in range(THREADS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        storage.close()
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main(argv):
+    size = int(argv[0]) if argv else DEFAULT_BOOKS
+    operations = int(argv[1]) if len(argv) > 1 else DEFAULT_OPERATIONS
+    print(f"{size} books, {THREADS} threads x {operations} checkouts and check-ins")
+    for engine in ENGINES:
+        for durability in DURABILITY_LEVELS:
+            with tempfile.TemporaryDirectory() as workdir:
+                cwd = os.getcwd()
+                os.chdir(workdir)  # keep the log files out of the repository
+                try:
+                    throughput, p50, p99 = run(engine, durability, size, operations, workdir)
+                finally:
+                    os.chdir(cwd)
+            print(f"  {engine:<8} {durability:<9} {throughput:9.0f} ops/s   p50 {p50 * 1000:8.3f} ms"
+                  f"   p99 {p99 * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,86 @@
+"""
+Compares Library() startup time and peak memory for JSON and lazy JSON Lines storage.
+
+Run from the repository root:
+    python -m benchmarks.bench_lazy_load [size ...]
+
+Each measurement runs in a fresh interpreter so peak RSS is not shared.
+"""
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def write_books(workdir, size):
+    from book import Book
+    from lazy_storage import LazyStorage
+
+    books = [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i:09d}", genre="Fiction", year=1900 + i % 120)
+             for i in range(size)]
+    with open(os.path.join(workdir, "books.json"), 'w') as f:
+        json.dump([book.to_dict() for book in books], f, indent=4)
+    LazyStorage(os.path.join(workdir, "books.jsonl"), os.path.join(workdir, "users.json")).save_books(books)
+
+
+def peak_rss_kb():
+    # ru_maxrss survives fork+exec on Linux, so prefer the per-process high-water mark.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(engine, workdir):
+    os.chdir(workdir)
+    baseline = peak_rss_kb()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from check import Library
+        from lazy_storage import LazyStorage
+        from storage import Storage
+
+        start = time.perf_counter()
+        library = Library(LazyStorage() if engine == "lazy" else Storage())
+        startup = time.perf_counter() - start
+        start = time.perf_counter()
+        library.books.get("isbn-000012345")
+        lookup = time.perf_counter() - start
+    peak = peak_rss_kb() - baseline
+    print(json.dumps({"startup_ms": startup * 1000, "lookup_ms": lookup * 1000, "peak_mb": peak / 1024}))
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            write_books(workdir, size)
+            print(f"{size} books")
+            # The first lazy run writes books.jsonl.idx; the second one reuses it.
+            for label, engine in [("json", "json"), ("lazy (index build)", "lazy"), ("lazy", "lazy")]:
+                if label == "lazy (index build)":
+                    os.remove(os.path.join(workdir, "books.jsonl.idx"))
+                output = subprocess.run([sys.executable, "-m", "benchmarks.bench_lazy_load", "--measure", engine, workdir],
+                                        capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+                result = json.loads(output)
+                print(f"  {label:<19} Library() {result['startup_ms']:9.1f} ms   first lookup "
+                      f"{result['lookup_ms']:7.3f} ms   peak RSS +{result['peak_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        sys.path.insert(0, os.getcwd())
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,115 @@
+"""
+Compares sorted, paginated listing against sorting the whole catalog per page.
+
+Run from the repository root:
+    python -m benchmarks.bench_listing [size ...]
+
+For each catalog size the first page, a page deep into the listing (reached by
+cursor) and a filtered page are fetched through Library.list_books_page, and
+the same pages are produced by sorting and filtering every book. Building the
+sorted index is timed separately; it happens once, on the first request for a
+sort order and filter combination. The cost of keeping the index current is
+shown as the time per title update.
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from book import BOOK_SORT_ORDERS, Book
+from catalog import Catalog
+from check import Library
+from storage import Storage
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+PAGE = 50
+PAGES = 200
+UPDATES = 2_000
+GENRES = ["Fiction", "Poetry", "History", "Science"]
+
+
+class NullStorage(Storage):
+    def save_books(self, books):
+        pass
+
+    def save_users(self, users):
+        pass
+
+
+def best(function, rounds=3):
+    """Returns the best time of several calls in microseconds."""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return min(timings)
+
+
+def sort_everything(books, sort, offset, genre=None):
+    """Produces a page the way a caller without sorted indexes would."""
+    key = BOOK_SORT_ORDERS[sort]
+    matching = [book for book in books if genre is None or book.additional_attributes.get("genre") == genre]
+    matching.sort(key=lambda book: (key(book), book.isbn))
+    return matching[offset:offset + PAGE]
+
+
+def run(size):
+    rng = random.Random(size)
+    books = Catalog((Book(f"Title {rng.randrange(size)}", f"Author {rng.randrange(size // 10 + 1)}", f"isbn-{i}",
+                          count=rng.randrange(1, 5), genre=rng.choice(GENRES)) for i in range(size)), key="isbn")
+    library = Library(NullStorage(), books=books, users=Catalog(key="user_id"))
+
+    start = time.perf_counter()
+    library.list_books_page(PAGE, sort="title")
+    build = time.perf_counter() - start
+    library.list_books_page(PAGE, sort="title", attributes={"genre": "Poetry"})
+
+    def deep_page():
+        cursor = None
+        for _ in range(PAGES):
+            _, cursor = library.list_books_page(PAGE, cursor, "title")
+
+    isbns = [f"isbn-{rng.randrange(size)}" for _ in range(UPDATES)]
+
+    def updates():
+        for number, isbn in enumerate(isbns):
+            library.update_book(isbn, new_title=f"Revised {number}")
+
+    rows = [
+        ("first page", best(lambda: library.list_books_page(PAGE, sort="title")),
+         best(lambda: sort_everything(books, "title", 0), 1)),
+        (f"page {PAGES}", best(deep_page) / PAGES, best(lambda: sort_everything(books, "title", PAGE * PAGES), 1)),
+        ("filtered page", best(lambda: library.list_books_page(PAGE, sort="title", attributes={"genre": "Poetry"})),
+         best(lambda: sort_everything(books, "title", 0, "Poetry"), 1)),
+    ]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with_indexes = best(updates, 1) / UPDATES
+        for index in list(library.book_manager.listing._indexes.values()):
+            books.remove_index(index)
+        library.book_manager.listing._indexes.clear()
+        without_indexes = best(updates, 1) / UPDATES
+
+    print(f"{size} books: sorted index built in {build * 1e3:.0f} ms")
+    print(f"  {'':<16}{'indexed':>14}{'sort all':>14}{'speedup':>10}")
+    for label, indexed, naive in rows:
+        print(f"  {label:<16}{indexed:11.1f} us{naive:11.0f} us{naive / indexed:9.0f}x")
+    print(f"  update_book     {with_indexes:11.1f} us with two sorted indexes, {without_indexes:.1f} us without")
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep the log files out of the repository
+        try:
+            for size in sizes:
+                run(size)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,153 @@
+"""
+Measures the loan ledger as its history grows to millions of loans.
+
+Run from the repository root:
+    python -m benchmarks.bench_loans [historical loans] [persisted loans]
+
+A simulated clock advances while loans are opened and, once OPEN loans are out,
+the oldest is returned, so the ledger always holds OPEN open loans while the
+history grows. At each checkpoint "loans for user", "holders of ISBN" and
+"overdue as of T" are timed through the ledger's indexes and, for comparison,
+by scanning the open loans. Query time through the indexes follows the result
+size and stays flat as the history grows.
+
+The loan log is then measured separately on a smaller history: appending
+through Storage.save_loan_batch and loading the open loans back.
+"""
+import collections
+import os
+import random
+import sys
+import tempfile
+import time
+
+from loans import LOAN_PERIOD, Loan, LoanLedger
+from storage import Storage
+
+DEFAULT_HISTORY = 10_000_000
+DEFAULT_PERSISTED = 1_000_000
+OPEN = 100_000
+USERS = 50_000
+TITLES = 200_000
+QUERIES = 1_000
+BATCH = 100
+STEP = 60.0  # simulated seconds between checkouts
+
+
+def simulate(ledger, count, rng, clock, outstanding, on_change=None):
+    """Opens `count` loans, returning the oldest open loan whenever OPEN are out."""
+    for _ in range(count):
+        clock += STEP
+        loan = Loan(f"user-{rng.randrange(USERS)}", f"isbn-{rng.randrange(TITLES)}", clock,
+                    clock + LOAN_PERIOD * rng.uniform(0.5, 1.5))
+        ledger.open(loan)
+        outstanding.append(loan)
+        if on_change:
+            on_change(loan)
+        if len(outstanding) > OPEN:
+            oldest = outstanding.popleft()
+            closed = ledger.close(oldest.isbn, oldest.user_id, clock)
+            if on_change and closed:
+                on_change(closed)
+    return clock
+
+
+def time_queries(ledger, rng, clock):
+    users = [f"user-{rng.randrange(USERS)}" for _ in range(QUERIES)]
+    isbns = [f"isbn-{rng.randrange(TITLES)}" for _ in range(QUERIES)]
+    open_loans = list(ledger)
+    as_of = sorted(loan.due_at for loan in open_loans)[len(open_loans) // 100]  # 1% are overdue
+
+    results = {}
+    start = time.perf_counter()
+    found = sum(len(ledger.loans_for_user(user_id)) for user_id in users)
+    indexed = (time.perf_counter() - start) / QUERIES
+    start = time.perf_counter()
+    for user_id in users[:20]:
+        [loan for loan in open_loans if loan.user_id == user_id]
+    results["loans for user"] = (indexed, (time.perf_counter() - start) / 20, found / QUERIES)
+
+    start = time.perf_counter()
+    found = sum(len(ledger.holders_of(isbn)) for isbn in isbns)
+    indexed = (time.perf_counter() - start) / QUERIES
+    start = time.perf_counter()
+    for isbn in isbns[:20]:
+        [loan for loan in open_loans if loan.isbn == isbn]
+    results["holders of ISBN"] = (indexed, (time.perf_counter() - start) / 20, found / QUERIES)
+
+    start = time.perf_counter()
+    for _ in range(20):
+        found = len(ledger.overdue(as_of))
+    indexed = (time.perf_counter() - start) / 20
+    start = time.perf_counter()
+    for _ in range(5):
+        sorted((loan for loan in open_loans if loan.due_at < as_of), key=lambda loan: loan.due_at)
+    results["overdue as of T"] = (indexed, (time.perf_counter() - start) / 5, found)
+    return results
+
+
+def run_ledger(history):
+    rng = random.Random(history)
+    ledger = LoanLedger()
+    outstanding = collections.deque()
+    clock = 0.0
+    done = 0
+    checkpoints = sorted({min(history, 1_000_000), history})
+    print(f"Ledger: {history} historical loans, {OPEN} open at a time")
+    for checkpoint in checkpoints:
+        start = time.perf_counter()
+        clock = simulate(ledger, checkpoint - done, rng, clock, outstanding)
+        elapsed = time.perf_counter() - start
+        print(f"  after {checkpoint} loans: {elapsed / max(checkpoint - done, 1) * 1e6:.1f} us per checkout"
+              f" and return, {len(ledger)} open")
+        done = checkpoint
+        for name, (indexed, scan, size) in time_queries(ledger, rng, clock).items():
+            print(f"    {name:<16} indexed {indexed * 1e6:10.1f} us   scan {scan * 1e6:10.1f} us"
+                  f"   {size:8.1f} results")
+
+
+def run_storage(persisted):
+    rng = random.Random(persisted)
+    print(f"Storage: {persisted} historical loans through the JSON loan log")
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json"),
+                          durability="shutdown")
+        ledger = LoanLedger()
+        pending = {}
+
+        def on_change(loan):
+            pending[loan.loan_id] = loan
+            if len(pending) >= BATCH:
+                flush()
+
+        def flush():
+            changed = list(pending.values())
+            pending.clear()
+            storage.save_loan_batch([loan for loan in changed if loan.returned_at is None],
+                                    [loan for loan in changed if loan.returned_at is not None], ledger)
+
+        start = time.perf_counter()
+        simulate(ledger, persisted, rng, 0.0, collections.deque(), on_change)
+        flush()
+        storage.close()
+        elapsed = time.perf_counter() - start
+        print(f"  {elapsed / persisted * 1e6:.1f} us per loan including its log entries, batches of {BATCH}")
+        for name in (storage.loans_file, storage.loan_history_file):
+            print(f"  {os.path.basename(name):<22} {os.path.getsize(name) / 2**20:8.1f} MB")
+
+        start = time.perf_counter()
+        loaded = storage.load_loans()
+        elapsed = time.perf_counter() - start
+        print(f"  load: {len(loaded)} open loans in {elapsed * 1000:.0f} ms")
+        assert sorted(loan.loan_id for loan in loaded) == sorted(loan.loan_id for loan in ledger)
+
+
+def main(argv):
+    history = int(argv[0]) if argv else DEFAULT_HISTORY
+    persisted = int(argv[1]) if len(argv) > 1 else DEFAULT_PERSISTED
+    run_ledger(history)
+    run_storage(persisted)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,40 @@
+"""
+Compares the per-call cost of Logger and BufferedLogger.
+
+Run from the repository root:
+    python -m benchmarks.bench_logger [records]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from logger import BufferedLogger, Logger
+
+DEFAULT_RECORDS = 100_000
+
+
+def run(logger, records):
+    start = time.perf_counter()
+    for i in range(records):
+        logger.log(f"Book checked out: Title {i} by Author {i % 1000} (ISBN: isbn-{i})")
+    call_time = time.perf_counter() - start
+    if isinstance(logger, BufferedLogger):
+        logger.close()
+    total_time = time.perf_counter() - start
+    return call_time / records * 1e6, total_time
+
+
+def main(argv):
+    records = int(argv[0]) if argv else DEFAULT_RECORDS
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, logger in [("Logger", Logger(os.path.join(workdir, "plain.log"))),
+                             ("BufferedLogger", BufferedLogger(os.path.join(workdir, "buffered.log")))]:
+            per_call, total = run(logger, records)
+            print(f"{name:<15} {per_call:8.2f} us per log() call, {total:6.2f} s until all {records} records are on disk")
+            if isinstance(logger, BufferedLogger):
+                print(f"{'':<15} {logger.stats()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
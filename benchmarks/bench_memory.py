@@ -0,0 +1,85 @@
+"""
+Measures the memory held by Book and User records with tracemalloc.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory [size ...]
+
+The dict-based classes below reproduce the previous Book/User layout for comparison.
+"""
+import gc
+import sys
+import tracemalloc
+
+from book import Book
+from user import User
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+GENRES = ["Fantasy", "History", "Mystery", "Poetry", "Romance", "Science"]
+
+
+class DictBook:
+    def __init__(self, title, author, isbn, count=1, available=True, **kwargs):
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.count = count
+        self.available = available
+        self.additional_attributes = kwargs
+
+    @classmethod
+    def from_dict(cls, data):
+        isbn = data.pop("isbn")
+        title = data.pop("title")
+        author = data.pop("author")
+        count = data.pop("count", 1)
+        available = data.pop("available", True)
+        return cls(title, author, isbn, count, available, **data)
+
+
+class DictUser:
+    def __init__(self, user_id, name, **kwargs):
+        self.user_id = user_id
+        self.name = name
+        self.additional_attributes = kwargs
+
+    @classmethod
+    def from_dict(cls, data):
+        user_id = data.pop("user_id")
+        name = data.pop("name")
+        return cls(user_id, name, **data)
+
+
+def book_rows(size):
+    for i in range(size):
+        yield {"title": f"Title {i}", "author": f"Author {i % 1000}", "isbn": f"isbn-{i}",
+               "count": 1, "available": True, "genre": GENRES[i % len(GENRES)], "year": 1900 + i % 120}
+
+
+def user_rows(size):
+    for i in range(size):
+        yield {"user_id": f"user-{i}", "name": f"User {i}", "location": "City"}
+
+
+def measure(cls, rows):
+    gc.collect()
+    tracemalloc.start()
+    records = [cls.from_dict(row) for row in rows]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        print(f"{size} records")
+        for label, old_cls, new_cls, rows in [("books", DictBook, Book, book_rows), ("users", DictUser, User, user_rows)]:
+            before = measure(old_cls, rows(size))
+            after = measure(new_cls, rows(size))
+            print(f"  {label:<6} dict-based {before / size:7.1f} B/record   "
+                  f"compact {after / size:7.1f} B/record   ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,109 @@
+"""
+Measures the cost of the instrumentation and shows the report it produces.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics [size]
+
+Checkouts and check-ins against an in-memory catalog are timed three ways: with
+the timed() wrappers bypassed, with instrumentation disabled and with it
+enabled. A short session against the JSON storage then prints the per-operation
+latencies and the serialization, file I/O, fsync and logging breakdown.
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from book import Book
+from catalog import Catalog
+from check import Library
+from metrics import metrics
+from storage import Storage
+from user import User
+
+DEFAULT_SIZE = 100_000
+OPERATIONS = 20_000
+ROUNDS = 3
+
+
+class NullStorage(Storage):
+    def save_books(self, books):
+        pass
+
+    def save_users(self, users):
+        pass
+
+    def save_loan_batch(self, opened, closed, loans):
+        pass
+
+
+def circulate(check_out, check_in, isbns, user_ids):
+    start = time.perf_counter()
+    for isbn, user_id in zip(isbns, user_ids):
+        check_out(isbn, user_id)
+        check_in(isbn, user_id)
+    return (time.perf_counter() - start) / (len(isbns) * 2) * 1e6
+
+
+def run_overhead(size):
+    books = Catalog((Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", count=OPERATIONS)
+                     for i in range(size)), key="isbn")
+    users = Catalog((User(f"user-{i}", f"User {i}") for i in range(1000)), key="user_id")
+    library = Library(NullStorage(), books=books, users=users)
+    rng = random.Random(size)
+    isbns = [f"isbn-{rng.randrange(size)}" for _ in range(OPERATIONS)]
+    user_ids = [f"user-{rng.randrange(1000)}" for _ in range(OPERATIONS)]
+
+    bare = (Library.check_out_book.__wrapped__.__get__(library), Library.check_in_book.__wrapped__.__get__(library))
+    wrapped = (library.check_out_book, library.check_in_book)
+    timings = {"unwrapped": [], "disabled": [], "enabled": []}
+    print(f"{size} books, {OPERATIONS} checkouts and check-ins, best of {ROUNDS} rounds")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        circulate(*bare, isbns, user_ids)  # warm up
+        for _ in range(ROUNDS):
+            timings["unwrapped"].append(circulate(*bare, isbns, user_ids))
+            timings["disabled"].append(circulate(*wrapped, isbns, user_ids))
+            metrics.enable()
+            timings["enabled"].append(circulate(*wrapped, isbns, user_ids))
+            metrics.disable()
+    metrics.reset()
+    timings = {label: min(runs) for label, runs in timings.items()}
+    for label, per_call in timings.items():
+        print(f"  {label:<10} {per_call:7.2f} us per call   {per_call - timings['unwrapped']:+6.2f} us")
+
+
+def run_session():
+    storage = Storage("books.json", "users.json")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        library = Library(storage)
+        metrics.enable()
+        library.add_books_bulk({"title": f"Title {i}", "author": f"Author {i % 100}", "isbn": f"isbn-{i}"}
+                               for i in range(10_000))
+        library.add_users_bulk({"user_id": f"user-{i}", "name": f"User {i}"} for i in range(100))
+        for i in range(200):
+            library.check_out_book(f"isbn-{i}", f"user-{i % 100}")
+            library.search_books(f"Author {i % 100}", "author")
+            library.check_in_book(f"isbn-{i}", f"user-{i % 100}")
+        storage.load_books()
+        storage.load_users()
+        metrics.disable()
+    print("\nJSON storage session, durability 'always'")
+    print(metrics.report())
+
+
+def main(argv):
+    size = int(argv[0]) if argv else DEFAULT_SIZE
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep the data and log files out of the repository
+        try:
+            run_overhead(size)
+            run_session()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+"""
+Measures full-catalog scans split across worker processes.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel_search [size] [workers ...]
+
+Books carry a genre and a publisher besides title, author and ISBN, so queries
+on additional attributes and on every field scan more text than the indexed
+ones. Each query is timed three ways: the naive loop that lowercases every
+value, the prepared shard in this process (the per-shard work of one worker),
+and ParallelScanner with each number of workers. Worker startup, which loads
+the shards once, is reported separately from the per-query time.
+
+Speedup over one worker needs as many idle cores as workers; on a machine with
+fewer cores the extra workers only add dispatch overhead.
+"""
+import os
+import random
+import sys
+import time
+
+from book import Book
+from parallel_search import ParallelScanner, _Shard
+
+DEFAULT_SIZE = 1_000_000
+DEFAULT_WORKERS = [1, 2, 4, 8]
+REPEAT = 5
+WORDS = ["river", "shadow", "garden", "winter", "empire", "silent", "golden", "storm",
+         "night", "ocean", "stone", "forest", "crown", "glass", "iron", "ember"]
+GENRES = ["fantasy", "history", "poetry", "science fiction", "mystery", "biography"]
+QUERIES = [("night", "title"), ("author 42", "author"), ("science", "genre"),
+           ("press 7", "publisher"), ("ember", "")]
+
+
+def build_books(size):
+    rng = random.Random(size)
+    return [Book(" ".join(rng.choice(WORDS) for _ in range(3)), f"Author {rng.randrange(50_000)}", f"isbn-{i}",
+                 genre=rng.choice(GENRES), publisher=f"Press {rng.randrange(1000)}") for i in range(size)]
+
+
+def naive_search(books, keyword, parameter):
+    keyword = keyword.lower()
+    if parameter:
+        return [book.isbn for book in books if keyword in str(book.search_fields().get(parameter, "")).lower()]
+    return [book.isbn for book in books
+            if any(keyword in str(value).lower() for value in book.search_fields().values())]
+
+
+def timed(function, repeat=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(argv):
+    size = int(argv[0]) if argv else DEFAULT_SIZE
+    worker_counts = [int(arg) for arg in argv[1:]] or DEFAULT_WORKERS
+    print(f"{size} books, {os.cpu_count()} CPUs, queries averaged over {REPEAT} runs")
+    books = build_books(size)
+
+    start = time.perf_counter()
+    shard = _Shard([(book.isbn, {field: str(value).lower() for field, value in book.search_fields().items()})
+                    for book in books])
+    print(f"  in-process shard      prepared in {time.perf_counter() - start:6.2f} s")
+    expected = {}
+    for keyword, parameter in QUERIES:
+        naive, expected[keyword] = timed(lambda: naive_search(books, keyword, parameter), 1)
+        prepared, keys = timed(lambda: shard.search(keyword, [parameter] if parameter else None))
+        assert keys == expected[keyword]
+        print(f"    {keyword!r:>12} in {parameter or 'all fields':<10} naive {naive * 1000:8.1f} ms"
+              f"   prepared {prepared * 1000:7.1f} ms   {len(keys)} results")
+    del shard
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        scanner = ParallelScanner(books, "isbn", Book.search_fields, workers)
+        scanner.search("warm up")  # waits until every worker has loaded its shard
+        print(f"  {workers} worker(s)          started in {time.perf_counter() - start:6.2f} s")
+        try:
+            for keyword, parameter in QUERIES:
+                elapsed, (keys, _) = timed(lambda: scanner.search(keyword, parameter))
+                assert keys == expected[keyword]
+                print(f"    {keyword!r:>12} in {parameter or 'all fields':<10} {elapsed * 1000:8.1f} ms")
+        finally:
+            scanner.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+"""
+Compares Library.search_books against the linear scan it replaced.
+
+Run from the repository root:
+    python -m benchmarks.bench_search [size ...]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from book import Book
+from catalog import Catalog
+from check import Library
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+WORDS = ["river", "shadow", "garden", "winter", "empire", "silent", "golden", "storm",
+         "night", "ocean", "stone", "forest", "crown", "glass", "iron", "ember"]
+GENRES = ["Fantasy", "History", "Mystery", "Poetry", "Romance", "Science"]
+QUERIES = [("winter", ""), ("shad", "title"), ("author 42", "author"), ("isbn-12345", "isbn"),
+           ("myst", "genre"), ("golden ember", ""), ("zzz", "")]
+REPEAT = 20
+
+
+def scan(books, keyword, parameter):
+    if parameter in ["title", "author", "isbn"]:
+        return [book for book in books if keyword.lower() in getattr(book, parameter).lower()]
+    if parameter:
+        return [book for book in books if parameter in book.additional_attributes
+                and keyword.lower() in str(book.additional_attributes[parameter]).lower()]
+    return [book for book in books
+            if keyword.lower() in book.title.lower()
+            or keyword.lower() in book.author.lower()
+            or keyword.lower() in book.isbn.lower()
+            or any(keyword.lower() in str(value).lower() for value in book.additional_attributes.values())]
+
+
+def build_books(size):
+    rng = random.Random(size)
+    for i in range(size):
+        title = " ".join(rng.choice(WORDS) for _ in range(3))
+        yield Book(title, f"Author {rng.randrange(5000)}", f"isbn-{i}",
+                   genre=rng.choice(GENRES), year=rng.randint(1900, 2024))
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def run(size):
+    start = time.perf_counter()
+    library = Library(books=Catalog(build_books(size), key="isbn"), users=())
+    index = library.search_index()
+    build_time = time.perf_counter() - start
+    rows = []
+    for keyword, parameter in QUERIES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            matches = len(index.search(keyword, [parameter] if parameter else None))
+            indexed = timed(lambda: index.search(keyword, [parameter] if parameter else None))
+        scanned = timed(lambda: scan(library.books, keyword, parameter)) if size <= 100_000 else float("nan")
+        rows.append((keyword, parameter, matches, indexed, scanned))
+    return build_time, rows
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    build_time, rows = run(size)
+                print(f"{size} books (index built in {build_time:.1f} s)")
+                for keyword, parameter, matches, indexed, scanned in rows:
+                    print(f"  {keyword!r:>14} in {parameter or 'all':<7} {matches:>8} hits  "
+                          f"index {indexed:9.3f} ms  scan {scanned:9.3f} ms")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
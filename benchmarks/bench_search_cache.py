@@ -0,0 +1,116 @@
+"""
+Measures the search result cache under a front-desk style workload.
+
+Run from the repository root:
+    python -m benchmarks.bench_search_cache [size ...]
+
+Searches are drawn from a pool of queries with a Zipf-like popularity, so a few
+authors and title words are asked for over and over. One operation in ten is a
+change: mostly checkouts and check-ins, plus title updates and new books, which
+drop the cached results they affect. Each catalog is run without the cache, with
+the default LRU cache and with a one second TTL.
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from book import Book
+from catalog import Catalog
+from check import Library
+from storage import Storage
+from user import User
+
+DEFAULT_SIZES = [100_000]
+OPERATIONS = 20_000
+POOL = 2_000
+WORDS = ["river", "shadow", "garden", "winter", "empire", "silent", "golden", "storm",
+         "night", "ocean", "stone", "forest", "crown", "glass", "iron", "ember"]
+CONFIGS = [("no cache", {"cache_size": 0}), ("LRU 1024", {}), ("LRU 1024, TTL 1 s", {"cache_ttl": 1.0})]
+
+
+class NullStorage(Storage):
+    def save_books(self, books):
+        pass
+
+    def save_users(self, users):
+        pass
+
+    def save_loan_batch(self, opened, closed, loans):
+        pass
+
+
+def build_library(size, options):
+    rng = random.Random(size)
+    books = Catalog((Book(" ".join(rng.choice(WORDS) for _ in range(3)), f"Author {rng.randrange(5000)}",
+                          f"isbn-{i}", count=5) for i in range(size)), key="isbn")
+    users = Catalog((User(f"user-{i}", f"User {i}") for i in range(100)), key="user_id")
+    library = Library(NullStorage(), books=books, users=users, **options)
+    library.search_index()
+    return library
+
+
+def workload(size, seed):
+    rng = random.Random(seed)
+    pool = ([(f"Author {rng.randrange(5000)}", "author") for _ in range(POOL // 2)]
+            + [(f"{rng.choice(WORDS)} {rng.choice(WORDS)}", "title") for _ in range(POOL // 2)])
+    weights = [1 / (rank + 1) for rank in range(len(pool))]
+    queries = rng.choices(pool, weights, k=OPERATIONS)
+    operations = []
+    for query in queries:
+        if rng.random() < 0.1:
+            kind = rng.choices(["checkout", "update", "add"], [0.7, 0.2, 0.1])[0]
+            operations.append((kind, f"isbn-{rng.randrange(size)}", " ".join(rng.choice(WORDS) for _ in range(3))))
+        else:
+            operations.append(("search",) + query)
+    return operations
+
+
+def run(size, options, operations):
+    library = build_library(size, options)
+    timings = {"search": 0.0, "change": 0.0}
+    counts = {"search": 0, "change": 0}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for operation in operations:
+            start = time.perf_counter()
+            if operation[0] == "search":
+                library.search_books(operation[1], operation[2])
+                kind = "search"
+            else:
+                kind = "change"
+                _, isbn, title = operation
+                if operation[0] == "checkout":
+                    library.check_out_book(isbn, "user-1")
+                    library.check_in_book(isbn, "user-1")
+                elif operation[0] == "update":
+                    library.update_book(isbn, new_title=title)
+                else:
+                    library.add_book(title, "Author New", f"new-{isbn}")
+            timings[kind] += time.perf_counter() - start
+            counts[kind] += 1
+    stats = library.search_cache_stats()["books"]
+    return (timings["search"] / counts["search"] * 1e6, timings["change"] / counts["change"] * 1e6, stats)
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep the log file out of the repository
+        try:
+            for size in sizes:
+                operations = workload(size, size)
+                print(f"{size} books, {OPERATIONS} operations, {POOL} distinct queries")
+                for label, options in CONFIGS:
+                    search, change, stats = run(size, options, operations)
+                    print(f"  {label:<18} search {search:8.1f} us   change {change:6.1f} us"
+                          f"   hit rate {stats['hit_rate']:5.1%}   evictions {stats['evictions']:5}"
+                          f"   invalidations {stats['invalidations']:4}   expirations {stats['expirations']:4}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
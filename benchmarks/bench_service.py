@@ -0,0 +1,121 @@
+"""
+Load-tests the library service and reports latency percentiles and throughput.
+
+Run from the repository root:
+    python -m benchmarks.bench_service [connections] [seconds] [json|journal|sqlite] [batch window ms]
+
+A service is started in a temporary directory and seeded with books and users.
+Each connection then sends a mix of checkouts, check-ins, searches and new
+books over a keep-alive HTTP connection for the given duration.
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_CONNECTIONS = 64
+DEFAULT_SECONDS = 10
+TITLES = 1_000
+USERS = 200
+COPIES = 5
+MIX = [("checkout", 35), ("checkin", 35), ("search", 20), ("add_book", 10)]
+
+
+async def request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                 + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    payload = json.loads(await reader.readexactly(length))
+    return status, payload
+
+
+async def seed(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    for i in range(TITLES):
+        for _ in range(COPIES):
+            await request(reader, writer, "POST", "/books",
+                          {"title": f"Title {i}", "author": f"Author {i % 50}", "isbn": f"isbn-{i}"})
+    for i in range(USERS):
+        await request(reader, writer, "POST", "/users", {"user_id": f"user-{i}", "name": f"User {i}"})
+    writer.close()
+
+
+async def client(host, port, seed_value, deadline, latencies, statuses):
+    rng = random.Random(seed_value)
+    operations = [name for name, weight in MIX for _ in range(weight)]
+    reader, writer = await asyncio.open_connection(host, port)
+    held = []
+    while time.perf_counter() < deadline:
+        operation = rng.choice(operations)
+        if operation == "checkin" and held:
+            isbn, user_id = held.pop()
+            args = ("POST", "/checkin", {"isbn": isbn, "user_id": user_id})
+        elif operation in ("checkout", "checkin"):
+            isbn = f"isbn-{rng.randrange(TITLES)}"
+            args = ("POST", "/checkout", {"isbn": isbn, "user_id": f"user-{rng.randrange(USERS)}"})
+        elif operation == "search":
+            args = ("GET", f"/books/search?q=Title+{rng.randrange(TITLES)}&field=title&limit=10", None)
+        else:
+            args = ("POST", "/books", {"title": f"New {seed_value}", "author": "Load", "isbn": f"new-{seed_value}"})
+        start = time.perf_counter()
+        status, payload = await request(reader, writer, *args)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        if args[1] == "/checkout" and status == 200:
+            held.append((args[2]["isbn"], args[2]["user_id"]))
+    writer.close()
+
+
+async def load(host, port, connections, seconds):
+    await seed(host, port)
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, i, deadline, latencies, statuses) for i in range(connections)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(argv):
+    connections = int(argv[0]) if argv else DEFAULT_CONNECTIONS
+    seconds = float(argv[1]) if len(argv) > 1 else DEFAULT_SECONDS
+    engine = argv[2] if len(argv) > 2 else "journal"
+    window = argv[3] if len(argv) > 3 else "2"
+    service = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "service.py")
+    with tempfile.TemporaryDirectory() as workdir:
+        process = subprocess.Popen([sys.executable, service, "--port", "0", "--engine", engine,
+                                    "--batch-window", window], cwd=workdir, stderr=subprocess.PIPE, text=True)
+        try:
+            address = process.stderr.readline().split()[-1]
+            host, port = address.rsplit(":", 1)
+            latencies, statuses, elapsed = asyncio.run(load(host, int(port), connections, seconds))
+        finally:
+            process.terminate()
+            process.wait()
+
+    latencies.sort()
+    print(f"{engine} engine, {connections} connections, {window} ms batch window")
+    print(f"  {len(latencies)} requests in {elapsed:.1f} s: {len(latencies) / elapsed:.0f} requests/s")
+    print(f"  latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms   p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"  statuses {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+"""
+Compares cold start on the JSON storage with the memory-mapped binary snapshot.
+
+Run from the repository root:
+    python -m benchmarks.bench_snapshot [size ...]
+
+A catalog is generated with benchmarks.generate and converted to a snapshot.
+Each measurement runs in a fresh interpreter, so imports, the mapping and peak
+RSS are not shared between engines. Reported per engine: load_books(),
+Library() startup, the first lookup, the mean of LOOKUPS random lookups and
+availability checks, and the peak RSS added by startup. The files are in the
+page cache, so the times show parsing and object construction rather than disk
+reads.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_lazy_load import peak_rss_kb
+from benchmarks.generate import DEFAULT_SEED, generate_catalog
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+LOOKUPS = 1_000
+
+
+def measure(engine, workdir):
+    os.chdir(workdir)
+    baseline = peak_rss_kb()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from check import Library
+        from snapshot_storage import SnapshotStorage
+        from storage import Storage
+
+        def storage():
+            return SnapshotStorage("books.snap") if engine == "snapshot" else Storage()
+
+        start = time.perf_counter()
+        storage().load_books()
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        library = Library(storage())
+        startup = time.perf_counter() - start
+        with open("isbns.json") as f:
+            isbns = json.load(f)
+        start = time.perf_counter()
+        library.books.get(isbns[0])
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for isbn in isbns:
+            library.book_status(isbn)
+        status = (time.perf_counter() - start) / len(isbns)
+        start = time.perf_counter()
+        for isbn in isbns:
+            library.books.get(isbn)
+        lookup = (time.perf_counter() - start) / len(isbns)
+    peak = peak_rss_kb() - baseline
+    print(json.dumps({"load_ms": load * 1e3, "startup_ms": startup * 1e3, "first_us": first * 1e6,
+                      "status_us": status * 1e6, "lookup_us": lookup * 1e6, "peak_mb": peak / 1024}))
+
+
+def main(argv):
+    from snapshot_storage import convert_json_to_snapshot
+
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            paths = generate_catalog(workdir, size, max(size // 10, 1), DEFAULT_SEED)
+            with open(paths["books"]) as f:
+                isbns = [book["isbn"] for book in json.load(f)]
+            with open(os.path.join(workdir, "isbns.json"), "w") as f:
+                json.dump(random.Random(size).sample(isbns, min(LOOKUPS, len(isbns))), f)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                convert_json_to_snapshot(paths["books"], os.path.join(workdir, "books.snap"))
+            converted = time.perf_counter() - start
+            print(f"{size} books: books.json {os.path.getsize(paths['books']) / 2**20:.1f} MB, "
+                  f"books.snap {os.path.getsize(os.path.join(workdir, 'books.snap')) / 2**20:.1f} MB, "
+                  f"converted in {converted:.1f} s")
+            for engine in ("json", "snapshot"):
+                output = subprocess.run([sys.executable, "-m", "benchmarks.bench_snapshot", "--measure", engine,
+                                         workdir], capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+                result = json.loads(output)
+                print(f"  {engine:<9} load_books {result['load_ms']:9.1f} ms   Library() {result['startup_ms']:9.1f} ms"
+                      f"   first lookup {result['first_us']:7.1f} us   lookup {result['lookup_us']:5.1f} us"
+                      f"   status {result['status_us']:5.1f} us   peak RSS +{result['peak_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        sys.path.insert(0, os.getcwd())
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
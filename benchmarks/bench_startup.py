@@ -0,0 +1,117 @@
+"""
+Measures import time and Library() startup time.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [size ...]
+
+Import time comes from `python -X importtime -c "import check"`. Startup compares
+Library() with the previous mixin-based Library, reproduced below, which built a
+separate storage and logger per manager, loaded books and users one after the
+other and indexed users before the first search. Each measurement runs in a
+fresh interpreter.
+"""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = [100_000, 500_000]
+ENGINES = ["json", "journal", "sqlite"]
+REPEAT = 3
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def open_storage(engine, workdir):
+    if engine == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.path.join(workdir, "library.db"))
+    from journal import JournalStorage
+    from storage import Storage
+    cls = JournalStorage if engine == "journal" else Storage
+    return cls(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json"))
+
+
+def write_data(workdir, size):
+    from book import Book
+    from user import User
+
+    books = [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", genre="Fiction", year=1900 + i % 120)
+             for i in range(size)]
+    users = [User(f"user-{i}", f"User {i}", location="City") for i in range(size // 2)]
+    for engine in ("json", "sqlite"):  # the journal engine reads the JSON snapshot
+        storage = open_storage(engine, workdir)
+        storage.save_books(books)
+        storage.save_users(users)
+
+
+def import_times():
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import check"],
+                            capture_output=True, text=True, check=True, cwd=REPO).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(own), int(cumulative), name.rstrip()))
+    return rows
+
+
+def measure(variant, engine, workdir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        from book import ManageBooks
+        from check import Library
+        from user import ManageUsers
+
+        class MixinLibrary(ManageUsers, ManageBooks):
+            def __init__(self, storage):
+                ManageUsers.__init__(self, storage)
+                self.user_search_index()  # the user index used to be built eagerly
+                ManageBooks.__init__(self, storage)
+
+        cls = Library if variant == "library" else MixinLibrary
+        storage = open_storage(engine, workdir)
+        start = time.perf_counter()
+        library = cls(storage)
+        startup = time.perf_counter() - start
+    assert len(library.books) and len(library.users)
+    print(json.dumps({"startup_ms": startup * 1000}))
+
+
+def run(variant, engine, workdir):
+    best = float("inf")
+    for _ in range(REPEAT):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--measure", variant, engine, workdir],
+                                capture_output=True, text=True, check=True, cwd=REPO).stdout
+        best = min(best, json.loads(output)["startup_ms"])
+    return best
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    rows = import_times()
+    total = next(cumulative for _, cumulative, name in rows if name.strip() == "check")
+    print(f"import check: {total / 1000:.1f} ms; slowest modules (self time):")
+    for own, _, name in sorted(rows, reverse=True)[:5]:
+        print(f"  {own / 1000:7.1f} ms {name.strip()}")
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            write_data(workdir, size)
+            print(f"{size} books and {size // 2} users (best of {REPEAT})")
+            for engine in ENGINES:
+                before = run("mixin", engine, workdir)
+                after = run("library", engine, workdir)
+                print(f"  {engine:<8} mixin Library() {before:9.1f} ms   composed Library() {after:9.1f} ms "
+                      f"  ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        os.chdir(sys.argv[4])  # keep the log files out of the repository
+        sys.path.insert(0, REPO)
+        measure(*sys.argv[2:5])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,62 @@
+"""
+Compares storage engines on single-record writes and cold start.
+
+Run from the repository root:
+    python -m benchmarks.bench_storage [size ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from book import Book
+from journal import JournalStorage
+from sqlite_storage import SQLiteStorage
+from storage import Storage
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+ENGINES = {
+    "json": lambda workdir: Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")),
+    "journal": lambda workdir: JournalStorage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")),
+    "sqlite": lambda workdir: SQLiteStorage(os.path.join(workdir, "library.db")),
+}
+WRITES = {"json": 5, "journal": 500, "sqlite": 500}
+
+
+def run(name, size, workdir):
+    books = [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}", genre="Fiction") for i in range(size)]
+    storage = ENGINES[name](workdir)
+    storage.save_books(books)
+
+    writes = WRITES[name]
+    start = time.perf_counter()
+    for i in range(writes):
+        book = books[i * 7919 % size]
+        book.count += 1
+        storage.save_book(book, books)
+    write_ms = (time.perf_counter() - start) / writes * 1000
+
+    if hasattr(storage, "close"):
+        storage.close()
+    start = time.perf_counter()
+    storage = ENGINES[name](workdir)
+    loaded = storage.load_books()
+    cold_ms = (time.perf_counter() - start) * 1000
+    assert len(loaded) == size
+    if hasattr(storage, "close"):
+        storage.close()
+    return write_ms, cold_ms
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    for size in sizes:
+        print(f"{size} books")
+        for name in ENGINES:
+            with tempfile.TemporaryDirectory() as workdir:
+                write_ms, cold_ms = run(name, size, workdir)
+            print(f"  {name:<8} single write {write_ms:10.3f} ms   cold start {cold_ms:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
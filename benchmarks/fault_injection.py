@@ -0,0 +1,116 @@
+"""
+Kills a process while it saves the catalog and checks what survives on disk.
+
+Run from the repository root:
+    python -m benchmarks.fault_injection [kills] [size]
+
+A child process rewrites every book on each save and reports each save that
+returned. The parent kills it with SIGKILL at a random moment, then loads the
+file and checks that it parses, holds every book from a single save, and is no
+older than the last reported save. The previous truncate-and-write save runs
+the same way for comparison. The run fails if any atomic save is damaged.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_KILLS = 20
+DEFAULT_SIZE = 20_000
+MODES = ["atomic", "truncating"]
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_save_books(path, books):
+    with open(path, 'w') as f:
+        json.dump([book.to_dict() for book in books], f, indent=4)
+
+
+def writer(mode, workdir):
+    from storage import Storage
+
+    storage = Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        books = storage.load_books()
+    generation = books[0].count
+    while True:
+        generation += 1
+        for book in books:
+            book.count = generation
+        if mode == "atomic":
+            storage.save_books(books)
+        else:
+            legacy_save_books(storage.books_file, books)
+        print(generation, flush=True)
+
+
+def check(workdir, size, acknowledged):
+    from storage import Storage
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        books = Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")).load_books()
+    if len(books) != size:
+        messages = "; ".join(output.getvalue().split("\n")).strip("; ")
+        return f"{len(books)} of {size} books loaded ({messages})"
+    generations = {book.count for book in books}
+    if len(generations) != 1:
+        return f"books from {len(generations)} different saves"
+    if generations.pop() < acknowledged:
+        return f"save {acknowledged} was reported but is missing"
+    return None
+
+
+def run(mode, kills, size, rng):
+    from book import Book
+    from storage import Storage
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")).save_books(
+            [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}") for i in range(size)])
+        for _ in range(kills):
+            process = subprocess.Popen([sys.executable, "-m", "benchmarks.fault_injection", "--writer", mode, workdir],
+                                       stdout=subprocess.PIPE, text=True, cwd=REPO)
+            first = int(process.stdout.readline())  # wait for the first save so the kill lands mid-run
+            time.sleep(rng.uniform(0.0, 0.3))
+            process.send_signal(signal.SIGKILL)
+            lines = process.stdout.read().split()
+            process.wait()
+            acknowledged = int(lines[-1]) if lines else first
+            error = check(workdir, size, acknowledged)
+            if error:
+                failures.append(error)
+                if mode == "truncating":
+                    # Start the next round from an intact file.
+                    Storage(os.path.join(workdir, "books.json"), os.path.join(workdir, "users.json")).save_books(
+                        [Book(f"Title {i}", f"Author {i % 1000}", f"isbn-{i}") for i in range(size)])
+    return failures
+
+
+def main(argv):
+    kills = int(argv[0]) if argv else DEFAULT_KILLS
+    size = int(argv[1]) if len(argv) > 1 else DEFAULT_SIZE
+    rng = random.Random(kills)
+    failed = False
+    for mode in MODES:
+        failures = run(mode, kills, size, rng)
+        print(f"{mode:<10} {kills} kills, {len(failures)} damaged or lost saves")
+        for error in failures[:3]:
+            print(f"    {error}")
+        failed = failed or (mode == "atomic" and bool(failures))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--writer"]:
+        sys.path.insert(0, REPO)
+        writer(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
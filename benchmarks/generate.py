@@ -0,0 +1,232 @@
+"""
+Generates synthetic books.json and users.json files for benchmarks.
+
+Run from the repository root:
+    python -m benchmarks.generate <directory> <books> [users] [--seed N] [--jsonl]
+
+The output is deterministic: the same sizes and seed give byte-identical files
+on the same Python version. Files are written in the JSON storage format, one
+record at a time, so 5M books need no more memory than 1k. --jsonl also writes
+books.jsonl and users.jsonl for bulk_import.
+
+The distributions are skewed the way real catalogs are:
+- Title words and publishers follow a Zipf-like popularity.
+- A few authors are prolific and most have one or two books.
+- Most books have one or two copies.
+- Years cluster in recent decades.
+- Optional attributes are present on only part of the records.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+
+from models import format_fragment
+
+DEFAULT_SEED = 2024
+CHUNK = 10_000  # records drawn per batch of weighted choices
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas",
+               "Sarah", "Charles", "Karen", "Aisha", "Wei", "Sofia", "Mateo", "Yuki", "Olga", "Kwame",
+               "Priya", "Lars", "Fatima", "Diego", "Ingrid", "Hiroshi", "Amara", "Luca", "Zara"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore",
+              "Jackson", "Martin", "Lee", "Nakamura", "Okafor", "Ivanova", "Rossi", "Andersen",
+              "Kowalski", "Haddad", "Chen", "Patel", "Nguyen", "Schmidt", "Dubois", "Silva", "Khan"]
+TITLE_WORDS = ["night", "river", "shadow", "house", "garden", "winter", "empire", "silent", "golden",
+               "storm", "ocean", "stone", "forest", "crown", "glass", "iron", "ember", "light", "city",
+               "dream", "secret", "war", "love", "king", "queen", "sea", "fire", "world", "time",
+               "blood", "star", "road", "heart", "moon", "island", "wind", "bone", "letter", "mirror",
+               "summer", "lost", "last", "first", "hidden", "broken", "wild", "distant",
+               "midnight", "north", "memory", "promise", "journey", "kingdom", "daughter", "machine"]
+GENRES = ["Fiction", "Mystery", "Romance", "Fantasy", "Science Fiction", "History", "Biography",
+          "Children", "Poetry", "Self-Help", "Science", "Travel"]
+GENRE_WEIGHTS = [30, 14, 12, 10, 8, 7, 5, 5, 2, 3, 3, 1]
+LANGUAGES = ["English", "Spanish", "French", "German", "Japanese", "Chinese", "Italian"]
+LANGUAGE_WEIGHTS = [70, 8, 6, 5, 4, 4, 3]
+CITIES = ["London", "Paris", "New York", "Tokyo", "Lagos", "Mumbai", "Berlin", "Toronto", "Sydney",
+          "Madrid", "Seoul", "Cairo", "Lima", "Oslo"]
+MEMBERSHIPS = ["standard", "student", "premium", "senior"]
+MEMBERSHIP_WEIGHTS = [60, 20, 12, 8]
+
+
+def _zipf_cumulative(size, exponent=1.0):
+    """Returns cumulative weights for ranks 1..size with weight 1 / rank**exponent."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def _isbn(number):
+    """Returns a valid ISBN-13 for a number below 10**9, scrambled so ISBNs do not follow insertion order."""
+    digits = f"978{(number * 7_919 + 104_729) % 10 ** 9:09d}"
+    check = -sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits)) % 10
+    return f"{digits}{check}"
+
+
+def _person(number):
+    """Returns a distinct name for each number, adding middle initials once first and last names run out."""
+    number, first = divmod(number, len(FIRST_NAMES))
+    number, last = divmod(number, len(LAST_NAMES))
+    initials = ""
+    while number:
+        number, letter = divmod(number - 1, 26)
+        initials += f"{chr(ord('A') + letter)}. "
+    return f"{FIRST_NAMES[first]} {initials}{LAST_NAMES[last]}"
+
+
+def generate_books(size, seed=DEFAULT_SEED):
+    """
+    Yields book dictionaries in the format of Book.to_dict().
+
+    Parameters:
+    size (int): The number of books.
+    seed (int): The random seed.
+
+    Returns:
+    iterator: The books, with unique ISBNs.
+    """
+    rng = random.Random(f"books-{seed}")
+    authors = [_person(number) for number in range(max(size // 8, 50))]
+    rng.shuffle(authors)
+    author_weights = _zipf_cumulative(len(authors), 0.8)
+    publishers = [f"{rng.choice(LAST_NAMES)} {rng.choice(['Press', 'Books', 'House', 'Publishing'])}"
+                  for _ in range(500)]
+    publisher_weights = _zipf_cumulative(len(publishers))
+    word_weights = _zipf_cumulative(len(TITLE_WORDS), 0.8)
+    genre_weights = list(itertools.accumulate(GENRE_WEIGHTS))
+    language_weights = list(itertools.accumulate(LANGUAGE_WEIGHTS))
+    for start in range(0, size, CHUNK):
+        chunk = min(CHUNK, size - start)
+        chosen_authors = rng.choices(authors, cum_weights=author_weights, k=chunk)
+        for offset in range(chunk):
+            words = rng.choices(TITLE_WORDS, cum_weights=word_weights, k=rng.choice((1, 2, 2, 3, 3, 4, 5)))
+            if len(words) > 2 and rng.random() < 0.3:
+                title = f"The {words[0].title()} of {' '.join(words[1:]).title()}"
+            else:
+                title = " ".join(words).title()
+            count = min(1 + int(rng.expovariate(1.2)), 20)
+            book = {"title": title, "author": chosen_authors[offset], "isbn": _isbn(start + offset),
+                    "count": count, "available": rng.random() > 0.03}
+            if rng.random() < 0.85:
+                book["genre"] = rng.choices(GENRES, cum_weights=genre_weights)[0]
+            if rng.random() < 0.7:
+                book["year"] = max(1800, 2024 - int(rng.expovariate(1 / 15)))
+            if rng.random() < 0.5:
+                book["publisher"] = rng.choices(publishers, cum_weights=publisher_weights)[0]
+            if rng.random() < 0.2:
+                book["language"] = rng.choices(LANGUAGES, cum_weights=language_weights)[0]
+            if rng.random() < 0.4:
+                book["pages"] = int(rng.lognormvariate(5.6, 0.45))
+            yield book
+
+
+def generate_users(size, seed=DEFAULT_SEED):
+    """
+    Yields user dictionaries in the format of User.to_dict().
+
+    Parameters:
+    size (int): The number of users.
+    seed (int): The random seed.
+
+    Returns:
+    iterator: The users, with unique user IDs.
+    """
+    rng = random.Random(f"users-{seed}")
+    membership_weights = list(itertools.accumulate(MEMBERSHIP_WEIGHTS))
+    for number in range(size):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user = {"user_id": f"U{number:07d}", "name": f"{first} {last}"}
+        if rng.random() < 0.4:
+            user["location"] = rng.choice(CITIES)
+        if rng.random() < 0.3:
+            user["membership"] = rng.choices(MEMBERSHIPS, cum_weights=membership_weights)[0]
+        if rng.random() < 0.2:
+            user["email"] = f"{first}.{last}{number}@example.org".lower()
+        yield user
+
+
+def write_json(path, records, indent=4):
+    """
+    Writes records as a JSON list in the format Storage saves, without holding them all.
+
+    Parameters:
+    path (str): The file to write.
+    records (iterable): The record dictionaries.
+    indent (int, optional): The indentation Storage is configured with.
+
+    Returns:
+    int: The number of records written.
+    """
+    written = 0
+    with open(path, "w") as f:
+        for record in records:
+            f.write(("[\n" if not written else ",\n") + format_fragment(record, indent))
+            written += 1
+        f.write("\n]" if written else "[]")
+    return written
+
+
+def write_jsonl(path, records):
+    """
+    Writes records as JSON Lines, the format bulk_import reads.
+
+    Parameters:
+    path (str): The file to write.
+    records (iterable): The record dictionaries.
+
+    Returns:
+    int: The number of records written.
+    """
+    written = 0
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            written += 1
+    return written
+
+
+def generate_catalog(directory, books, users, seed=DEFAULT_SEED, jsonl=False):
+    """
+    Writes books.json and users.json, and optionally their JSON Lines twins, to a directory.
+
+    Parameters:
+    directory (str): Where to write the files. It is created if missing.
+    books (int): The number of books.
+    users (int): The number of users.
+    seed (int): The random seed.
+    jsonl (bool): Also write books.jsonl and users.jsonl.
+
+    Returns:
+    dict: The paths written, keyed by 'books', 'users' and, with jsonl, 'books_jsonl'
+        and 'users_jsonl'.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {"books": os.path.join(directory, "books.json"), "users": os.path.join(directory, "users.json")}
+    write_json(paths["books"], generate_books(books, seed))
+    write_json(paths["users"], generate_users(users, seed))
+    if jsonl:
+        paths["books_jsonl"] = os.path.join(directory, "books.jsonl")
+        paths["users_jsonl"] = os.path.join(directory, "users.jsonl")
+        write_jsonl(paths["books_jsonl"], generate_books(books, seed))
+        write_jsonl(paths["users_jsonl"], generate_users(users, seed))
+    return paths
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Generate a synthetic library catalog.")
+    parser.add_argument("directory", help="where to write books.json and users.json")
+    parser.add_argument("books", type=int, help="number of books")
+    parser.add_argument("users", type=int, nargs="?", help="number of users (default: books / 10)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--jsonl", action="store_true", help="also write JSON Lines files for bulk_import")
+    args = parser.parse_args(argv)
+    users = args.users if args.users is not None else max(args.books // 10, 1)
+    paths = generate_catalog(args.directory, args.books, users, args.seed, args.jsonl)
+    for path in paths.values():
+        print(f"{path}: {os.path.getsize(path) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,346 @@
+"""
+Runs the scenario benchmarks on generated catalogs and checks them against a baseline.
+
+Run from the repository root:
+    python -m benchmarks.suite [--sizes 1000 10000 100000] [--scenarios name ...]
+                               [--repeat 5] [--operations 1000] [--seed N]
+                               [--data DIR] [--output results.json]
+                               [--baseline results.json] [--threshold 0.2]
+
+For each size a catalog is generated with benchmarks.generate; --data keeps the
+generated files between runs. The library is loaded from the generated files.
+Writes are then dropped so that every scenario measures the library path
+itself. Storage is measured by cold_load, save_books and bulk_import.
+
+Each scenario runs --repeat times. The median time per operation is the figure
+compared against the baseline. A scenario regresses when its median and its
+best run are both slower than the baseline by more than --threshold (a
+fraction), and the median by more than NOISE_US. The exit status is 1 if any
+scenario regressed.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import DEFAULT_SEED, GENRES, TITLE_WORDS, generate_catalog
+from bulk_import import import_file
+from check import Library
+from logger import Logger
+from storage import Storage
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_REPEAT = 5
+DEFAULT_OPERATIONS = 1_000
+DEFAULT_THRESHOLD = 0.2
+NOISE_US = 1.0  # differences below this are never reported as regressions
+HEAVY_REPEAT = 3  # repeats for scenarios that process the whole catalog
+CATALOG_FILES = {"books": "books.json", "users": "users.json", "books_jsonl": "books.jsonl",
+                 "users_jsonl": "users.jsonl"}  # as written by generate_catalog(jsonl=True)
+
+SCENARIOS = {}
+
+
+def scenario(name, heavy=False):
+    """Registers a scenario function under a name."""
+    def register(function):
+        SCENARIOS[name] = (function, heavy)
+        return function
+    return register
+
+
+class ReadOnlyStorage(Storage):
+    def save_books(self, books):
+        pass
+
+    def save_users(self, users):
+        pass
+
+    def save_holds(self, holds):
+        pass
+
+    def save_loan_batch(self, opened, closed, loans):
+        pass
+
+
+class NullLogger(Logger):
+    def _write_lines(self, lines):
+        pass
+
+
+class Bench:
+    def __init__(self, paths, size, operations, seed):
+        """
+        Holds the generated catalog that the scenarios of one size run against.
+
+        Parameters:
+        paths (dict): The files written by generate_catalog().
+        size (int): The number of books.
+        operations (int): The number of operations per timed scenario run.
+        seed (int): The seed for the scenarios' random choices.
+        """
+        self.paths = paths
+        self.size = size
+        self.operations = min(operations, size)
+        self.seed = seed
+
+    def library(self, cache_size=0):
+        """Loads the library from the generated files, with writes and log output dropped."""
+        return Library(ReadOnlyStorage(self.paths["books"], self.paths["users"]), NullLogger(),
+                       cache_size=cache_size)
+
+    def rng(self, salt):
+        return random.Random(f"{self.seed}-{self.size}-{salt}")
+
+
+@scenario("cold_load", heavy=True)
+def cold_load(bench):
+    start = time.perf_counter()
+    library = bench.library()
+    elapsed = time.perf_counter() - start
+    return len(library.books) + len(library.users), elapsed
+
+
+@scenario("save_books", heavy=True)
+def save_books(bench, workdir):
+    library = bench.library()
+    storage = Storage(os.path.join(workdir, "saved-books.json"), os.path.join(workdir, "saved-users.json"))
+    start = time.perf_counter()
+    storage.save_books(library.books)
+    return len(library.books), time.perf_counter() - start
+
+
+@scenario("bulk_import", heavy=True)
+def bulk_import(bench, workdir):
+    library = Library(ReadOnlyStorage(os.path.join(workdir, "empty-books.json"),
+                                      os.path.join(workdir, "empty-users.json")), NullLogger())
+    start = time.perf_counter()
+    summary = import_file(library, "books", bench.paths["books_jsonl"])
+    return summary["added"] + summary["incremented"], time.perf_counter() - start
+
+
+@scenario("build_index", heavy=True)
+def build_index(bench):
+    library = bench.library()
+    start = time.perf_counter()
+    library.search_index()
+    return len(library.books), time.perf_counter() - start
+
+
+@scenario("add_book")
+def add_book(bench):
+    library = bench.library()
+    rng = bench.rng("add")
+    records = [(" ".join(rng.choices(TITLE_WORDS, k=3)).title(), f"New Author {rng.randrange(1000)}", f"new-{i}")
+               for i in range(bench.operations)]
+    start = time.perf_counter()
+    for title, author, isbn in records:
+        library.add_book(title, author, isbn, genre="Fiction")
+    return len(records), time.perf_counter() - start
+
+
+@scenario("update_book")
+def update_book(bench):
+    library = bench.library()
+    library.search_index()  # updates keep the index current, which is part of their cost
+    isbns = bench.rng("update").sample([book.isbn for book in library.books], bench.operations)
+    start = time.perf_counter()
+    for number, isbn in enumerate(isbns):
+        library.update_book(isbn, new_title=f"Revised Edition {number}")
+    return len(isbns), time.perf_counter() - start
+
+
+def _circulation(bench):
+    library = bench.library()
+    rng = bench.rng("circulation")
+    available = [book.isbn for book in library.books if book.available and book.count > 0]
+    user_ids = [user.user_id for user in library.users]
+    pairs = [(isbn, rng.choice(user_ids)) for isbn in rng.sample(available, min(bench.operations, len(available)))]
+    return library, pairs
+
+
+@scenario("check_out_book")
+def check_out_book(bench):
+    library, pairs = _circulation(bench)
+    start = time.perf_counter()
+    for isbn, user_id in pairs:
+        library.check_out_book(isbn, user_id)
+    return len(pairs), time.perf_counter() - start
+
+
+@scenario("check_in_book")
+def check_in_book(bench):
+    library, pairs = _circulation(bench)
+    for isbn, user_id in pairs:
+        library.check_out_book(isbn, user_id)
+    start = time.perf_counter()
+    for isbn, user_id in pairs:
+        library.check_in_book(isbn, user_id)
+    return len(pairs), time.perf_counter() - start
+
+
+def _search(bench, queries):
+    library = bench.library()
+    library.search_index()
+    start = time.perf_counter()
+    for keyword, parameter in queries:
+        library.search_books(keyword, parameter)
+    return len(queries), time.perf_counter() - start
+
+
+@scenario("keyword_search")
+def keyword_search(bench):
+    rng = bench.rng("keyword")
+    return _search(bench, [(rng.choice(TITLE_WORDS), "") for _ in range(bench.operations)])
+
+
+@scenario("title_search")
+def title_search(bench):
+    rng = bench.rng("title")
+    return _search(bench, [(" ".join(rng.choices(TITLE_WORDS, k=2)), "title") for _ in range(bench.operations)])
+
+
+@scenario("attribute_search")
+def attribute_search(bench):
+    rng = bench.rng("attribute")
+    queries = [rng.choice([(rng.choice(GENRES), "genre"), (str(rng.randrange(1950, 2025)), "year"),
+                           (rng.choice(["Press", "Books", "House"]), "publisher")])
+               for _ in range(bench.operations)]
+    return _search(bench, queries)
+
+
+def run_scenario(name, bench, workdir, repeat):
+    """
+    Runs one scenario several times.
+
+    Returns:
+    dict: The operations per run, the run times and the median and best time per operation.
+    """
+    function, heavy = SCENARIOS[name]
+    runs = []
+    for _ in range(min(repeat, HEAVY_REPEAT) if heavy else repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if function.__code__.co_argcount == 2:
+                operations, seconds = function(bench, workdir)
+            else:
+                operations, seconds = function(bench)
+        runs.append((operations, seconds))
+    per_op = [seconds / operations * 1e6 for operations, seconds in runs if operations]
+    return {
+        "operations": runs[0][0],
+        "seconds": [seconds for _, seconds in runs],
+        "median_us": statistics.median(per_op) if per_op else None,
+        "best_us": min(per_op) if per_op else None,
+    }
+
+
+def environment(seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "seed": seed,
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline run and prints one line per shared scenario.
+
+    Parameters:
+    results (list): This run's result entries.
+    baseline (list): The baseline run's result entries.
+    threshold (float): The allowed slowdown as a fraction of the baseline.
+
+    Returns:
+    list: The (scenario, size) pairs that regressed.
+    """
+    previous = {(entry["scenario"], entry["size"]): entry for entry in baseline}
+    regressions = []
+    print(f"\nCompared with the baseline (threshold {threshold:.0%}):")
+    for entry in results:
+        key = (entry["scenario"], entry["size"])
+        if key not in previous or entry["median_us"] is None or previous[key]["median_us"] is None:
+            continue
+        before, after = previous[key]["median_us"], entry["median_us"]
+        change = after / before - 1 if before else 0.0
+        # The best run must be slower too, so that one noisy run cannot fail the check.
+        best_change = entry["best_us"] / previous[key]["best_us"] - 1 if previous[key]["best_us"] else 0.0
+        regressed = change > threshold and best_change > threshold and after - before > NOISE_US
+        if regressed:
+            regressions.append(key)
+        print(f"  {key[0]:<18}{key[1]:>10}   {before:12.2f} us -> {after:12.2f} us   {change:+7.1%}"
+              f"{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run the library benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of books")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--operations", type=int, default=DEFAULT_OPERATIONS,
+                        help="operations per run of the per-record scenarios")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--data", help="directory for the generated catalogs, kept between runs")
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline (default 0.2)")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(args.seed), "results": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep log and scratch files out of the repository
+        try:
+            for size in args.sizes:
+                directory = os.path.join(os.path.abspath(os.path.join(cwd, args.data)) if args.data else workdir,
+                                         f"catalog-{size}-{args.seed}")
+                paths = {name: os.path.join(directory, filename) for name, filename in CATALOG_FILES.items()}
+                if not all(os.path.exists(path) for path in paths.values()):
+                    start = time.perf_counter()
+                    paths = generate_catalog(directory, size, max(size // 10, 1), args.seed, jsonl=True)
+                    print(f"Generated {size} books in {time.perf_counter() - start:.1f} s")
+                bench = Bench(paths, size, args.operations, args.seed)
+                print(f"{size} books:")
+                for name in args.scenarios:
+                    result = run_scenario(name, bench, workdir, args.repeat)
+                    report["results"].append({"scenario": name, "size": size, **result})
+                    print(f"  {name:<18}{result['median_us']:12.2f} us per op (best {result['best_us']:.2f})"
+                          f"   {result['operations']} ops x {len(result['seconds'])} runs")
+        finally:
+            os.chdir(cwd)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} scenario(s) regressed.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,28 @@
+import operator
+import threading
+
 from storage import Storage
 from logger import Logger
+from catalog import Catalog
+from search_index import SearchIndex
+from parallel_search import ParallelScanner
+from search_cache import DEFAULT_CACHE_SIZE, SearchCache
+from listing import DEFAULT_PAGE_SIZE, Listing
+from models import CompactRecord, intern_schema
+from concurrency import CoalescingWriter, KeyedLocks
+from metrics import timed
+
+BOOK_FIELDS = frozenset(("title", "author", "isbn", "count", "available"))
+BOOK_SORT_ORDERS = {
+    "title": lambda book: book.title.casefold(),
+    "author": lambda book: book.author.casefold(),
+    "count": operator.attrgetter("count"),
+}
+
+class Book(CompactRecord):
+    __slots__ = ("title", "author", "isbn", "count", "available")
+    _state = operator.attrgetter(*__slots__, "_schema", "_values")
 
-class Book:
     def __init__(self, title, author, isbn, count=1, available=True, **kwargs):
         """
         Initializes a new Book instance.
@@ -19,11 +40,11 @@ class Book:
         self.isbn = isbn
         self.count = count
         self.available = available
-        self.additional_attributes = kwargs  # Store any additional attributes
+        self._set_attributes(kwargs)  # Store any additional attributes
 
     def __str__(self):
         details = f"{self.title} by {self.author} (ISBN: {self.isbn}, Count: {self.count}) - {'Available' if self.available else 'Checked out'}"
-        for key, value in self.additional_attributes.items():
+        for key, value in zip(self._schema, self._values):
             details += f", {key.capitalize()}: {value}"
         return details
 
@@ -41,37 +62,84 @@ class Book:
             "count": self.count,
             "available": self.available
         }
-        data.update(self.additional_attributes)
+        data.update(zip(self._schema, self._values))
         return data
 
+    def search_fields(self):
+        """
+        Returns the searchable fields of the book.
+
+        Returns:
+        dict: The title, author, ISBN and additional attributes keyed by field name.
+        """
+        fields = {"title": self.title, "author": self.author, "isbn": self.isbn}
+        fields.update(zip(self._schema, self._values))
+        return fields
+
     @classmethod
     def from_dict(cls, data):
         """
         Creates a Book object from a dictionary.
 
+        The dictionary is left unchanged.
+
         Parameters:
         data (dict): The dictionary containing book data.
 
         Returns:
         Book: A new Book instance created from the dictionary data.
         """
-        isbn = data.pop("isbn")
-        title = data.pop("title")
-        author = data.pop("author")
-        count = data.pop("count", 1)
-        available = data.pop("available", True)
-        return cls(title, author, isbn, count, available, **data)
+        book = cls.__new__(cls)
+        book.isbn = data["isbn"]
+        book.title = data["title"]
+        book.author = data["author"]
+        book.count = data.get("count", 1)
+        book.available = data.get("available", True)
+        schema = intern_schema(key for key in data if key not in BOOK_FIELDS)
+        book._schema = schema
+        book._values = tuple(data[key] for key in schema)
+        return book
 
 
 class ManageBooks:
-    def __init__(self) -> None:
+    def __init__(self, storage=None, logger=None, books=None, cache_size=DEFAULT_CACHE_SIZE,
+                 cache_ttl=None) -> None:
         """
         Initializes the ManageBooks instance, loading books from storage.
+
+        Parameters:
+        storage (Storage, optional): The storage engine to use. Defaults to JSON file storage.
+        logger (Logger, optional): The logger to use. Defaults to a Logger writing to 'books.log'.
+        books (Catalog or iterable, optional): Books that were already loaded. When
+            given, the storage is not read.
+        cache_size (int): The number of book searches whose results are cached. 0
+            disables the cache.
+        cache_ttl (float, optional): Seconds after which a cached search expires.
+        """
+        self.storage = storage or Storage()
+        if books is None:
+            books = self.storage.load_books()
+        self.books = books if isinstance(books, Catalog) else Catalog(books, key="isbn")
+        self.book_index = None  # Built on the first search, see search_index()
+        self.search_cache = self.books.add_index(SearchCache("isbn", Book.search_fields, cache_size, cache_ttl),
+                                                 populate=False)
+        self.parallel_scanner = None  # Started on the first parallel search, see parallel_scan()
+        self.listing = Listing(self.books, BOOK_SORT_ORDERS, BOOK_FIELDS)
+        self.logger = logger or Logger("books.log")
+        self.book_locks = KeyedLocks()
+        self.book_writer = CoalescingWriter(self._flush_books)
+        self._book_index_lock = threading.Lock()
+
+    def _flush_books(self, changed):
+        """
+        Persists a batch of changed books collected by the book writer.
+
+        Parameters:
+        changed (list): The books that were added or updated.
         """
-        self.storage = Storage()
-        self.books = self.storage.load_books()
-        self.logger = Logger("books.log")
+        self.storage.save_book_batch(changed, self.books)
 
+    @timed("add_book")
     def add_book(self, title, author, isbn, **kwargs):
         """
         Adds a new book to the library or increments the count if the book already exists.
@@ -83,21 +151,117 @@ class ManageBooks:
         **kwargs: Additional attributes for the book (e.g., genre, year).
         """
         try:
-            existing_book = next((book for book in self.books if book.isbn == isbn), None)
-            if existing_book:
-                existing_book.count += 1
-                print(f"Book with ISBN {isbn} already exists. Incremented count to {existing_book.count}.")
-            else:
-                new_book = Book(title, author, isbn, **kwargs)
-                self.books.append(new_book)
-                print(f"Book added: {new_book}")
+            with self.book_locks.lock_for(isbn):
+                existing_book = self.books.get(isbn)
+                if existing_book:
+                    existing_book.count += 1
+                    self.books.status_changed(existing_book)
+                    print(f"Book with ISBN {isbn} already exists. Incremented count to {existing_book.count}.")
+                else:
+                    new_book = Book(title, author, isbn, **kwargs)
+                    self.books.add(new_book)
+                    print(f"Book added: {new_book}")
 
-            self.storage.save_books(self.books)
-            self.logger.log(f"Added/Updated book: {existing_book if existing_book else new_book}")
+            self.book_writer.write(isbn, existing_book or new_book)
+            self.logger.log(f"Added/Updated book: {existing_book if existing_book else new_book}", event="add_book",
+                            isbn=isbn)
         except Exception as e:
             print(f"An error occurred while adding a book: {e}")
             self.logger.log(f"Error while adding/updating book: {e}")
 
+    @timed("add_books_bulk")
+    def add_books_bulk(self, records):
+        """
+        Adds many books at once, persisting and logging once for the whole batch.
+
+        Each record follows add_book: a new ISBN adds the book, while an ISBN that is
+        already in the library (or earlier in the batch) increments its count. In
+        both cases the record's count (1 if it has none) is the number of copies
+        added. Title, author, available and additional attributes only apply to new
+        books.
+
+        Parameters:
+        records (iterable): Dictionaries with title, author and isbn, plus optional
+            count, available and additional attributes.
+
+        Returns:
+        dict: The number of books added, incremented and skipped as invalid.
+
+        Raises:
+        Exception: Whatever reading the records raises, e.g. a ValueError for a
+            malformed row, after the books changed so far have been saved.
+        """
+        summary = {"added": 0, "incremented": 0, "skipped": 0}
+        changed = {}
+        try:
+            for data in records:
+                isbn = data.get("isbn")
+                if not isbn or not data.get("title") or not data.get("author"):
+                    summary["skipped"] += 1
+                    continue
+                with self.book_locks.lock_for(isbn):
+                    book = self.books.get(isbn)
+                    if book:
+                        book.count += data.get("count", 1)
+                        self.books.status_changed(book)
+                        summary["incremented"] += 1
+                    else:
+                        book = Book.from_dict(data)
+                        self.books.add(book)
+                        summary["added"] += 1
+                changed[isbn] = book
+        except Exception as e:
+            self.logger.log(f"Error while adding books in bulk after {len(changed)} books: {e}")
+            raise
+        finally:
+            if changed:
+                self.book_writer.write_many(changed)
+        self.logger.log(f"Bulk added books: {summary['added']} added, "
+                        f"{summary['incremented']} incremented, {summary['skipped']} skipped")
+        print(f"Books imported: {summary['added']} added, {summary['incremented']} incremented, "
+              f"{summary['skipped']} skipped.")
+        return summary
+
+    def search_index(self):
+        """
+        Returns the full-text index over the books, building it on first use.
+
+        Building is deferred so that opening a large (possibly lazily loaded) catalog
+        does not pay for indexing until a search is made.
+
+        Returns:
+        SearchIndex: The index, kept up to date by the catalog afterwards.
+        """
+        with self._book_index_lock:
+            if self.book_index is None:
+                self.book_index = self.books.add_index(SearchIndex("isbn", Book.search_fields))
+        return self.book_index
+
+    def parallel_scan(self, workers):
+        """
+        Returns the multi-process scanner over the books, starting it on first use.
+
+        The scanner is restarted when a different number of workers is asked for.
+        Unlike the search index it needs no n-gram tables, only a lowercase copy of
+        the catalog split across the worker processes.
+
+        Parameters:
+        workers (int): The number of worker processes.
+
+        Returns:
+        ParallelScanner: The scanner, kept up to date by the catalog afterwards.
+        """
+        with self._book_index_lock:
+            scanner = self.parallel_scanner
+            if scanner is None or scanner.workers != workers:
+                if scanner is not None:
+                    self.books.remove_index(scanner)
+                    scanner.close()
+                scanner = ParallelScanner(self.books, "isbn", Book.search_fields, workers, attach=True)
+                self.parallel_scanner = scanner
+        return scanner
+
+    @timed("list_books")
     def list_books(self):
         """
         Lists all books currently in the library.
@@ -108,6 +272,72 @@ class ManageBooks:
             for book in self.books:
                 print(book)
 
+    def iter_books(self, sort="title", reverse=False, cursor=None, available=None, attributes=None):
+        """
+        Yields books in a sort order, optionally filtered, one at a time.
+
+        Each sort order and filter combination is served by a sorted index that is
+        built on first use and then kept up to date, so starting a listing costs
+        O(log n) and each book after that O(1) on average.
+
+        Parameters:
+        sort (str): 'title', 'author' or 'count'. Ties are ordered by ISBN.
+        reverse (bool): List in descending order.
+        cursor (str, optional): Start after the book a previous page ended with.
+        available (bool, optional): Only books that are (or are not) available.
+        attributes (dict, optional): Additional attribute -> required value, e.g.
+            {'genre': 'Poetry'}.
+
+        Returns:
+        iterator: The matching Book objects.
+
+        Raises:
+        ValueError: If the sort order or the cursor is invalid.
+        """
+        for book in self.listing.iterate(sort, self._filters(available, attributes), cursor, reverse):
+            yield book
+
+    def list_books_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort="title", reverse=False, available=None,
+                        attributes=None):
+        """
+        Returns one page of books in a sort order, optionally filtered.
+
+        Parameters:
+        limit (int): The page size.
+        cursor (str, optional): The cursor returned with the previous page.
+        sort, reverse, available, attributes: As for iter_books().
+
+        Returns:
+        tuple: The Book objects, and the cursor of the next page (None after the last page).
+
+        Raises:
+        ValueError: If the limit is not positive, or the sort order or the cursor is invalid.
+        """
+        return self.listing.page(sort, self._filters(available, attributes), cursor, reverse, limit)
+
+    def book_status(self, isbn):
+        """
+        Returns how many copies of a book are on the shelf and whether it is available.
+
+        Catalogs served from a snapshot answer from the mapped file without building
+        the Book object.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+
+        Returns:
+        tuple: The book's (count, available), or None if there is no such book.
+        """
+        return self.books.status(isbn)
+
+    @staticmethod
+    def _filters(available, attributes):
+        filters = dict(attributes or {})
+        if available is not None:
+            filters["available"] = bool(available)
+        return filters
+
+    @timed("update_book")
     def update_book(self, isbn, new_title=None, new_author=None, new_count=None, **kwargs):
         """
         Updates a book's information based on the ISBN.
@@ -120,20 +350,75 @@ class ManageBooks:
         **kwargs: Additional attributes to update for the book.
         """
         try:
-            book = next((b for b in self.books if b.isbn == isbn), None)
+            with self.book_locks.lock_for(isbn):
+                book = self.books.get(isbn)
+                if book:
+                    if new_title:
+                        book.title = new_title
+                    if new_author:
+                        book.author = new_author
+                    if new_count is not None:
+                        book.count = new_count
+                    book.additional_attributes.update(kwargs)
+                    self.books.update(book)
             if book:
-                if new_title:
-                    book.title = new_title
-                if new_author:
-                    book.author = new_author
-                if new_count is not None:
-                    book.count = new_count
-                book.additional_attributes.update(kwargs)
-                self.storage.save_books(self.books)
-                self.logger.log(f"Updated book: {book}")
+                self.book_writer.write(isbn, book)
+                self.logger.log(f"Updated book: {book}", event="update_book", isbn=isbn)
                 print(f"Book updated: {book}")
             else:
                 print(f"Book with ISBN {isbn} not found.")
         except Exception as e:
             print(f"An error occurred while updating the book: {e}")
             self.logger.log(f"Error while updating book: {e}")
+
+    @timed("update_books_bulk")
+    def update_books_bulk(self, records):
+        """
+        Updates many books at once, persisting and logging once for the whole batch.
+
+        Each record follows update_book: title and author replace the current values
+        when given, count replaces the current count, available sets the
+        availability and any other keys update the additional attributes.
+
+        Parameters:
+        records (iterable): Dictionaries with the isbn of the book to update and the
+            fields to change.
+
+        Returns:
+        dict: The number of books updated and of ISBNs that were not found.
+
+        Raises:
+        Exception: Whatever reading the records raises, e.g. a ValueError for a
+            malformed row, after the books changed so far have been saved.
+        """
+        summary = {"updated": 0, "not_found": 0}
+        changed = {}
+        try:
+            for data in records:
+                isbn = data.get("isbn")
+                with self.book_locks.lock_for(isbn):
+                    book = self.books.get(isbn)
+                    if not book:
+                        summary["not_found"] += 1
+                        continue
+                    if data.get("title"):
+                        book.title = data["title"]
+                    if data.get("author"):
+                        book.author = data["author"]
+                    if data.get("count") is not None:
+                        book.count = data["count"]
+                    if data.get("available") is not None:
+                        book.available = bool(data["available"])
+                    book.additional_attributes.update({k: v for k, v in data.items() if k not in BOOK_FIELDS})
+                    self.books.update(book)
+                changed[isbn] = book
+                summary["updated"] += 1
+        except Exception as e:
+            self.logger.log(f"Error while updating books in bulk after {len(changed)} books: {e}")
+            raise
+        finally:
+            if changed:
+                self.book_writer.write_many(changed)
+        self.logger.log(f"Bulk updated books: {summary['updated']} updated, {summary['not_found']} not found")
+        print(f"Books updated: {summary['updated']} updated, {summary['not_found']} not found.")
+        return summary
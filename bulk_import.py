@@ -0,0 +1,98 @@
+import csv
+import json
+import sys
+
+INTEGER_FIELDS = ("count",)
+BOOLEAN_FIELDS = ("available",)
+
+
+def _parse_csv_row(row):
+    """
+    Converts a CSV row to a record, restoring the types CSV cannot carry.
+
+    Empty cells are dropped so they do not overwrite existing values.
+
+    Parameters:
+    row (dict): The row as read by csv.DictReader.
+
+    Returns:
+    dict: The record.
+    """
+    record = {key: value for key, value in row.items() if key and value not in ("", None)}
+    for field in INTEGER_FIELDS:
+        if field in record:
+            record[field] = int(record[field])
+    for field in BOOLEAN_FIELDS:
+        if field in record:
+            record[field] = record[field].strip().lower() in ("1", "true", "yes")
+    return record
+
+
+def _iter_records(f, is_csv):
+    with f:
+        if is_csv:
+            for row in csv.DictReader(f):
+                yield _parse_csv_row(row)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_records(path):
+    """
+    Reads records one at a time from a CSV or JSON Lines file.
+
+    The format is chosen by extension: '.csv' files need a header row, anything
+    else is read as JSON Lines with one object per line. Blank lines are skipped.
+    The file is opened right away, so a missing file raises here rather than
+    part way through an import.
+
+    Parameters:
+    path (str): Path to the file.
+
+    Returns:
+    iterator: The records as dictionaries.
+    """
+    return _iter_records(open(path, newline=''), path.lower().endswith(".csv"))
+
+
+def import_file(library, kind, path):
+    """
+    Imports a file of records into the library in a single batch.
+
+    Parameters:
+    library (Library): The library to import into.
+    kind (str): 'books' to add books, 'users' to add users or 'book-updates' to
+        update existing books.
+    path (str): Path to the CSV or JSON Lines file.
+
+    A row that cannot be read stops the import; the records before it stay
+    imported.
+
+    Returns:
+    dict: The summary returned by the bulk method, or None if the file could not be
+        read in full.
+    """
+    bulk_methods = {
+        "books": library.add_books_bulk,
+        "users": library.add_users_bulk,
+        "book-updates": library.update_books_bulk,
+    }
+    if kind not in bulk_methods:
+        print(f"Unknown import type: {kind}. Expected one of: {', '.join(bulk_methods)}.")
+        return None
+    try:
+        return bulk_methods[kind](read_records(path))
+    except (IOError, ValueError, TypeError, csv.Error) as e:
+        print(f"An error occurred while reading {path}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    # Usage: python bulk_import.py books|users|book-updates <file.csv|file.jsonl>
+    if len(sys.argv) != 3:
+        print("Usage: python bulk_import.py books|users|book-updates <file.csv|file.jsonl>")
+        sys.exit(2)
+    from check import Library
+    sys.exit(0 if import_file(Library(), sys.argv[1], sys.argv[2]) else 1)
@@ -0,0 +1,137 @@
+class Catalog:
+    def __init__(self, records=(), key="isbn"):
+        """
+        Initializes a keyed in-memory catalog of records.
+
+        Records are stored in a dict keyed by the given attribute, so lookups,
+        membership tests and deletes are O(1) while iteration still follows
+        insertion order like the plain list it replaces.
+
+        Parameters:
+        records (iterable): The initial records (e.g., Book or User objects).
+        key (str): The attribute used as the unique key (e.g., 'isbn', 'user_id').
+        """
+        self.key = key
+        self._records = {}
+        self._indexes = []
+        for record in records:
+            self._records[getattr(record, key)] = record
+
+    def __iter__(self):
+        # Iterate over a snapshot so concurrent adds and removes cannot break iteration.
+        return iter(list(self._records.values()))
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def get(self, key, default=None):
+        """
+        Returns the record stored under the given key.
+
+        Parameters:
+        key (str): The key of the record to look up.
+        default: The value returned when the key is not present. Defaults to None.
+
+        Returns:
+        The matching record, or the default value.
+        """
+        return self._records.get(key, default)
+
+    def status(self, key):
+        """
+        Returns the circulation status of the record stored under the given key.
+
+        Catalogs backed by a file override this to answer without loading the record.
+
+        Parameters:
+        key (str): The key of the record to look up.
+
+        Returns:
+        tuple: The record's (count, available), or None if the key is not present.
+        """
+        record = self.get(key)
+        if record is None:
+            return None
+        return record.count, record.available
+
+    def add(self, record):
+        """
+        Adds a record to the catalog, replacing any record with the same key.
+
+        Parameters:
+        record: The record to add.
+        """
+        self._records[getattr(record, self.key)] = record
+        for index in self._indexes:
+            index.add(record)
+
+    def update(self, record):
+        """
+        Notifies the attached indexes that a record was changed in place.
+
+        Parameters:
+        record: The record that was modified.
+        """
+        for index in self._indexes:
+            index.update(record)
+
+    def remove(self, key):
+        """
+        Removes the record stored under the given key.
+
+        Parameters:
+        key (str): The key of the record to remove.
+
+        Returns:
+        The removed record, or None if the key was not present.
+        """
+        record = self._records.pop(key, None)
+        if record is not None:
+            for index in self._indexes:
+                index.remove(key)
+        return record
+
+    def status_changed(self, record):
+        """
+        Notifies the indexes that track circulation status that a record's count or
+        availability changed.
+
+        Circulation does not touch searchable fields, so the search index and cache
+        are not told; only indexes with a true `tracks_status` attribute are.
+
+        Parameters:
+        record: The record that was modified.
+        """
+        for index in self._indexes:
+            if getattr(index, "tracks_status", False):
+                index.update(record)
+
+    def add_index(self, index, populate=True):
+        """
+        Attaches a secondary index that is kept in sync with every add, update and remove.
+
+        Parameters:
+        index: An object providing add(record), update(record) and remove(key).
+        populate (bool): Whether to add the records already in the catalog to the
+            index. Indexes that only track later changes, like a SearchCache, skip it.
+
+        Returns:
+        The attached index.
+        """
+        if populate:
+            for record in self._records.values():
+                index.add(record)
+        self._indexes.append(index)
+        return index
+
+    def remove_index(self, index):
+        """
+        Detaches an index so that it no longer sees changes.
+
+        Parameters:
+        index: An index attached with add_index().
+        """
+        self._indexes.remove(index)
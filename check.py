@@ -1,93 +1,575 @@
+import concurrent.futures
+
 from book import ManageBooks
 from user import ManageUsers
 from logger import Logger
+from storage import Storage
+from holds import READY, Hold, HoldQueues
+from loans import Loan, LoanLedger
+from concurrency import CoalescingWriter
+from search_cache import DEFAULT_CACHE_SIZE
+from listing import DEFAULT_PAGE_SIZE
+from metrics import metrics, timed
+
+class Library:
+    def __init__(self, storage=None, logger=None, books=None, users=None, cache_size=DEFAULT_CACHE_SIZE,
+                 cache_ttl=None) -> None:
+        """
+        Initializes the Library from one storage engine and one logger.
+
+        The book and user managers are handed the same storage and logger rather
+        than creating their own. Books and users not passed in are loaded from the
+        storage in parallel.
+
+        Parameters:
+        storage (Storage, optional): The storage engine for books and users. Defaults
+            to JSON file storage.
+        logger (Logger, optional): The logger for all library actions. Defaults to a
+            Logger writing to 'library.log'.
+        books (Catalog or iterable, optional): Books that were already loaded.
+        users (Catalog or iterable, optional): Users that were already loaded.
+        cache_size (int): The number of book and of user searches whose results are
+            cached. 0 disables the caches.
+        cache_ttl (float, optional): Seconds after which a cached search expires.
+        """
+        self.storage = storage or Storage()
+        self.logger = logger or Logger("library.log")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="load") as executor:
+            loading_books = executor.submit(self.storage.load_books) if books is None else None
+            loading_users = executor.submit(self.storage.load_users) if users is None else None
+            books = loading_books.result() if loading_books else books
+            users = loading_users.result() if loading_users else users
+        self.book_manager = ManageBooks(self.storage, self.logger, books, cache_size, cache_ttl)
+        self.user_manager = ManageUsers(self.storage, self.logger, users, cache_size, cache_ttl)
+
+        # Shared state used by the circulation methods below
+        self.books = self.book_manager.books
+        self.book_locks = self.book_manager.book_locks
+        self.book_writer = self.book_manager.book_writer
+        self.users = self.user_manager.users
+        self.user_locks = self.user_manager.user_locks
+        self.user_writer = self.user_manager.user_writer
+
+        self.holds = HoldQueues(self.storage.load_holds())
+        self.hold_writer = CoalescingWriter(self._flush_holds)
+        self.loans = LoanLedger(self.storage.load_loans())
+        self.loan_writer = CoalescingWriter(self._flush_loans)
+
+    def _flush_holds(self, changed):
+        """
+        Persists the holds after a batch of hold changes.
+
+        Parameters:
+        changed (list): The holds that were placed, allocated or removed.
+        """
+        self.storage.save_holds(self.holds)
+
+    def _flush_loans(self, changed):
+        """
+        Persists a batch of opened and closed loans.
+
+        Parameters:
+        changed (list): The Loan objects that were opened or closed.
+        """
+        opened = [loan for loan in changed if loan.returned_at is None]
+        closed = [loan for loan in changed if loan.returned_at is not None]
+        self.storage.save_loan_batch(opened, closed, self.loans)
+
+    def _allocate_copies(self, book):
+        """
+        Sets available copies of a book aside for waiting holds.
+
+        The caller must hold the book's lock.
+
+        Parameters:
+        book (Book): The book whose count may have grown.
+
+        Returns:
+        list: The holds that became ready for pickup.
+        """
+        allocated = []
+        while book.count > 0 and self.holds.waiting(book.isbn):
+            hold = self.holds.allocate(book.isbn)
+            if hold is None:
+                break
+            book.count -= 1
+            allocated.append(hold)
+        book.available = book.count > 0
+        self.books.status_changed(book)
+        return allocated
+
+    def _persist_allocations(self, book, allocated):
+        """
+        Persists the book and holds changed by _allocate_copies and reports them.
+
+        Parameters:
+        book (Book): The book whose copies were set aside.
+        allocated (list): The holds that became ready for pickup.
+        """
+        if not allocated:
+            return
+        self.book_writer.write(book.isbn, book)
+        self.hold_writer.write_many({(hold.isbn, hold.user_id): hold for hold in allocated})
+        for hold in allocated:
+            self.logger.log(f"Hold ready for pickup: {hold}", event="hold_ready", isbn=hold.isbn, user_id=hold.user_id)
+            print(f"Copy of '{book.title}' set aside for User {hold.user_id}.")
+
+    @timed("add_book")
+    def add_book(self, title, author, isbn, **kwargs):
+        """Adds a book or another copy of it and serves waiting holds; see ManageBooks.add_book."""
+        self.book_manager.add_book(title, author, isbn, **kwargs)
+        self._serve_holds(isbn)
 
-class Library(ManageUsers, ManageBooks):
-    def __init__(self) -> None:
-        # Initialize parent classes to load users and books
-        ManageUsers.__init__(self)
-        ManageBooks.__init__(self)
-        self.logger = Logger("library.log")  # Logger for library-specific actions
+    def add_books_bulk(self, records):
+        """Adds many books in one batch and serves waiting holds; see ManageBooks.add_books_bulk."""
+        isbns = set()
+        try:
+            return self.book_manager.add_books_bulk(self._note_held_isbns(records, isbns))
+        finally:
+            for isbn in isbns:
+                self._serve_holds(isbn)
+
+    @timed("update_book")
+    def update_book(self, isbn, new_title=None, new_author=None, new_count=None, **kwargs):
+        """Updates a book and serves waiting holds; see ManageBooks.update_book."""
+        self.book_manager.update_book(isbn, new_title, new_author, new_count, **kwargs)
+        self._serve_holds(isbn)
+
+    def _serve_holds(self, isbn):
+        """
+        Sets copies aside for waiting holds after a book's count was changed.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+        """
+        if not self.holds.waiting(isbn):
+            return
+        with self.book_locks.lock_for(isbn):
+            book = self.books.get(isbn)
+            allocated = self._allocate_copies(book) if book else []
+        self._persist_allocations(book, allocated)
+
+    def _note_held_isbns(self, records, isbns):
+        """
+        Passes bulk records through, noting the ISBNs that have waiting holds.
+
+        Parameters:
+        records (iterable): The records of a bulk add or update.
+        isbns (set): Receives the ISBNs whose holds must be served after the batch.
+
+        Returns:
+        iterator: The same records.
+        """
+        for data in records:
+            isbn = data.get("isbn")
+            if isbn and self.holds.waiting(isbn):
+                isbns.add(isbn)
+            yield data
+
+    def update_books_bulk(self, records):
+        """Updates many books in one batch and serves waiting holds; see ManageBooks.update_books_bulk."""
+        isbns = set()
+        try:
+            return self.book_manager.update_books_bulk(self._note_held_isbns(records, isbns))
+        finally:
+            for isbn in isbns:
+                self._serve_holds(isbn)
+
+    def list_books(self):
+        """Prints every book; see ManageBooks.list_books."""
+        self.book_manager.list_books()
+
+    def iter_books(self, sort="title", reverse=False, cursor=None, available=None, attributes=None):
+        """Yields books in a sort order; see ManageBooks.iter_books."""
+        return self.book_manager.iter_books(sort, reverse, cursor, available, attributes)
+
+    def list_books_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort="title", reverse=False, available=None,
+                        attributes=None):
+        """Returns one page of books and the next cursor; see ManageBooks.list_books_page."""
+        return self.book_manager.list_books_page(limit, cursor, sort, reverse, available, attributes)
+
+    def book_status(self, isbn):
+        """Returns a book's (count, available); see ManageBooks.book_status."""
+        return self.book_manager.book_status(isbn)
+
+    def search_index(self):
+        """Returns the book search index; see ManageBooks.search_index."""
+        return self.book_manager.search_index()
+
+    def user_search_index(self):
+        """Returns the user search index; see ManageUsers.user_search_index."""
+        return self.user_manager.user_search_index()
+
+    def add_user(self, user_id, name, **kwargs):
+        """Adds a user; see ManageUsers.add_user."""
+        self.user_manager.add_user(user_id, name, **kwargs)
+
+    def add_users_bulk(self, records):
+        """Adds many users in one batch; see ManageUsers.add_users_bulk."""
+        return self.user_manager.add_users_bulk(records)
+
+    def list_users(self):
+        """Prints every user; see ManageUsers.list_users."""
+        self.user_manager.list_users()
+
+    def iter_users(self, sort="name", reverse=False, cursor=None, attributes=None):
+        """Yields users in a sort order; see ManageUsers.iter_users."""
+        return self.user_manager.iter_users(sort, reverse, cursor, attributes)
+
+    def list_users_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort="name", reverse=False, attributes=None):
+        """Returns one page of users and the next cursor; see ManageUsers.list_users_page."""
+        return self.user_manager.list_users_page(limit, cursor, sort, reverse, attributes)
+
+    def search_users(self, keyword, parameter=""):
+        """Searches users; see ManageUsers.search_users."""
+        return self.user_manager.search_users(keyword, parameter)
+
+    def update_user(self, user_id, **kwargs):
+        """Updates a user; see ManageUsers.update_user."""
+        self.user_manager.update_user(user_id, **kwargs)
+
+    def delete_user(self, user_id):
+        """Deletes a user; see ManageUsers.delete_user."""
+        self.user_manager.delete_user(user_id)
+
+    def search_cache_stats(self):
+        """
+        Returns the counters of the book and user search caches.
 
-    def search_books(self, keyword, parameter=""):
+        Returns:
+        dict: SearchCache.stats() for 'books' and 'users'.
+        """
+        return {"books": self.book_manager.search_cache.stats(), "users": self.user_manager.search_cache.stats()}
+
+    def stats(self):
+        """
+        Returns the instrumentation statistics along with the search cache counters.
+
+        Operation latencies are only recorded while instrumentation is enabled, see
+        metrics.Metrics.
+
+        Returns:
+        dict: 'operations' and 'phases' from Metrics.stats(), 'search_cache' from
+            search_cache_stats() and, for a BufferedLogger, 'logger'.
+        """
+        stats = metrics.stats()
+        stats["search_cache"] = self.search_cache_stats()
+        if hasattr(self.logger, "stats"):
+            stats["logger"] = self.logger.stats()
+        return stats
+
+    @timed("search_books")
+    def search_books(self, keyword, parameter="", workers=0):
         """
         Search for books by a specific parameter (title, author, isbn) and keyword.
 
+        Results are cached per (keyword, parameter) and dropped only when a book is
+        added or updated in a way that changes which books match. Checkouts and
+        check-ins change no searchable field, and cached results are resolved to
+        the current Book objects, so they always show the current availability.
+
         Parameters:
         parameter (str): The attribute to search by (title, author, isbn, or any additional attribute).
         keyword (str): The keyword to search for in the specified attribute.
+        workers (int): Scans the catalog with this many worker processes instead of
+            using the search index, see ManageBooks.parallel_scan. 0 uses the index.
+
+        Returns:
+        list: The matching Book objects.
         """
         try:
-            results = []
-            if parameter in ["title", "author", "isbn"]:
-                results = [book for book in self.books if keyword.lower() in getattr(book, parameter).lower()]
-            else:
-                # Search across all attributes including additional ones
-                for book in self.books:
-                    if (keyword.lower() in book.title.lower() or 
-                        keyword.lower() in book.author.lower() or 
-                        keyword.lower() in book.isbn.lower() or 
-                        any(keyword.lower() in str(value).lower() for value in book.additional_attributes.values())):
-                        results.append(book)
+            cache = self.book_manager.search_cache
+            query = (keyword, parameter)
+            keys = cache.get(query)
+            if keys is None:
+                generation = cache.generation
+                if workers:
+                    keys, fields = self.book_manager.parallel_scan(workers).search(keyword, parameter)
+                else:
+                    index = self.search_index()
+                    if parameter in ["title", "author", "isbn"] or parameter in index.fields_indexed():
+                        keys, fields = index.search(keyword, [parameter]), (parameter,)
+                    else:
+                        # Search across all attributes including additional ones
+                        keys, fields = index.search(keyword), None
+                cache.put(query, keys, fields, generation=generation)
+            results = [self.books.get(key) for key in keys]
 
             if results:
                 for book in results:
                     print(book)
             else:
                 print(f"No books found for keyword: {keyword}")
+            return results
         except Exception as e:
             print(f"An error occurred during book search: {e}")
             self.logger.log(f"Error during book search: {e}")
+            return []
 
-    def check_out_book(self, isbn, user_id):
+    @timed("check_out_book")
+    def check_out_book(self, isbn, user_id, due_at=None, raise_errors=False):
         """
         Check out a book for a user by decreasing the available count of the book.
 
+        A copy set aside for the user's hold is handed over without touching the
+        count, since it was taken off the shelf when the hold became ready. Every
+        checkout opens a loan in the ledger.
+
         Parameters:
         isbn (str): The ISBN of the book to be checked out.
         user_id (str): The ID of the user checking out the book.
+        due_at (float, optional): When the copy is due back, as a Unix timestamp.
+            Defaults to the standard loan period from now.
+        raise_errors (bool): Re-raise unexpected errors after reporting them, so
+            that callers can tell them apart from an unknown or unavailable book.
+
+        Returns:
+        bool: True if a copy was checked out.
         """
         try:
-            book = next((b for b in self.books if b.isbn == isbn), None)
-            user = next((u for u in self.users if u.user_id == user_id), None)
-            
-            if not book:
-                print("Invalid book ISBN.")
-                return
-            if not user:
-                print("Invalid user ID.")
-                return
-
-            if book.count > 0:
-                book.count -= 1
-                book.available = book.count > 0
-                self.storage.save_books(self.books)
-                self.logger.log(f"Book checked out: {book} by User: {user}")
+            # Books are always locked before users so concurrent callers cannot deadlock.
+            with self.book_locks.lock_for(isbn), self.user_locks.lock_for(user_id):
+                book = self.books.get(isbn)
+                user = self.users.get(user_id)
+
+                if not book:
+                    print("Invalid book ISBN.")
+                    return False
+                if not user:
+                    print("Invalid user ID.")
+                    return False
+
+                hold = self.holds.get(isbn, user_id)
+                if hold and hold.status == READY:
+                    self.holds.remove(isbn, user_id)
+                    checked_out = True
+                else:
+                    hold = None
+                    checked_out = book.count > 0
+                    if checked_out:
+                        book.count -= 1
+                        book.available = book.count > 0
+                        self.books.status_changed(book)
+                loan = None
+                if checked_out:
+                    loan = Loan(user_id, isbn, due_at=due_at)
+                    self.loans.open(loan)
+
+            if hold:
+                self.hold_writer.write((isbn, user_id), hold)
+                self.logger.log(f"Hold picked up: {hold}", event="hold_picked_up", isbn=isbn, user_id=user_id)
+            if checked_out:
+                self.book_writer.write(isbn, book)
+                self.loan_writer.write(loan.loan_id, loan)
+                self.logger.log(f"Book checked out: {book} by User: {user}", event="check_out", isbn=isbn,
+                                user_id=user_id)
                 print(f"Book checked out: {book}")
             else:
                 print(f"Book '{book.title}' is not available.")
+            return checked_out
         except Exception as e:
             print(f"An error occurred during book checkout: {e}")
             self.logger.log(f"Error during book checkout: {e}")
+            if raise_errors:
+                raise
+            return False
 
-    def check_in_book(self, isbn):
+    @timed("check_in_book")
+    def check_in_book(self, isbn, user_id=None):
         """
         Check in a book by increasing the available count of the book.
 
+        The user's loan of the book is closed; without a user, the loan of the
+        book that is due first is closed. If users are waiting for the book, the
+        returned copy is set aside for the next hold in the queue instead.
+
         Parameters:
         isbn (str): The ISBN of the book to be checked in.
+        user_id (str, optional): The ID of the user returning the book.
+
+        Returns:
+        bool: True if the book was checked in.
         """
         try:
-            book = next((b for b in self.books if b.isbn == isbn), None)
-            if not book:
-                print("Invalid book ISBN.")
-                return
-
-            book.count += 1
-            book.available = True
-            self.storage.save_books(self.books)
-            self.logger.log(f"Book checked in: {book}")
+            with self.book_locks.lock_for(isbn):
+                book = self.books.get(isbn)
+                if not book:
+                    print("Invalid book ISBN.")
+                    return False
+                loan = self.loans.close(isbn, user_id)
+                if user_id is not None and loan is None:
+                    print(f"User {user_id} has no loan of ISBN {isbn}.")
+                    return False
+
+                book.count += 1
+                book.available = True
+                allocated = self._allocate_copies(book)
+            self.book_writer.write(isbn, book)
+            if loan:
+                self.loan_writer.write(loan.loan_id, loan)
+            self.logger.log(f"Book checked in: {book}", event="check_in", isbn=isbn,
+                            user_id=loan.user_id if loan else user_id)
             print(f"Book checked in: {book}")
+            self._persist_allocations(book, allocated)
+            return True
         except Exception as e:
             print(f"An error occurred during book check-in: {e}")
             self.logger.log(f"Error during book check-in: {e}")
+            return False
+
+    @timed("place_hold")
+    def place_hold(self, isbn, user_id, priority=0):
+        """
+        Places a hold for a user on a book.
+
+        If a copy is on the shelf it is set aside for the user right away;
+        otherwise the user waits in the book's queue for a returned copy.
+
+        Parameters:
+        isbn (str): The ISBN of the book to hold.
+        user_id (str): The ID of the user placing the hold.
+        priority (int): Holds with a higher priority are served first. Defaults to 0.
+
+        Returns:
+        bool: True if the hold was placed.
+        """
+        try:
+            with self.book_locks.lock_for(isbn), self.user_locks.lock_for(user_id):
+                book = self.books.get(isbn)
+                if not book:
+                    print("Invalid book ISBN.")
+                    return False
+                if user_id not in self.users:
+                    print("Invalid user ID.")
+                    return False
+                hold = Hold(isbn, user_id, priority)
+                if not self.holds.place(hold):
+                    print(f"User {user_id} already has a hold on ISBN {isbn}.")
+                    return False
+                allocated = self._allocate_copies(book)
+
+            self.hold_writer.write((isbn, user_id), hold)
+            self.logger.log(f"Hold placed: {hold}", event="hold_placed", isbn=isbn, user_id=user_id)
+            print(f"Hold placed: {hold}")
+            self._persist_allocations(book, allocated)
+            return True
+        except Exception as e:
+            print(f"An error occurred while placing a hold: {e}")
+            self.logger.log(f"Error while placing hold: {e}")
+            return False
+
+    @timed("cancel_hold")
+    def cancel_hold(self, isbn, user_id):
+        """
+        Cancels a user's hold on a book.
+
+        A copy that was already set aside goes to the next hold in the queue, or
+        back on the shelf if nobody else is waiting.
+
+        Parameters:
+        isbn (str): The ISBN of the book on hold.
+        user_id (str): The ID of the user who placed the hold.
+
+        Returns:
+        bool: True if a hold was cancelled.
+        """
+        try:
+            with self.book_locks.lock_for(isbn):
+                hold = self.holds.remove(isbn, user_id)
+                if not hold:
+                    print(f"User {user_id} has no hold on ISBN {isbn}.")
+                    return False
+                book = self.books.get(isbn)
+                allocated = []
+                if book and hold.status == READY:
+                    book.count += 1
+                    allocated = self._allocate_copies(book)
+
+            self.hold_writer.write((isbn, user_id), hold)
+            if book and hold.status == READY and not allocated:
+                self.book_writer.write(isbn, book)
+            self.logger.log(f"Hold cancelled: {hold}", event="hold_cancelled", isbn=isbn, user_id=user_id)
+            print(f"Hold cancelled: {hold}")
+            self._persist_allocations(book, allocated)
+            return True
+        except Exception as e:
+            print(f"An error occurred while cancelling a hold: {e}")
+            self.logger.log(f"Error while cancelling hold: {e}")
+            return False
+
+    @timed("ready_for_pickup")
+    def ready_for_pickup(self, user_id=None):
+        """
+        Lists the holds whose copies are waiting to be picked up.
+
+        Parameters:
+        user_id (str, optional): Only list this user's holds.
+
+        Returns:
+        list: The ready Hold objects, oldest first.
+        """
+        holds = self.holds.ready_for_pickup(user_id)
+        if holds:
+            for hold in holds:
+                print(hold)
+        else:
+            print("No holds are ready for pickup.")
+        return holds
+
+    @timed("loans_for_user")
+    def loans_for_user(self, user_id):
+        """
+        Lists the books a user currently has on loan.
+
+        Parameters:
+        user_id (str): The ID of the user.
+
+        Returns:
+        list: The user's open Loan objects, earliest due first.
+        """
+        loans = self.loans.loans_for_user(user_id)
+        if loans:
+            for loan in loans:
+                print(loan)
+        else:
+            print(f"User {user_id} has no books on loan.")
+        return loans
+
+    @timed("holders_of")
+    def holders_of(self, isbn):
+        """
+        Lists the users who currently have a copy of a book.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+
+        Returns:
+        list: The book's open Loan objects, earliest due first.
+        """
+        loans = self.loans.holders_of(isbn)
+        if loans:
+            for loan in loans:
+                print(loan)
+        else:
+            print(f"No copies of ISBN {isbn} are on loan.")
+        return loans
+
+    @timed("overdue_loans")
+    def overdue_loans(self, as_of=None):
+        """
+        Lists the loans that are past due.
+
+        Parameters:
+        as_of (float, optional): The time to check against, as a Unix timestamp.
+            Defaults to now.
+
+        Returns:
+        list: The overdue Loan objects, most overdue first.
+        """
+        loans = self.loans.overdue(as_of)
+        if loans:
+            for loan in loans:
+                print(loan)
+        else:
+            print("No loans are overdue.")
+        return loans
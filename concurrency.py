@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class KeyedLocks:
+    def __init__(self, stripes=1024):
+        """
+        Initializes a table of locks addressed by key (e.g., ISBN or user ID).
+
+        Keys are hashed onto a fixed number of lock stripes, so operations on
+        different keys rarely wait for each other while memory stays bounded no
+        matter how many keys exist.
+
+        Parameters:
+        stripes (int): The number of locks in the table.
+        """
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock_for(self, key):
+        """
+        Returns the lock guarding the given key.
+
+        Parameters:
+        key (str): The key to lock.
+
+        Returns:
+        threading.Lock: The lock for the key's stripe.
+        """
+        return self._locks[hash(key) % len(self._locks)]
+
+
+class CoalescingWriter:
+    def __init__(self, flush, window=0.0):
+        """
+        Initializes a group-commit writer that merges concurrent writes into one flush.
+
+        Each caller of write() registers its record and waits until a flush that
+        includes it has completed. Only one flush runs at a time; records submitted
+        meanwhile are written together by the next flush, so N concurrent mutations
+        cost one storage write instead of N.
+
+        Parameters:
+        flush (callable): Receives a list of records and persists them.
+        window (float): Seconds a flush waits for more records before writing. The
+            default of 0 writes as soon as the previous flush has finished.
+        """
+        self.flush = flush
+        self.window = window
+        self.batches = 0
+        self.records = 0
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._generation = 0  # number of batches taken for flushing
+        self._completed = 0  # number of batches flushed
+        self._flushing = False
+
+    def write(self, key, record):
+        """
+        Persists a record, sharing the flush with any concurrent writers.
+
+        A later write for the same key replaces a pending one, so only the latest
+        version is flushed.
+
+        Parameters:
+        key (str): The record's key (e.g., ISBN).
+        record: The record, or any value understood by the flush function.
+        """
+        self.write_many({key: record})
+
+    def write_many(self, records):
+        """
+        Persists several records together, sharing the flush with concurrent writers.
+
+        Parameters:
+        records (dict): The records to write, keyed like write()'s key argument.
+        """
+        with self._condition:
+            self._pending.update(records)
+            target = self._generation + 1
+            while self._completed < target:
+                if self._flushing:
+                    self._condition.wait()
+                    continue
+                self._flushing = True
+                if self.window:
+                    # Writes arriving during the window join this flush.
+                    self._condition.release()
+                    try:
+                        time.sleep(self.window)
+                    finally:
+                        self._condition.acquire()
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._generation += 1
+                generation = self._generation
+                self._condition.release()
+                try:
+                    self.flush(batch)
+                finally:
+                    self._condition.acquire()
+                    self._flushing = False
+                    self._completed = generation
+                    self.batches += 1
+                    self.records += len(batch)
+                    self._condition.notify_all()
+
+    def stats(self):
+        """
+        Returns the writer's counters.
+
+        Returns:
+        dict: The number of flushes and of records they contained.
+        """
+        with self._condition:
+            return {"batches": self.batches, "records": self.records}
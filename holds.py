@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import threading
+import time
+
+from models import format_fragment
+
+WAITING = "waiting"
+READY = "ready"
+
+
+class Hold:
+    __slots__ = ("isbn", "user_id", "priority", "placed_at", "status", "ready_at")
+
+    def __init__(self, isbn, user_id, priority=0, placed_at=None, status=WAITING, ready_at=None):
+        """
+        Initializes a hold placed by a user on a book.
+
+        Parameters:
+        isbn (str): The ISBN of the book on hold.
+        user_id (str): The ID of the user waiting for the book.
+        priority (int): Holds with a higher priority are served first. Defaults to 0.
+        placed_at (float, optional): When the hold was placed, as a Unix timestamp.
+            Defaults to now.
+        status (str): 'waiting' until a copy is set aside, then 'ready'.
+        ready_at (float, optional): When a copy was set aside for the hold.
+        """
+        self.isbn = isbn
+        self.user_id = user_id
+        self.priority = priority
+        self.placed_at = time.time() if placed_at is None else placed_at
+        self.status = status
+        self.ready_at = ready_at
+
+    def __str__(self):
+        state = "Ready for pickup" if self.status == READY else "Waiting"
+        return f"Hold on ISBN {self.isbn} for User {self.user_id} (Priority: {self.priority}) - {state}"
+
+    def to_dict(self):
+        """
+        Converts the Hold object to a dictionary for JSON serialization.
+
+        Returns:
+        dict: The dictionary representation of the Hold object.
+        """
+        return {
+            "isbn": self.isbn,
+            "user_id": self.user_id,
+            "priority": self.priority,
+            "placed_at": self.placed_at,
+            "status": self.status,
+            "ready_at": self.ready_at
+        }
+
+    def json_fragment(self, indent=None):
+        """
+        Returns the hold serialized as a JSON object, as it appears inside a list.
+
+        Parameters:
+        indent (int, optional): The indentation of the enclosing list. None gives a
+            compact, single-line object.
+
+        Returns:
+        str: The JSON text of the hold.
+        """
+        return format_fragment(self.to_dict(), indent)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a Hold object from a dictionary.
+
+        Parameters:
+        data (dict): The dictionary containing hold data.
+
+        Returns:
+        Hold: A new Hold instance created from the dictionary data.
+        """
+        return cls(data["isbn"], data["user_id"], data.get("priority", 0), data.get("placed_at"),
+                   data.get("status", WAITING), data.get("ready_at"))
+
+
+class HoldQueues:
+    def __init__(self, holds=()):
+        """
+        Initializes per-ISBN hold queues and an index of holds ready for pickup.
+
+        Each ISBN has a heap ordered by priority (highest first) and then by the
+        time the hold was placed, so the next hold to serve is found in O(log n).
+        Cancelled holds stay in the heap and are skipped when they reach the top.
+        Ready holds are indexed by user, so pickup queries never scan the catalog.
+
+        Parameters:
+        holds (iterable): Holds to restore, e.g. as loaded from storage.
+        """
+        self._queues = {}  # isbn -> heap of (-priority, placed_at, sequence, hold)
+        self._waiting = {}  # isbn -> number of live holds in the heap
+        self._holds = {}  # (isbn, user_id) -> active hold
+        self._ready = {}  # user_id -> {isbn: hold}
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        for hold in holds:
+            self._add(hold)
+
+    def _add(self, hold):
+        self._holds[(hold.isbn, hold.user_id)] = hold
+        if hold.status == READY:
+            self._ready.setdefault(hold.user_id, {})[hold.isbn] = hold
+        else:
+            heapq.heappush(self._queues.setdefault(hold.isbn, []),
+                           (-hold.priority, hold.placed_at, next(self._sequence), hold))
+            self._waiting[hold.isbn] = self._waiting.get(hold.isbn, 0) + 1
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._holds.values()))
+
+    def __len__(self):
+        return len(self._holds)
+
+    def get(self, isbn, user_id):
+        """
+        Returns a user's active hold on a book.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+        user_id (str): The ID of the user.
+
+        Returns:
+        Hold: The waiting or ready hold, or None.
+        """
+        return self._holds.get((isbn, user_id))
+
+    def waiting(self, isbn):
+        """
+        Returns the number of holds still waiting for a copy of a book.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+
+        Returns:
+        int: The number of waiting holds.
+        """
+        return self._waiting.get(isbn, 0)
+
+    def place(self, hold):
+        """
+        Adds a hold to the end of its book's queue, after any higher priority holds.
+
+        Parameters:
+        hold (Hold): The hold to place.
+
+        Returns:
+        bool: False if the user already has an active hold on the book.
+        """
+        with self._lock:
+            if (hold.isbn, hold.user_id) in self._holds:
+                return False
+            self._add(hold)
+            return True
+
+    def allocate(self, isbn, now=None):
+        """
+        Sets a copy of a book aside for the next waiting hold.
+
+        Parameters:
+        isbn (str): The ISBN of the returned copy.
+        now (float, optional): The allocation time. Defaults to now.
+
+        Returns:
+        Hold: The hold that is now ready for pickup, or None if nobody is waiting.
+        """
+        with self._lock:
+            queue = self._queues.get(isbn)
+            while queue:
+                hold = heapq.heappop(queue)[3]
+                if self._holds.get((isbn, hold.user_id)) is not hold:
+                    continue  # cancelled while waiting
+                if not queue:
+                    del self._queues[isbn]
+                self._waiting[isbn] -= 1
+                if not self._waiting[isbn]:
+                    del self._waiting[isbn]
+                hold.status = READY
+                hold.ready_at = time.time() if now is None else now
+                self._ready.setdefault(hold.user_id, {})[isbn] = hold
+                return hold
+            self._queues.pop(isbn, None)
+            return None
+
+    def remove(self, isbn, user_id):
+        """
+        Removes a user's active hold, whether it is waiting or ready.
+
+        Used both when a hold is cancelled and when a ready hold is picked up.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+        user_id (str): The ID of the user.
+
+        Returns:
+        Hold: The removed hold, or None if the user had no hold on the book.
+        """
+        with self._lock:
+            hold = self._holds.pop((isbn, user_id), None)
+            if hold is None:
+                return None
+            if hold.status == READY:
+                ready = self._ready[user_id]
+                del ready[isbn]
+                if not ready:
+                    del self._ready[user_id]
+            else:
+                # The heap entry is skipped once it reaches the top, or dropped
+                # with the whole heap when no live holds remain.
+                self._waiting[isbn] -= 1
+                if not self._waiting[isbn]:
+                    del self._waiting[isbn]
+                    del self._queues[isbn]
+            return hold
+
+    def ready_for_pickup(self, user_id=None):
+        """
+        Returns the holds whose copies are waiting to be picked up.
+
+        Parameters:
+        user_id (str, optional): Only return this user's holds.
+
+        Returns:
+        list: The ready holds, oldest allocation first.
+        """
+        with self._lock:
+            if user_id is not None:
+                holds = list(self._ready.get(user_id, {}).values())
+            else:
+                holds = [hold for ready in self._ready.values() for hold in ready.values()]
+        return sorted(holds, key=lambda hold: hold.ready_at)
@@ -0,0 +1,216 @@
+import os
+
+from metrics import timed
+from storage import Storage, atomic_write, dump_lines, dump_records
+
+
+class JournalStorage(Storage):
+    def __init__(self, books_file='books.json', users_file='users.json', compact_every=1000, indent=4,
+                 durability="always", flush_interval=0.05):
+        """
+        Initializes a storage engine that appends one record per mutation to a journal.
+
+        The regular JSON files are kept as snapshots. Each add, update or delete is
+        appended to '<file>.journal' as a single JSON line, replayed on load, and
+        folded back into the snapshot every `compact_every` entries.
+
+        Parameters:
+        books_file (str): Path to the JSON snapshot for books.
+        users_file (str): Path to the JSON snapshot for users.
+        compact_every (int): Number of journal entries after which the snapshot is rewritten.
+        indent (int, optional): Indentation of the snapshots. None writes compact
+            snapshots with one record per line.
+        durability (str): When journal appends are fsynced: "always", "interval" or
+            "shutdown" (see Storage). Snapshots are always written and synced before
+            the journal is emptied.
+        flush_interval (float): Seconds between background fsyncs in "interval" mode.
+        """
+        super().__init__(books_file, users_file, indent, durability, flush_interval)
+        self.compact_every = compact_every
+        self.books_journal = f"{books_file}.journal"
+        self.users_journal = f"{users_file}.journal"
+        self._pending = {self.books_journal: 0, self.users_journal: 0}
+
+    def _append(self, journal_file, *entries):
+        """
+        Appends entries to a journal file with a single write.
+
+        Parameters:
+        journal_file (str): The journal to append to.
+        *entries (dict): The journal entries to write.
+
+        Returns:
+        bool: True if the journal has grown enough to be compacted.
+        """
+        self._append_text(journal_file, dump_lines(entries))
+        self._pending[journal_file] += len(entries)
+        return self._pending[journal_file] >= self.compact_every
+
+    def _replay(self, journal_file, records, key, record_cls):
+        """
+        Applies the entries of a journal file on top of the snapshot records.
+
+        The journal is read with Storage._read_log, which handles torn and
+        unreadable lines.
+
+        Parameters:
+        journal_file (str): The journal to replay.
+        records (list): The records loaded from the snapshot.
+        key (str): The attribute identifying a record (e.g., 'isbn').
+        record_cls (type): The class used to rebuild records (Book or User).
+
+        Returns:
+        list: The records with every journal entry applied.
+        """
+        by_key = {getattr(record, key): record for record in records}
+        applied = 0
+        for entry in self._read_log(journal_file):
+            if entry["op"] == "put":
+                record = record_cls.from_dict(entry["data"])
+                by_key[getattr(record, key)] = record
+            elif entry["op"] == "delete":
+                by_key.pop(entry["key"], None)
+            applied += 1
+        self._pending[journal_file] = applied
+        return list(by_key.values())
+
+    def _truncate(self, journal_file):
+        """
+        Empties a journal once its entries are contained in the snapshot.
+
+        Parameters:
+        journal_file (str): The journal to truncate.
+        """
+        if os.path.exists(journal_file):
+            open(journal_file, 'w').close()
+        self._pending[journal_file] = 0
+
+    @timed("save_books")
+    def save_books(self, books):
+        """
+        Writes a full books snapshot and empties the books journal.
+
+        Parameters:
+        books (iterable): The Book objects to be saved.
+        """
+        try:
+            with self._write_lock:
+                atomic_write(self.books_file, dump_records(books, self.indent))
+            self._truncate(self.books_journal)
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("save_book")
+    def save_book(self, book, books):
+        """
+        Appends a single added or updated book to the journal.
+
+        Parameters:
+        book (Book): The book that was added or updated.
+        books (iterable): All books, written out when the journal is compacted.
+        """
+        try:
+            if self._append(self.books_journal, {"op": "put", "data": book.to_dict()}):
+                self.save_books(books)
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("save_book_batch")
+    def save_book_batch(self, changed, books):
+        """
+        Appends several added or updated books to the journal in one write.
+
+        Parameters:
+        changed (list): The books that were added or updated.
+        books (iterable): All books, written out when the journal is compacted.
+        """
+        try:
+            if self._append(self.books_journal, *({"op": "put", "data": book.to_dict()} for book in changed)):
+                self.save_books(books)
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("load_books")
+    def load_books(self):
+        """
+        Loads the books snapshot and replays the books journal on top of it.
+
+        Returns:
+        list: A list of Book objects.
+        """
+        from book import Book
+        return self._replay(self.books_journal, super().load_books(), "isbn", Book)
+
+    @timed("save_users")
+    def save_users(self, users):
+        """
+        Writes a full users snapshot and empties the users journal.
+
+        Parameters:
+        users (iterable): The User objects to be saved.
+        """
+        try:
+            with self._write_lock:
+                atomic_write(self.users_file, dump_records(users, self.indent))
+            self._truncate(self.users_journal)
+        except IOError as e:
+            print(f"An error occurred while saving users: {e}")
+
+    @timed("save_user")
+    def save_user(self, user, users):
+        """
+        Appends a single added or updated user to the journal.
+
+        Parameters:
+        user (User): The user that was added or updated.
+        users (iterable): All users, written out when the journal is compacted.
+        """
+        try:
+            if self._append(self.users_journal, {"op": "put", "data": user.to_dict()}):
+                self.save_users(users)
+        except IOError as e:
+            print(f"An error occurred while saving users: {e}")
+
+    @timed("remove_user")
+    def remove_user(self, user, users):
+        """
+        Appends the deletion of a single user to the journal.
+
+        Parameters:
+        user (User): The user that was deleted.
+        users (iterable): The remaining users, written out when the journal is compacted.
+        """
+        try:
+            if self._append(self.users_journal, {"op": "delete", "key": user.user_id}):
+                self.save_users(users)
+        except IOError as e:
+            print(f"An error occurred while saving users: {e}")
+
+    @timed("save_user_batch")
+    def save_user_batch(self, saved, removed, users):
+        """
+        Appends several user changes to the journal in one write.
+
+        Parameters:
+        saved (list): The users that were added or updated.
+        removed (list): The users that were deleted.
+        users (iterable): The current users, written out when the journal is compacted.
+        """
+        entries = [{"op": "put", "data": user.to_dict()} for user in saved]
+        entries.extend({"op": "delete", "key": user.user_id} for user in removed)
+        try:
+            if self._append(self.users_journal, *entries):
+                self.save_users(users)
+        except IOError as e:
+            print(f"An error occurred while saving users: {e}")
+
+    @timed("load_users")
+    def load_users(self):
+        """
+        Loads the users snapshot and replays the users journal on top of it.
+
+        Returns:
+        list: A list of User objects.
+        """
+        from user import User
+        return self._replay(self.users_journal, super().load_users(), "user_id", User)
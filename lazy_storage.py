@@ -0,0 +1,536 @@
+import array
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+
+from catalog import Catalog
+from metrics import timed
+from storage import Storage, fsync
+
+ISBN_PREFIX = re.compile(rb'^\{"isbn": ?("(?:[^"\\]|\\.)*")')
+INDEX_MAGIC = b"BKIDX002"
+# magic, inode, indexed size, crc32 of the bytes just before the indexed size, entry count, line count
+INDEX_HEADER = struct.Struct("<8sQQIQQ")
+CHECK_BYTES = 64
+READ_CHUNK = 4096
+
+
+def _record_line(book):
+    """
+    Serializes a book as a JSON Lines record with the ISBN as its first key.
+
+    Parameters:
+    book (Book): The book to serialize.
+
+    Returns:
+    bytes: The encoded line, including the trailing newline.
+    """
+    data = book.to_dict()
+    line = {"isbn": data.pop("isbn")}
+    line.update(data)
+    return (json.dumps(line) + "\n").encode()
+
+
+def _isbn_of(line):
+    """
+    Extracts the ISBN from a JSON Lines record.
+
+    Parameters:
+    line (bytes): The record.
+
+    Returns:
+    str: The record's ISBN.
+    """
+    match = ISBN_PREFIX.match(line)
+    if match:
+        return json.loads(match.group(1))
+    return json.loads(line)["isbn"]
+
+
+def _fingerprint(fd, size):
+    return zlib.crc32(os.pread(fd, CHECK_BYTES, max(size - CHECK_BYTES, 0)))
+
+
+def _cut_torn_line(path):
+    """
+    Cuts off an unfinished last line, left behind by a crash mid-append, so that
+    the file can be read and later appends start on a clean line.
+
+    Parameters:
+    path (str): The JSON Lines file.
+    """
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0 or os.pread(f.fileno(), 1, end - 1) == b"\n":
+            return
+        while end > 0:
+            start = max(end - READ_CHUNK, 0)
+            newline = os.pread(f.fileno(), end - start, start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+    print(f"Discarding incomplete record at the end of {path}.")
+    os.truncate(path, end)
+
+
+class LazyCatalog(Catalog):
+    def __init__(self, books_file, index_file):
+        """
+        Initializes a catalog that reads books from a JSON Lines file on demand.
+
+        Only an array of record offsets sorted by ISBN is kept in memory, read from
+        the index file when it is up to date, so opening the catalog costs no
+        per-record parsing. Books looked up by ISBN are parsed on first access and
+        cached. Iterating yields books in file order without caching them. Lines
+        appended after the index was written are scanned at startup; a later line
+        for an ISBN replaces the earlier one. An unfinished last line is cut off.
+
+        Parameters:
+        books_file (str): Path to the JSON Lines file holding books.
+        index_file (str): Path to the offset index kept next to it.
+        """
+        super().__init__(key="isbn")
+        self.books_file = books_file
+        self.index_file = index_file
+        self._lock = threading.RLock()  # guards the descriptor and offsets, which reopen() replaces
+        self._open()
+        self._count = len(self._offsets) + sum(1 for isbn in self._tail if self._find_indexed(isbn) is None)
+        self._removed = set()
+
+    def _open(self):
+        """
+        Opens the books file, its offset index and the lines appended after the index.
+        """
+        _cut_torn_line(self.books_file)
+        self._fd = os.open(self.books_file, os.O_RDONLY)
+        self._offsets = self._load_index()
+        self._tail, self.tail_lines = self._scan(self._indexed_size, os.fstat(self._fd).st_size)
+
+    def close(self):
+        """
+        Closes the underlying books file.
+        """
+        os.close(self._fd)
+
+    def reopen(self):
+        """
+        Switches to the books file after it was rewritten, e.g. by LazyStorage.save_books.
+
+        Books already loaded stay in memory, so callers keep the same objects.
+        """
+        with self._lock:
+            fd = self._fd
+            self._open()
+            os.close(fd)
+
+    @property
+    def superseded(self):
+        """
+        The number of lines in the indexed part of the file that a later line replaced.
+        """
+        return self._indexed_lines - len(self._offsets)
+
+    def _load_index(self):
+        """
+        Opens the offset index, rebuilding it when it is missing or out of date.
+
+        Returns:
+        A sequence of record offsets sorted by ISBN.
+        """
+        stat = os.fstat(self._fd)
+        try:
+            with open(self.index_file, 'rb') as f:
+                magic, inode, size, check, count, lines = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if (magic == INDEX_MAGIC and inode == stat.st_ino and size <= stat.st_size
+                        and check == _fingerprint(self._fd, size)):
+                    self._indexed_size = size
+                    self._indexed_lines = lines
+                    offsets = array.array('Q')
+                    offsets.frombytes(f.read(count * offsets.itemsize))
+                    return offsets
+        except (FileNotFoundError, struct.error):
+            pass
+        latest, lines = self._scan(0, stat.st_size)
+        self._indexed_size = stat.st_size
+        self._indexed_lines = lines
+        offsets = array.array('Q', (latest[isbn] for isbn in sorted(latest)))
+        write_index(self.index_file, self._fd, stat.st_size, offsets, lines)
+        return offsets
+
+    def update_index(self):
+        """
+        Adds the lines appended since the index was written to the offset index and
+        rewrites the index file, so the next startup does not scan them.
+
+        If the books file was replaced meanwhile, it is reopened instead.
+        """
+        with self._lock:
+            if os.stat(self.books_file).st_ino != os.fstat(self._fd).st_ino:
+                self.reopen()
+                return
+            size = os.fstat(self._fd).st_size
+            latest, lines = self._scan(self._indexed_size, size)
+            offsets = array.array('Q', self._offsets)
+            inserted = []
+            for isbn in sorted(latest):
+                position, found = self._search(isbn)
+                if found:
+                    offsets[position] = latest[isbn]
+                else:
+                    inserted.append((position, latest[isbn]))
+            if inserted:
+                merged = array.array('Q')
+                previous = 0
+                for position, offset in inserted:
+                    merged.extend(offsets[previous:position])
+                    merged.append(offset)
+                    previous = position
+                merged.extend(offsets[previous:])
+                offsets = merged
+            write_index(self.index_file, self._fd, size, offsets, self._indexed_lines + lines)
+            self._offsets = offsets
+            self._tail, self.tail_lines = {}, 0
+            self._indexed_size = size
+            self._indexed_lines += lines
+
+    def _scan(self, start, end):
+        """
+        Reads the records between two file offsets.
+
+        Parameters:
+        start (int): Offset of the first line to read.
+        end (int): Offset where reading stops.
+
+        Returns:
+        tuple: ISBN -> offset of the latest record for that ISBN, and the number of
+            records read.
+        """
+        latest = {}
+        lines = 0
+        if start >= end:
+            return latest, lines
+        with os.fdopen(os.dup(self._fd), 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if offset >= end:
+                    break
+                if line.strip():
+                    latest[_isbn_of(line)] = offset
+                    lines += 1
+                offset += len(line)
+        return latest, lines
+
+    def _read_line(self, offset):
+        line = b""
+        while True:
+            chunk = os.pread(self._fd, READ_CHUNK, offset + len(line))
+            end = chunk.find(b"\n")
+            if end >= 0 or not chunk:
+                return line + (chunk[:end + 1] if end >= 0 else chunk)
+            line += chunk
+
+    def _find(self, isbn):
+        """
+        Looks up the offset of an ISBN's latest record in the file.
+
+        Parameters:
+        isbn (str): The ISBN to look up.
+
+        Returns:
+        int: The record offset, or None if the file has no record for the ISBN.
+        """
+        offset = self._tail.get(isbn)
+        if offset is not None:
+            return offset
+        return self._find_indexed(isbn)
+
+    def _search(self, isbn):
+        """
+        Binary searches the offset index for an ISBN.
+
+        Returns:
+        tuple: The position of the ISBN in the index, or where it would be
+            inserted, and whether it was found.
+        """
+        low, high = 0, len(self._offsets)
+        while low < high:
+            middle = (low + high) // 2
+            found = _isbn_of(self._read_line(self._offsets[middle]))
+            if found == isbn:
+                return middle, True
+            if found < isbn:
+                low = middle + 1
+            else:
+                high = middle
+        return low, False
+
+    def _find_indexed(self, isbn):
+        position, found = self._search(isbn)
+        return self._offsets[position] if found else None
+
+    def _materialize(self, offset):
+        from book import Book
+        book = Book.from_dict(json.loads(self._read_line(offset)))
+        self._records[book.isbn] = book
+        return book
+
+    def __iter__(self):
+        from book import Book
+        with self._lock:
+            live = set(self._offsets)
+            for isbn, offset in self._tail.items():
+                live.discard(self._find_indexed(isbn))
+                live.add(offset)
+            end = os.fstat(self._fd).st_size
+            fd = os.dup(self._fd)
+        seen = set()
+        with os.fdopen(fd, 'rb') as f:
+            f.seek(0)
+            offset = 0
+            for line in f:
+                position, offset = offset, offset + len(line)
+                if position >= end:
+                    break
+                if not line.strip():
+                    continue
+                isbn = _isbn_of(line)
+                if isbn in seen or isbn in self._removed:
+                    continue
+                seen.add(isbn)
+                book = self._records.get(isbn)
+                if book is None:
+                    if position in live:
+                        book = Book.from_dict(json.loads(line))
+                    else:
+                        # A later line supersedes this one; keep the first position.
+                        book = self.get(isbn)
+                yield book
+        for isbn, book in list(self._records.items()):
+            if isbn not in seen:
+                yield book
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        if key in self._records:
+            return True
+        with self._lock:
+            return key not in self._removed and self._find(key) is not None
+
+    def get(self, key, default=None):
+        book = self._records.get(key)
+        if book is not None:
+            return book
+        with self._lock:
+            book = self._records.get(key)
+            if book is not None:
+                return book
+            if key in self._removed:
+                return default
+            offset = self._find(key)
+            if offset is None:
+                return default
+            return self._materialize(offset)
+
+    def add(self, record):
+        key = getattr(record, self.key)
+        if key not in self:
+            self._count += 1
+        self._removed.discard(key)
+        super().add(record)
+
+    def remove(self, key):
+        record = self.get(key)
+        if record is None:
+            return None
+        self._records.pop(key, None)
+        self._removed.add(key)
+        self._count -= 1
+        for index in self._indexes:
+            index.remove(key)
+        return record
+
+    def add_index(self, index, populate=True):
+        if populate:
+            for record in self:
+                index.add(record)
+        self._indexes.append(index)
+        return index
+
+
+def write_index(index_file, fd, size, offsets, lines):
+    """
+    Writes the offset index for a books file.
+
+    Parameters:
+    index_file (str): Path of the index to write.
+    fd (int): An open descriptor of the books file.
+    size (int): Size of the books file covered by the index.
+    offsets (array): The offsets of the latest record for each ISBN, sorted by ISBN.
+    lines (int): The number of records in the covered part of the file,
+        including superseded ones.
+    """
+    header = INDEX_HEADER.pack(INDEX_MAGIC, os.fstat(fd).st_ino, size, _fingerprint(fd, size), len(offsets), lines)
+    temp_file = f"{index_file}.tmp"
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(header)
+            f.write(offsets.tobytes())
+        os.replace(temp_file, index_file)
+    except IOError as e:
+        print(f"An error occurred while writing the book index: {e}")
+
+
+class LazyStorage(Storage):
+    def __init__(self, books_file='books.jsonl', users_file='users.json', durability="always", flush_interval=0.05,
+                 compact_every=1000):
+        """
+        Initializes a storage engine that loads books lazily from a JSON Lines file.
+
+        load_books returns a LazyCatalog that materializes Book objects on demand.
+        Single-book saves append a line to the file; save_books rewrites it and its
+        offset index. Every `compact_every` appended lines are added to the offset
+        index, so startup never scans more than that many. Once the file holds at
+        least as many superseded lines as books, it is compacted with save_books.
+        Users are stored as regular JSON.
+
+        Parameters:
+        books_file (str): Path to the JSON Lines file for storing books.
+        users_file (str): Path to the JSON file for storing users.
+        durability (str): When appends and user saves reach the disk: "always",
+            "interval" or "shutdown" (see Storage).
+        flush_interval (float): Seconds between background writes in "interval" mode.
+        compact_every (int): Number of appended lines after which the index is updated.
+        """
+        super().__init__(books_file, users_file, durability=durability, flush_interval=flush_interval)
+        self.index_file = f"{books_file}.idx"
+        self.compact_every = compact_every
+        self._appended = 0
+
+    @timed("save_books")
+    def save_books(self, books):
+        """
+        Rewrites the books file and its offset index.
+
+        Parameters:
+        books (iterable): The Book objects to be saved.
+        """
+        temp_file = f"{self.books_file}.tmp"
+        latest = {}
+        try:
+            with open(temp_file, 'wb') as f:
+                for book in books:
+                    latest[book.isbn] = f.tell()
+                    f.write(_record_line(book))
+                f.flush()
+                fsync(f.fileno())
+            os.replace(temp_file, self.books_file)
+            fd = os.open(self.books_file, os.O_RDONLY)
+            try:
+                offsets = array.array('Q', (latest[isbn] for isbn in sorted(latest)))
+                write_index(self.index_file, fd, os.fstat(fd).st_size, offsets, len(offsets))
+            finally:
+                os.close(fd)
+            self._appended = 0
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    def _count_appended(self, lines, books):
+        """
+        Counts appended lines, updating the index or compacting the file every
+        `compact_every` lines.
+
+        Parameters:
+        lines (int): The number of lines just appended.
+        books (iterable): All books, written out when the file is compacted.
+        """
+        self._appended += lines
+        if self._appended < self.compact_every:
+            return
+        if not isinstance(books, LazyCatalog) or books.books_file != self.books_file:
+            self.save_books(books)
+            return
+        books.update_index()
+        self._appended = 0
+        if books.superseded >= max(self.compact_every, len(books)):
+            self.save_books(books)
+            books.reopen()
+
+    @timed("save_book")
+    def save_book(self, book, books):
+        """
+        Appends the new version of a single book to the books file.
+
+        Parameters:
+        book (Book): The book that was added or updated.
+        books (iterable): All books, whose index is updated and which are written out
+            when the file is compacted.
+        """
+        try:
+            with open(self.books_file, 'ab') as f:
+                f.write(_record_line(book))
+                self._sync_append(f)
+            self._count_appended(1, books)
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("save_book_batch")
+    def save_book_batch(self, changed, books):
+        """
+        Appends the new versions of several books to the books file in one write.
+
+        Parameters:
+        changed (list): The books that were added or updated.
+        books (iterable): All books, whose index is updated and which are written out
+            when the file is compacted.
+        """
+        try:
+            with open(self.books_file, 'ab') as f:
+                f.write(b"".join(_record_line(book) for book in changed))
+                self._sync_append(f)
+            self._count_appended(len(changed), books)
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("load_books")
+    def load_books(self):
+        """
+        Opens the books file as a lazily loaded catalog.
+
+        Returns:
+        LazyCatalog: The catalog, or an empty list if the file does not exist.
+        """
+        if not os.path.exists(self.books_file):
+            print(f"{self.books_file} not found. Returning an empty list.")
+            return []
+        catalog = LazyCatalog(self.books_file, self.index_file)
+        self._appended = catalog.tail_lines
+        return catalog
+
+
+def convert_json_to_jsonl(json_file='books.json', jsonl_file='books.jsonl'):
+    """
+    Converts a books.json file into the JSON Lines format used by LazyStorage.
+
+    Parameters:
+    json_file (str): Path to the existing JSON file.
+    jsonl_file (str): Path of the JSON Lines file to write.
+
+    Returns:
+    int: The number of books converted.
+    """
+    books = Storage(books_file=json_file).load_books()
+    LazyStorage(books_file=jsonl_file).save_books(books)
+    return len(books)
+
+
+if __name__ == "__main__":
+    # Usage: python lazy_storage.py [books.json] [books.jsonl]
+    print(f"Converted {convert_json_to_jsonl(*sys.argv[1:3])} books.")
@@ -0,0 +1,358 @@
+import base64
+import bisect
+import collections
+import json
+import threading
+
+DEFAULT_PAGE_SIZE = 50
+MAX_INDEXES = 16  # sorted indexes kept per catalog, see Listing.index()
+CHUNK = 64  # entries copied per lock acquisition while iterating
+
+
+def encode_cursor(entry):
+    """
+    Encodes an index entry as an opaque cursor string.
+
+    Parameters:
+    entry (tuple): The (sort value, record key) pair of the last record returned.
+
+    Returns:
+    str: A URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(entry)).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by encode_cursor().
+
+    Parameters:
+    cursor (str): The cursor.
+
+    Returns:
+    tuple: The (sort value, record key) pair.
+
+    Raises:
+    ValueError: If the cursor is malformed.
+    """
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return value, key
+
+
+class SortedIndex:
+    BUCKET_SIZE = 512
+    tracks_status = True  # also told about count and availability changes, see Catalog.status_changed()
+
+    def __init__(self, key, sort_value, predicate=None):
+        """
+        Initializes a sorted secondary index over the records of a catalog.
+
+        Entries are (sort value, record key) pairs, so records with equal sort
+        values are ordered by key. They live in sorted buckets of bounded size
+        with each bucket's largest entry kept in a separate list, so a change costs
+        O(log n) plus a short bucket shift, and reading k entries from any position
+        costs O(log n + k).
+
+        Parameters:
+        key (str): The attribute identifying a record (e.g., 'isbn').
+        sort_value (callable): Returns the value a record is sorted by.
+        predicate (callable, optional): Returns whether a record belongs in the
+            index. Records it rejects are left out. Defaults to every record.
+        """
+        self.key = key
+        self.sort_value = sort_value
+        self.predicate = predicate
+        self._entries = {}  # record key -> its entry
+        self._buckets = []
+        self._maxes = []
+        self._touched = None  # keys changed while build() reads the records
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, records):
+        """
+        Fills the index from many records at once with a single sort.
+
+        The index may already be attached to the catalog. A record added, changed
+        or removed while `records` is being read keeps the entry that change gave
+        it, and the entry read for it is dropped, so no change is lost or undone.
+
+        Parameters:
+        records (iterable): The records to index.
+        """
+        with self._lock:
+            self._touched = set()
+        predicate = self.predicate
+        entries = sorted((self.sort_value(record), getattr(record, self.key)) for record in records
+                         if predicate is None or predicate(record))
+        with self._lock:
+            touched, self._touched = self._touched, None
+            current = self._entries
+            if touched or current:
+                entries = [entry for entry in entries if entry[1] not in touched and entry[1] not in current]
+                entries = sorted(entries + sorted(current.values()))  # merges two sorted runs
+            self._entries = {entry[1]: entry for entry in entries}
+            self._buckets = [entries[i:i + self.BUCKET_SIZE] for i in range(0, len(entries), self.BUCKET_SIZE)]
+            self._maxes = [bucket[-1] for bucket in self._buckets]
+
+    def _insert(self, entry):
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            return
+        position = min(bisect.bisect_left(self._maxes, entry), len(self._maxes) - 1)
+        bucket = self._buckets[position]
+        bisect.insort(bucket, entry)
+        self._maxes[position] = bucket[-1]
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            self._buckets[position:position + 1] = [bucket[:self.BUCKET_SIZE], bucket[self.BUCKET_SIZE:]]
+            self._maxes[position:position + 1] = [bucket[self.BUCKET_SIZE - 1], bucket[-1]]
+
+    def _delete(self, entry):
+        position = bisect.bisect_left(self._maxes, entry)
+        bucket = self._buckets[position]
+        del bucket[bisect.bisect_left(bucket, entry)]
+        if bucket:
+            self._maxes[position] = bucket[-1]
+        else:
+            del self._buckets[position]
+            del self._maxes[position]
+
+    def add(self, record):
+        """
+        Indexes a record, moving it if its sort value or membership changed.
+
+        Parameters:
+        record: The record to index.
+        """
+        key = getattr(record, self.key)
+        entry = (self.sort_value(record), key) if self.predicate is None or self.predicate(record) else None
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(key)
+            previous = self._entries.get(key)
+            if previous == entry:
+                return
+            if previous is not None:
+                self._delete(previous)
+            if entry is None:
+                del self._entries[key]
+            else:
+                self._insert(entry)
+                self._entries[key] = entry
+
+    def update(self, record):
+        """
+        Re-indexes a record after it was changed in place.
+
+        Parameters:
+        record: The record that was modified.
+        """
+        self.add(record)
+
+    def remove(self, key):
+        """
+        Removes a record from the index.
+
+        Parameters:
+        key (str): The key of the removed record.
+        """
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(key)
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._delete(entry)
+
+    def _chunk(self, bound, reverse):
+        """Returns up to CHUNK entries strictly after (or, in reverse, before) the bound."""
+        chunk = []
+        with self._lock:
+            buckets = self._buckets
+            if not buckets:
+                return chunk
+            if not reverse:
+                if bound is None:
+                    position, start = 0, 0
+                else:
+                    position = bisect.bisect_right(self._maxes, bound)  # first bucket with entries past the bound
+                    start = bisect.bisect_right(buckets[position], bound) if position < len(buckets) else 0
+                while position < len(buckets) and len(chunk) < CHUNK:
+                    chunk.extend(buckets[position][start:start + CHUNK - len(chunk)])
+                    position, start = position + 1, 0
+                return chunk
+            position = len(buckets) - 1 if bound is None else bisect.bisect_left(self._maxes, bound)
+            if position == len(buckets):
+                position -= 1  # every entry is before the bound
+                end = len(buckets[position])
+            else:
+                end = len(buckets[position]) if bound is None else bisect.bisect_left(buckets[position], bound)
+            while position >= 0 and len(chunk) < CHUNK:
+                bucket = buckets[position]
+                chunk.extend(reversed(bucket[max(end - (CHUNK - len(chunk)), 0):end]))
+                position -= 1
+                end = len(buckets[position]) if position >= 0 else 0
+            return chunk
+
+    def entries(self, after=None, reverse=False):
+        """
+        Yields the entries in sort order, starting past a given entry.
+
+        The index is read a chunk at a time, so records may be changed while a
+        caller is iterating; iteration continues from the last entry returned.
+
+        Parameters:
+        after (tuple, optional): Start strictly after this (sort value, key) entry,
+            which need not be in the index. Defaults to the first entry.
+        reverse (bool): Iterate in descending order.
+
+        Returns:
+        iterator: The (sort value, record key) entries.
+        """
+        bound = after
+        while True:
+            chunk = self._chunk(bound, reverse)
+            if not chunk:
+                return
+            yield from chunk
+            bound = chunk[-1]
+
+
+class Listing:
+    def __init__(self, catalog, sort_orders, core_fields, max_indexes=MAX_INDEXES):
+        """
+        Initializes sorted, filtered, paginated listing over a catalog.
+
+        Each combination of sort order and filters is served by its own SortedIndex,
+        built on first use and then kept up to date by the catalog. At most
+        `max_indexes` are kept; the least recently used one is detached beyond that.
+
+        Parameters:
+        catalog (Catalog): The records to list.
+        sort_orders (dict): Sort order name -> function returning a record's sort value.
+        core_fields (tuple): The names of the record's own attributes, as opposed
+            to its additional attributes (e.g., 'title', 'available').
+        max_indexes (int): The number of sorted indexes kept attached.
+        """
+        self.catalog = catalog
+        self.sort_orders = sort_orders
+        self.core_fields = frozenset(core_fields)
+        self.max_indexes = max_indexes
+        self._indexes = collections.OrderedDict()  # (sort, filters) -> SortedIndex
+        self._lock = threading.Lock()
+
+    def _predicate(self, filters):
+        """Returns a function telling whether a record matches every (field, value) filter."""
+        if not filters:
+            return None
+        core = [(field, value) for field, value in filters if field in self.core_fields]
+        extra = [(field, value) for field, value in filters if field not in self.core_fields]
+
+        def matches(record):
+            if any(getattr(record, field) != value for field, value in core):
+                return False
+            if extra:
+                attributes = record.additional_attributes
+                return all(field in attributes and attributes[field] == value for field, value in extra)
+            return True
+        return matches
+
+    def index(self, sort, filters=None):
+        """
+        Returns the sorted index for a sort order and filters, building it on first use.
+
+        Parameters:
+        sort (str): The sort order name.
+        filters (dict, optional): Field -> required value. Core fields and
+            additional attributes can both be used; records without an additional
+            attribute never match a filter on it.
+
+        Returns:
+        SortedIndex: The index, kept up to date by the catalog afterwards.
+
+        Raises:
+        ValueError: If the sort order is unknown.
+        """
+        if sort not in self.sort_orders:
+            raise ValueError(f"Unknown sort order: {sort}. Expected one of: {', '.join(self.sort_orders)}.")
+        filters = tuple(sorted((filters or {}).items()))
+        with self._lock:
+            index = self._indexes.get((sort, filters))
+            if index is not None:
+                self._indexes.move_to_end((sort, filters))
+                return index
+            index = SortedIndex(self.catalog.key, self.sort_orders[sort], self._predicate(filters))
+            # Attached first, so records changed while it is built are not missed.
+            self.catalog.add_index(index, populate=False)
+            try:
+                index.build(self.catalog)
+            except Exception:
+                self.catalog.remove_index(index)
+                raise
+            self._indexes[(sort, filters)] = index
+            while len(self._indexes) > self.max_indexes:
+                _, evicted = self._indexes.popitem(last=False)
+                self.catalog.remove_index(evicted)
+            return index
+
+    def _matches(self, sort, filters, cursor, reverse):
+        """Yields (record, index entry) pairs in sort order, starting after the cursor."""
+        after = decode_cursor(cursor) if cursor else None
+        entries = self.index(sort, filters).entries(after, reverse)
+        try:
+            for entry in entries:
+                record = self.catalog.get(entry[1])
+                if record is not None:
+                    yield record, entry
+        except TypeError as e:  # a cursor from another sort order
+            raise ValueError(f"Invalid cursor for sort order {sort}: {cursor}") from e
+
+    def iterate(self, sort, filters=None, cursor=None, reverse=False):
+        """
+        Yields the matching records in sort order, one at a time.
+
+        Parameters:
+        sort (str): The sort order name.
+        filters (dict, optional): Field -> required value, see index().
+        cursor (str, optional): Start after the record a previous page ended with.
+        reverse (bool): List in descending order.
+
+        Returns:
+        iterator: The records.
+        """
+        for record, _ in self._matches(sort, filters, cursor, reverse):
+            yield record
+
+    def page(self, sort, filters=None, cursor=None, reverse=False, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of matching records in sort order.
+
+        Parameters:
+        sort (str): The sort order name.
+        filters (dict, optional): Field -> required value, see index().
+        cursor (str, optional): The cursor returned with the previous page.
+        reverse (bool): List in descending order.
+        limit (int): The page size.
+
+        Returns:
+        tuple: The records, and the cursor of the next page (None after the last page).
+
+        Raises:
+        ValueError: If the limit is not a positive integer, or the sort order or
+            cursor is invalid.
+        """
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise ValueError(f"limit must be a positive integer, not {limit!r}")
+        records = []
+        last = None
+        for record, entry in self._matches(sort, filters, cursor, reverse):
+            if len(records) >= limit:
+                return records, encode_cursor(last)  # there is at least one more record
+            records.append(record)
+            last = entry
+        return records, None
@@ -0,0 +1,263 @@
+import bisect
+import os
+import threading
+import time
+
+LOAN_PERIOD = 14 * 24 * 60 * 60  # seconds a copy may be kept, i.e. two weeks
+
+
+class Loan:
+    __slots__ = ("loan_id", "user_id", "isbn", "checked_out_at", "due_at", "returned_at")
+
+    def __init__(self, user_id, isbn, checked_out_at=None, due_at=None, returned_at=None, loan_id=None):
+        """
+        Initializes a loan of one copy of a book to a user.
+
+        Parameters:
+        user_id (str): The ID of the user borrowing the book.
+        isbn (str): The ISBN of the borrowed book.
+        checked_out_at (float, optional): When the copy was checked out, as a Unix
+            timestamp. Defaults to now.
+        due_at (float, optional): When the copy is due back. Defaults to LOAN_PERIOD
+            after checkout.
+        returned_at (float, optional): When the copy was returned, or None while on loan.
+        loan_id (str, optional): Unique identifier of the loan. Generated if omitted.
+        """
+        self.loan_id = loan_id or os.urandom(16).hex()
+        self.user_id = user_id
+        self.isbn = isbn
+        self.checked_out_at = time.time() if checked_out_at is None else checked_out_at
+        self.due_at = self.checked_out_at + LOAN_PERIOD if due_at is None else due_at
+        self.returned_at = returned_at
+
+    def __str__(self):
+        due = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.due_at))
+        state = "Returned" if self.returned_at is not None else f"Due {due}"
+        return f"Loan of ISBN {self.isbn} to User {self.user_id} - {state}"
+
+    def to_dict(self):
+        """
+        Converts the Loan object to a dictionary for JSON serialization.
+
+        Returns:
+        dict: The dictionary representation of the Loan object.
+        """
+        return {
+            "loan_id": self.loan_id,
+            "user_id": self.user_id,
+            "isbn": self.isbn,
+            "checked_out_at": self.checked_out_at,
+            "due_at": self.due_at,
+            "returned_at": self.returned_at
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a Loan object from a dictionary.
+
+        Parameters:
+        data (dict): The dictionary containing loan data.
+
+        Returns:
+        Loan: A new Loan instance created from the dictionary data.
+        """
+        return cls(data["user_id"], data["isbn"], data["checked_out_at"], data["due_at"],
+                   data.get("returned_at"), data["loan_id"])
+
+
+class DueDateIndex:
+    BUCKET_SIZE = 512
+
+    def __init__(self):
+        """
+        Initializes a sorted collection of (due_at, loan_id) pairs.
+
+        Entries live in sorted buckets of bounded size with each bucket's largest
+        entry kept in a separate list, so inserts and removes cost O(log n) plus a
+        short bucket shift, and a range scan from the start costs O(log n + k).
+        """
+        self._buckets = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, due_at, loan_id):
+        """
+        Adds an entry.
+
+        Parameters:
+        due_at (float): The due date of the loan.
+        loan_id (str): The ID of the loan.
+        """
+        entry = (due_at, loan_id)
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+        else:
+            position = min(bisect.bisect_left(self._maxes, entry), len(self._maxes) - 1)
+            bucket = self._buckets[position]
+            bisect.insort(bucket, entry)
+            self._maxes[position] = bucket[-1]
+            if len(bucket) > 2 * self.BUCKET_SIZE:
+                self._buckets[position:position + 1] = [bucket[:self.BUCKET_SIZE], bucket[self.BUCKET_SIZE:]]
+                self._maxes[position:position + 1] = [bucket[self.BUCKET_SIZE - 1], bucket[-1]]
+        self._len += 1
+
+    def remove(self, due_at, loan_id):
+        """
+        Removes an entry if present.
+
+        Parameters:
+        due_at (float): The due date the entry was added with.
+        loan_id (str): The ID of the loan.
+        """
+        entry = (due_at, loan_id)
+        position = bisect.bisect_left(self._maxes, entry)
+        if position == len(self._maxes):
+            return
+        bucket = self._buckets[position]
+        index = bisect.bisect_left(bucket, entry)
+        if index == len(bucket) or bucket[index] != entry:
+            return
+        del bucket[index]
+        self._len -= 1
+        if bucket:
+            self._maxes[position] = bucket[-1]
+        else:
+            del self._buckets[position]
+            del self._maxes[position]
+
+    def until(self, limit):
+        """
+        Returns the entries due before a time, earliest first.
+
+        Parameters:
+        limit (float): Entries with a due date strictly before this are returned.
+
+        Returns:
+        list: The (due_at, loan_id) pairs.
+        """
+        entries = []
+        for bucket in self._buckets:
+            if bucket[-1][0] < limit:
+                entries.extend(bucket)
+            else:
+                entries.extend(bucket[:bisect.bisect_left(bucket, (limit,))])
+                break
+        return entries
+
+
+class LoanLedger:
+    def __init__(self, loans=()):
+        """
+        Initializes the ledger of open loans with its user, ISBN and due-date indexes.
+
+        Only open loans are kept in memory; returned loans are handed to storage as
+        history. Every query therefore costs time proportional to its result, not
+        to the number of loans ever made.
+
+        Parameters:
+        loans (iterable): Open loans to restore, e.g. as loaded from storage.
+        """
+        self._loans = {}  # loan_id -> open loan
+        self._by_user = {}  # user_id -> {loan_id: loan}
+        self._by_isbn = {}  # isbn -> {loan_id: loan}
+        self._due = DueDateIndex()
+        self._lock = threading.RLock()
+        for loan in loans:
+            self.open(loan)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._loans.values()))
+
+    def __len__(self):
+        return len(self._loans)
+
+    def open(self, loan):
+        """
+        Records a new loan.
+
+        Parameters:
+        loan (Loan): The loan to record.
+        """
+        with self._lock:
+            self._loans[loan.loan_id] = loan
+            self._by_user.setdefault(loan.user_id, {})[loan.loan_id] = loan
+            self._by_isbn.setdefault(loan.isbn, {})[loan.loan_id] = loan
+            self._due.add(loan.due_at, loan.loan_id)
+
+    def close(self, isbn, user_id=None, returned_at=None):
+        """
+        Closes the loan for a returned copy.
+
+        When several loans match, the one due earliest is closed.
+
+        Parameters:
+        isbn (str): The ISBN of the returned copy.
+        user_id (str, optional): The user returning it. Any holder if omitted.
+        returned_at (float, optional): When the copy was returned. Defaults to now.
+
+        Returns:
+        Loan: The closed loan, or None if no matching loan was open.
+        """
+        with self._lock:
+            candidates = self._by_isbn.get(isbn, {}).values()
+            if user_id is not None:
+                candidates = [loan for loan in candidates if loan.user_id == user_id]
+            if not candidates:
+                return None
+            loan = min(candidates, key=lambda candidate: candidate.due_at)
+            del self._loans[loan.loan_id]
+            for index, key in ((self._by_user, loan.user_id), (self._by_isbn, loan.isbn)):
+                loans = index[key]
+                del loans[loan.loan_id]
+                if not loans:
+                    del index[key]
+            self._due.remove(loan.due_at, loan.loan_id)
+            loan.returned_at = time.time() if returned_at is None else returned_at
+            return loan
+
+    def loans_for_user(self, user_id):
+        """
+        Returns a user's open loans, earliest due first.
+
+        Parameters:
+        user_id (str): The ID of the user.
+
+        Returns:
+        list: The Loan objects.
+        """
+        with self._lock:
+            return sorted(self._by_user.get(user_id, {}).values(), key=lambda loan: loan.due_at)
+
+    def holders_of(self, isbn):
+        """
+        Returns the open loans of a book, earliest due first.
+
+        Parameters:
+        isbn (str): The ISBN of the book.
+
+        Returns:
+        list: The Loan objects.
+        """
+        with self._lock:
+            return sorted(self._by_isbn.get(isbn, {}).values(), key=lambda loan: loan.due_at)
+
+    def overdue(self, as_of=None):
+        """
+        Returns the open loans that are past due, most overdue first.
+
+        Parameters:
+        as_of (float, optional): The time to check against. Defaults to now.
+
+        Returns:
+        list: The Loan objects due before `as_of`.
+        """
+        as_of = time.time() if as_of is None else as_of
+        with self._lock:
+            loans = self._loans
+            return [loans[loan_id] for _, loan_id in self._due.until(as_of)]
@@ -1,4 +1,9 @@
+import atexit
+import collections
 import datetime
+import threading
+
+from metrics import timed
 
 class Logger:
     def __init__(self, log_file='library.log'):
@@ -10,29 +15,160 @@ class Logger:
         """
         self.log_file = log_file
 
-    def log(self, message):
+    @timed("logging")
+    def log(self, message, **fields):
         """
         Logs a message to the log file with the current timestamp.
 
         Parameters:
         message (str): The message to be logged.
+        **fields: Structured details of the event (e.g., event='check_out',
+            isbn='978...', user_id='U1'). The text log ignores them; an AuditLogger
+            stores and indexes them.
         """
-        try:
-            with open(self.log_file, 'a') as f:
-                f.write(f"{datetime.datetime.now()} - {message}\n")
-        except IOError as e:
-            print(f"An error occurred while writing to the log file: {e}")
+        self._emit(None, message, fields)
 
-    def log_custom(self, message, log_type="INFO"):
+    @timed("logging")
+    def log_custom(self, message, log_type="INFO", **fields):
         """
         Logs a message to the log file with a specified log type and timestamp.
 
         Parameters:
         message (str): The message to be logged.
         log_type (str): The type of log (e.g., 'INFO', 'WARNING', 'ERROR'). Defaults to 'INFO'.
+        **fields: Structured details of the event, see log().
+        """
+        self._emit(log_type, message, fields)
+
+    def _emit(self, log_type, message, fields):
+        """
+        Formats a record as a line of text and writes it.
+
+        Parameters:
+        log_type (str): The type of log, or None for plain log() records.
+        message (str): The message to be logged.
+        fields (dict): Structured details of the event, not written to the text log.
         """
+        if log_type is None:
+            self._write(f"{datetime.datetime.now()} - {message}\n")
+        else:
+            self._write(f"{datetime.datetime.now()} [{log_type}] - {message}\n")
+
+    def _write(self, line):
+        """
+        Appends a formatted line to the log file.
+
+        Parameters:
+        line (str): The line to write, including the trailing newline.
+        """
+        self._write_lines([line])
+
+    @timed("logging_io")
+    def _write_lines(self, lines):
         try:
             with open(self.log_file, 'a') as f:
-                f.write(f"{datetime.datetime.now()} [{log_type}] - {message}\n")
+                f.writelines(lines)
         except IOError as e:
             print(f"An error occurred while writing to the log file: {e}")
+
+
+class BufferedLogger(Logger):
+    def __init__(self, log_file='library.log', batch_size=100, flush_interval=1.0, max_queue=100000):
+        """
+        Initializes a Logger that queues records and writes them in batches.
+
+        Records are formatted exactly like Logger's, stored in memory and appended to
+        the log file by a background thread once `batch_size` records are waiting or
+        `flush_interval` seconds have passed. Pending records are flushed on close()
+        and at interpreter exit.
+
+        Parameters:
+        log_file (str): The file where logs will be written. Defaults to 'library.log'.
+        batch_size (int): Number of queued records that triggers a write.
+        flush_interval (float): Maximum number of seconds a record waits in the queue.
+        max_queue (int): Records arriving while this many are queued are dropped.
+        """
+        super().__init__(log_file)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"logger-{log_file}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _write(self, line):
+        """
+        Queues a formatted line for the background writer.
+
+        Parameters:
+        line (str): The line to write, including the trailing newline.
+        """
+        with self._condition:
+            if self._closed:
+                self._write_lines([line])
+                self.flushed += 1
+                return
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(line)
+            self.queued += 1
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._queue) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every queued record to the log file.
+        """
+        with self._write_lock:
+            with self._condition:
+                lines = list(self._queue)
+                self._queue.clear()
+            if lines:
+                self._write_lines(lines)
+                with self._condition:
+                    self.flushed += len(lines)
+
+    def close(self):
+        """
+        Stops the background writer and flushes the remaining records.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def stats(self):
+        """
+        Returns the logger's record counters.
+
+        Returns:
+        dict: The number of records queued, dropped, flushed and currently pending.
+        """
+        with self._condition:
+            return {
+                "queued": self.queued,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "pending": len(self._queue),
+            }
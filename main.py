@@ -1,5 +1,7 @@
 # This is a deliberately poorly implemented main script for a Library Management System.
 from check import Library
+from bulk_import import import_file
+from metrics import metrics
 
 library_obj = Library()
 def main_menu():
@@ -8,7 +10,9 @@ def main_menu():
     print("2. List Books")
     print("3. Add User")
     print("4. Checkout Book")
-    print("5. Exit")
+    print("5. Import From File")
+    print("6. Stats")
+    print("7. Exit")
     choice = input("Enter choice: ")
     return choice
 
@@ -35,6 +39,19 @@ def main():
             library_obj.check_out_book(isbn, user_id)
             
         elif choice == '5':
+            kind = input("Import books, users or book-updates: ")
+            path = input("Enter path to CSV or JSON Lines file: ")
+            import_file(library_obj, kind, path)
+
+        elif choice == '6':
+            print(metrics.report())
+            for kind, cache in library_obj.search_cache_stats().items():
+                print(f"Search cache ({kind}): {cache['hits']} hits, {cache['misses']} misses, "
+                      f"{cache['hit_rate']:.1%} hit rate")
+            if metrics.dump_profile("library.prof"):
+                print("Profile written to library.prof.")
+
+        elif choice == '7':
             print("Exiting.")
             break
         else:
@@ -0,0 +1,249 @@
+import atexit
+import cProfile
+import functools
+import os
+import threading
+from time import perf_counter
+
+BUCKETS = 32  # bucket i counts calls that took less than 2**i microseconds
+# Work done inside the operations. A phase includes the phases it calls, e.g. file_io
+# includes the fsync of the file it writes.
+PHASES = ("serialize", "deserialize", "file_io", "fsync", "logging", "logging_io")
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Initializes an empty latency histogram with power-of-two microsecond buckets.
+        """
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def record(self, seconds, failed=False):
+        """
+        Adds one call to the histogram.
+
+        Parameters:
+        seconds (float): How long the call took.
+        failed (bool): Whether the call raised an exception.
+        """
+        self.count += 1
+        if failed:
+            self.errors += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[bucket if bucket < BUCKETS else BUCKETS - 1] += 1
+
+    def percentile(self, fraction):
+        """
+        Estimates the given percentile of the recorded latencies.
+
+        The bucket holding the percentile is found by counting, and the value is
+        interpolated linearly between the bucket's edges, clamped to the smallest
+        and largest latency recorded.
+
+        Parameters:
+        fraction (float): The percentile as a fraction (e.g., 0.99).
+
+        Returns:
+        float: The estimated latency in seconds.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bucket, calls in enumerate(self.buckets):
+            if calls and seen + calls >= rank:
+                lower = 2 ** (bucket - 1) if bucket else 0
+                estimate = (lower + (2 ** bucket - lower) * (rank - seen) / calls) / 1e6
+                return min(max(estimate, self.min), self.max)
+            seen += calls
+        return self.max
+
+    def to_dict(self):
+        """
+        Summarizes the histogram.
+
+        Returns:
+        dict: The call and error counts, total time in milliseconds, and the mean,
+            minimum, p50, p90, p99 and maximum latencies in microseconds.
+        """
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1e3,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "min_us": (self.min or 0.0) * 1e6,
+            "p50_us": self.percentile(0.5) * 1e6,
+            "p90_us": self.percentile(0.9) * 1e6,
+            "p99_us": self.percentile(0.99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Initializes a disabled registry of per-operation latency histograms.
+
+        Operations are recorded by functions decorated with timed(). While the
+        registry is disabled a decorated call costs one attribute check on top of
+        the call itself. Calls nested inside a call of the same name (e.g. a storage
+        engine's load_books calling its parent's) are recorded once.
+        """
+        self.enabled = False
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = None
+
+    def enable(self, profile=False):
+        """
+        Starts recording.
+
+        Parameters:
+        profile (bool): Also run cProfile, see dump_profile(). The profiler only
+            sees the thread that called enable().
+        """
+        if profile:
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stops recording and profiling. Recorded statistics are kept.
+        """
+        self.enabled = False
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def reset(self):
+        """
+        Drops every recorded statistic.
+        """
+        with self._lock:
+            self._histograms.clear()
+
+    def record(self, name, seconds, failed=False):
+        """
+        Records one call of an operation.
+
+        Parameters:
+        name (str): The operation (e.g., 'check_out_book', 'serialize').
+        seconds (float): How long the call took.
+        failed (bool): Whether the call raised an exception.
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(seconds, failed)
+
+    def timed(self, name):
+        """
+        Returns a decorator that records the calls of a function under a name.
+
+        Parameters:
+        name (str): The operation the function performs.
+
+        Returns:
+        callable: The decorator.
+        """
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                try:
+                    active = self._local.active
+                except AttributeError:
+                    active = self._local.active = set()
+                if name in active:
+                    return function(*args, **kwargs)
+                active.add(name)
+                start = perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException:
+                    self.record(name, perf_counter() - start, True)
+                    raise
+                finally:
+                    active.discard(name)
+                self.record(name, perf_counter() - start)
+                return result
+            return wrapper
+        return decorate
+
+    def stats(self):
+        """
+        Returns the recorded statistics.
+
+        Returns:
+        dict: 'operations' and 'phases', each mapping a name to Histogram.to_dict().
+            Phases are the serialization, file I/O, fsync and logging work done
+            inside the operations.
+        """
+        with self._lock:
+            summaries = {name: histogram.to_dict() for name, histogram in self._histograms.items()}
+        return {
+            "operations": {name: summary for name, summary in sorted(summaries.items()) if name not in PHASES},
+            "phases": {name: summaries[name] for name in PHASES if name in summaries},
+        }
+
+    def report(self):
+        """
+        Formats the recorded statistics as a table.
+
+        Returns:
+        str: One line per operation and phase.
+        """
+        stats = self.stats()
+        lines = [f"{'':<22}{'count':>9}{'errors':>7}{'total ms':>11}{'mean us':>10}"
+                 f"{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>11}"]
+        for section in ("operations", "phases"):
+            lines.append(f"{section.capitalize()}:")
+            for name, s in stats[section].items():
+                lines.append(f"  {name:<20}{s['count']:>9}{s['errors']:>7}{s['total_ms']:>11.1f}{s['mean_us']:>10.1f}"
+                             f"{s['p50_us']:>10.0f}{s['p90_us']:>10.0f}{s['p99_us']:>10.0f}{s['max_us']:>11.0f}")
+        if not self.enabled and not any(stats.values()):
+            lines.append("Instrumentation is disabled; set LIBRARY_METRICS=1 to enable it.")
+        return "\n".join(lines)
+
+    def dump_profile(self, path):
+        """
+        Writes the cProfile statistics collected since enable(profile=True).
+
+        The file can be read with pstats or a viewer such as snakeviz.
+
+        Parameters:
+        path (str): The file to write.
+
+        Returns:
+        bool: False if profiling was not enabled.
+        """
+        if self._profiler is None:
+            return False
+        self._profiler.dump_stats(path)  # stops the profiler
+        if self.enabled:
+            self._profiler.enable()
+        return True
+
+
+metrics = Metrics()
+timed = metrics.timed
+
+# LIBRARY_METRICS=1 turns recording on for the whole process. LIBRARY_PROFILE=<file>
+# also profiles the main thread and writes the profile to <file> at exit.
+if os.environ.get("LIBRARY_PROFILE"):
+    metrics.enable(profile=True)
+    atexit.register(metrics.dump_profile, os.environ["LIBRARY_PROFILE"])
+elif os.environ.get("LIBRARY_METRICS", "") not in ("", "0"):
+    metrics.enable()
@@ -0,0 +1,177 @@
+import json
+import sys
+from collections.abc import MutableMapping
+
+_schemas = {}
+_encode = json.JSONEncoder().encode
+_encode_compact = json.JSONEncoder(separators=(',', ':')).encode
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def intern_schema(keys):
+    """
+    Returns the shared tuple for a sequence of attribute names.
+
+    Records with the same additional attributes (e.g., genre and year) share a
+    single interned tuple of names instead of each carrying its own dict keys.
+
+    Parameters:
+    keys (iterable): The attribute names, in order.
+
+    Returns:
+    tuple: The shared tuple of interned names.
+    """
+    schema = tuple(sys.intern(key) for key in keys)
+    return _schemas.setdefault(schema, schema)
+
+
+def format_fragment(data, indent=None):
+    """
+    Serializes a record's dictionary as a JSON object nested one level inside a list.
+
+    Parameters:
+    data (dict): The record's dictionary, e.g. from to_dict().
+    indent (int, optional): The indentation of the enclosing list. None gives a
+        compact, single-line object.
+
+    Returns:
+    str: The JSON text, identical to the element's text in json.dumps(records, indent=indent).
+    """
+    if indent is None:
+        return _encode_compact(data)
+    # Scalar values go through the C encoder rather than the pure Python indenting one.
+    padding = " " * indent
+    inner = padding * 2
+    members = []
+    for key, value in data.items():
+        if isinstance(value, (dict, list)) and value:
+            value = json.dumps(value, indent=indent).replace("\n", "\n" + inner)
+        elif value.__class__ is str:
+            value = _encode_string(value)
+        else:
+            value = _encode(value)
+        members.append(f"{inner}{_encode_string(key)}: {value}")
+    return f"{padding}{{\n" + ",\n".join(members) + f"\n{padding}}}"
+
+
+class AttributeView(MutableMapping):
+    __slots__ = ("_record",)
+
+    def __init__(self, record):
+        """
+        Initializes a dict-like view over a record's additional attributes.
+
+        Reads and writes go straight to the record, so code such as
+        `book.additional_attributes.update(genre="Poetry")` keeps working.
+
+        Parameters:
+        record (CompactRecord): The record whose attributes are exposed.
+        """
+        self._record = record
+
+    def __getitem__(self, key):
+        record = self._record
+        try:
+            return record._values[record._schema.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        record = self._record
+        if key in record._schema:
+            position = record._schema.index(key)
+            record._values = record._values[:position] + (value,) + record._values[position + 1:]
+        else:
+            record._schema = intern_schema(record._schema + (key,))
+            record._values = record._values + (value,)
+
+    def __delitem__(self, key):
+        record = self._record
+        try:
+            position = record._schema.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        record._schema = intern_schema(record._schema[:position] + record._schema[position + 1:])
+        record._values = record._values[:position] + record._values[position + 1:]
+
+    def __contains__(self, key):
+        return key in self._record._schema
+
+    def __iter__(self):
+        return iter(self._record._schema)
+
+    def __len__(self):
+        return len(self._record._schema)
+
+    def __repr__(self):
+        return repr(self._record.attribute_dict())
+
+
+class CompactRecord:
+    __slots__ = ("_schema", "_values", "_fragment")
+
+    # Subclasses set this to an operator.attrgetter over every stored field; its
+    # result identifies the record's current contents for the fragment cache.
+    _state = None
+
+    @property
+    def dirty(self):
+        """
+        True if the record changed since it was last serialized by json_fragment().
+        """
+        fragment = getattr(self, "_fragment", None)
+        return fragment is None or fragment[1] != self._state(self)
+
+    def json_fragment(self, indent=None):
+        """
+        Returns the record serialized as a JSON object, as it appears inside a list.
+
+        The text is cached together with the field values it was made from and
+        reused while they are unchanged, so saving a catalog only serializes the
+        records that changed. Values mutated in place (e.g., appending to a list
+        attribute) are not detected; assign a new value instead.
+
+        Parameters:
+        indent (int, optional): The indentation of the enclosing list. None gives a
+            compact, single-line object.
+
+        Returns:
+        str: The JSON text of the record.
+        """
+        state = self._state(self)
+        fragment = getattr(self, "_fragment", None)
+        if fragment is not None and fragment[0] == indent and fragment[1] == state:
+            return fragment[2]
+        text = format_fragment(self.to_dict(), indent)
+        self._fragment = (indent, state, text)
+        return text
+
+    def _set_attributes(self, attributes):
+        """
+        Replaces the record's additional attributes.
+
+        Parameters:
+        attributes (dict): The new attributes, in order.
+        """
+        self._schema = intern_schema(attributes)
+        self._values = tuple(attributes.values())
+
+    @property
+    def additional_attributes(self):
+        """
+        The record's additional attributes as a mutable, dict-like view.
+        """
+        return AttributeView(self)
+
+    @additional_attributes.setter
+    def additional_attributes(self, attributes):
+        self._set_attributes(dict(attributes))
+
+    def attribute_dict(self):
+        """
+        Returns a plain dict copy of the record's additional attributes.
+
+        Returns:
+        dict: The additional attributes, in order.
+        """
+        return dict(zip(self._schema, self._values))
@@ -0,0 +1,340 @@
+import array
+import bisect
+import concurrent.futures
+import multiprocessing
+import threading
+
+SEPARATOR = "\0"
+
+_shard = None  # the shard held by a worker process, see _load_shard()
+
+
+def _join(values):
+    """
+    Joins strings with SEPARATOR and records where each one starts.
+
+    Parameters:
+    values (list): The strings, one per row.
+
+    Returns:
+    tuple: The joined text and an array of row start offsets.
+    """
+    starts = array.array("q")
+    offset = 0
+    for value in values:
+        starts.append(offset)
+        offset += len(value) + 1
+    return SEPARATOR.join(values), starts
+
+
+def _find(column, keyword):
+    """
+    Returns the rows of a joined column that contain the keyword.
+
+    A keyword cannot contain SEPARATOR, so a match never spans two rows.
+
+    Parameters:
+    column (tuple): The text and row starts built by _join().
+    keyword (str): The non-empty text to look for.
+
+    Returns:
+    list: The matching rows in ascending order.
+    """
+    text, starts = column
+    rows = []
+    position = text.find(keyword)
+    while position != -1:
+        row = bisect.bisect_right(starts, position) - 1
+        rows.append(row)
+        if row + 1 == len(starts):
+            break
+        position = text.find(keyword, starts[row + 1])
+    return rows
+
+
+class _Shard:
+    def __init__(self, records):
+        """
+        Initializes a contiguous slice of the catalog, prepared for scanning.
+
+        Every field is lowercased once and joined into one string per field, plus
+        one string holding all fields of each record, so a query is a series of
+        str.find calls instead of a Python loop that lowercases every value.
+        Records changed later are kept aside in an overlay and checked directly.
+
+        Parameters:
+        records (list): (key, {field: lowercase value}) pairs in catalog order.
+        """
+        self.keys = []  # row -> key, None once removed
+        self.rows = {}  # key -> row
+        self.row_fields = []  # row -> field names the record had when the columns were built
+        self.overlay = {}  # row -> values of a record changed since the columns were built
+        self.field_counts = {}  # field -> number of live records having it
+        self._schemas = {}
+        columns = {}
+        everything = []
+        for row, (key, values) in enumerate(records):
+            self.keys.append(key)
+            self.rows[key] = row
+            self.row_fields.append(self._schema(values))
+            for field, value in values.items():
+                columns.setdefault(field, {})[row] = value
+            self._count(values, 1)
+            everything.append(SEPARATOR.join(values.values()))
+        self.size = len(records)
+        self.columns = {field: _join([values.get(row, "") for row in range(self.size)])
+                        for field, values in columns.items()}
+        self.everything = _join(everything)
+
+    def _schema(self, values):
+        names = tuple(values)
+        return self._schemas.setdefault(names, names)
+
+    def _count(self, fields, delta):
+        for field in fields:
+            count = self.field_counts.get(field, 0) + delta
+            if count:
+                self.field_counts[field] = count
+            else:
+                del self.field_counts[field]
+
+    def apply(self, changes):
+        """
+        Applies catalog changes to the records this shard holds.
+
+        Parameters:
+        changes (list): ("put", key, values) and ("remove", key, None) entries.
+
+        Returns:
+        list: The positions in `changes` of the puts applied to this shard.
+        """
+        applied = []
+        for position, (operation, key, values) in enumerate(changes):
+            row = self.rows.get(key)
+            if row is None:
+                continue
+            self._count(self.row_fields[row], -1)
+            if operation == "put":
+                self.overlay[row] = values
+                self.row_fields[row] = self._schema(values)
+                self._count(values, 1)
+                applied.append(position)
+            else:
+                self.overlay.pop(row, None)
+                self.keys[row] = None
+                del self.rows[key]
+        return applied
+
+    def append(self, changes):
+        """
+        Adds records that no shard held to the end of this shard.
+
+        Parameters:
+        changes (list): ("put", key, values) entries for the new records.
+        """
+        for _, key, values in changes:
+            row = len(self.keys)
+            if key in self.rows:
+                continue
+            self.keys.append(key)
+            self.rows[key] = row
+            self.row_fields.append(self._schema(values))
+            self.overlay[row] = values
+            self._count(values, 1)
+
+    def search(self, keyword, fields):
+        """
+        Finds the records whose fields contain the keyword.
+
+        Parameters:
+        keyword (str): The lowercase text to look for.
+        fields (list, optional): The fields to search in, or None for every field.
+
+        Returns:
+        list: The keys of the matching records, in shard order.
+        """
+        if not keyword:
+            rows = [row for row in range(self.size)
+                    if fields is None or any(field in self.row_fields[row] for field in fields)]
+        elif fields is None:
+            rows = _find(self.everything, keyword)
+        else:
+            found = set()
+            for field in fields:
+                if field in self.columns:
+                    found.update(_find(self.columns[field], keyword))
+            rows = sorted(found)
+        keys = self.keys
+        overlay = self.overlay
+        matches = [row for row in rows if row not in overlay and keys[row] is not None]
+        for row, values in overlay.items():
+            if keys[row] is not None and any(keyword in value for field, value in values.items()
+                                             if fields is None or field in fields):
+                matches.append(row)
+        if overlay:
+            matches.sort()
+        return [keys[row] for row in matches]
+
+
+def _load_shard(records, key, fields):
+    """
+    Builds the worker's shard from the records it was started with.
+
+    Parameters:
+    records (list): The records of the shard, in catalog order.
+    key (str): The attribute identifying a record.
+    fields (callable): Returns a dict of field name -> value for a record.
+    """
+    global _shard
+    _shard = _Shard([(getattr(record, key), {field: str(value).lower() for field, value in fields(record).items()})
+                     for record in records])
+
+
+def _apply(changes):
+    return _shard.apply(changes)
+
+
+def _search(keyword, parameter, appended):
+    """
+    Runs a query against the worker's shard.
+
+    Parameters:
+    keyword (str): The lowercase text to look for.
+    parameter (str): The field to search in, or '' for every field.
+    appended (list): New records to add to the shard first.
+
+    Returns:
+    tuple: The matching keys, and whether any record in the shard has the field.
+    """
+    if appended:
+        _shard.append(appended)
+    if not parameter:
+        return _shard.search(keyword, None), False
+    return _shard.search(keyword, [parameter]), parameter in _shard.field_counts
+
+
+def _search_everything(keyword):
+    return _shard.search(keyword, None)
+
+
+class ParallelScanner:
+    def __init__(self, records, key, fields, workers, attach=False):
+        """
+        Initializes a catalog scan split across worker processes.
+
+        The catalog is cut into one contiguous shard per worker. Each shard is
+        handed to its own single-process pool once, when the pool starts; with the
+        'fork' start method the records are inherited rather than pickled. Queries
+        then send only the keyword and the changes made since the previous query,
+        and the shards' results are concatenated, which keeps catalog order.
+
+        The scanner must be attached to the catalog so that it sees later changes.
+        With `attach` it attaches itself before reading the records: a change made
+        while the shards are being built is queued and applied on top of them,
+        and applying a change twice is harmless. Attaching afterwards with
+        Catalog.add_index(scanner, populate=False) misses such changes.
+
+        Parameters:
+        records (Catalog or iterable): The records to scan.
+        key (str): The attribute identifying a record (e.g., 'isbn').
+        fields (callable): Returns a dict of field name -> value for a record.
+        workers (int): The number of worker processes.
+        attach (bool): Attach the scanner to `records`, a Catalog, before reading it.
+        """
+        self.key = key
+        self.fields = fields
+        self.workers = workers
+        self._pending = {}  # key -> latest change not yet sent to the shards, oldest first
+        self._lock = threading.Lock()
+        if attach:
+            records.add_index(self, populate=False)
+        records = list(records)
+        size = -(-len(records) // workers) if records else 0
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self._pools = [concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=context, initializer=_load_shard,
+            initargs=(records[i * size:(i + 1) * size], key, fields)) for i in range(workers)]
+
+    def add(self, record):
+        """
+        Queues an added or replaced record for the shards.
+
+        Only the latest change to a record is kept until the next query, so the
+        queue never holds more entries than there are records.
+
+        Parameters:
+        record: The record that was added.
+        """
+        key = getattr(record, self.key)
+        values = {field: str(value).lower() for field, value in self.fields(record).items()}
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = ("put", key, values)
+
+    def update(self, record):
+        """
+        Queues a record changed in place for the shards.
+
+        Parameters:
+        record: The record that was modified.
+        """
+        self.add(record)
+
+    def remove(self, key):
+        """
+        Queues a removed record for the shards.
+
+        Parameters:
+        key (str): The key of the removed record.
+        """
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = ("remove", key, None)
+
+    def search(self, keyword, parameter=""):
+        """
+        Finds the records whose fields contain the keyword, ignoring case.
+
+        Like Library.search_books, a parameter that no record has as a field is
+        ignored and every field is searched instead.
+
+        Parameters:
+        keyword (str): The text to look for.
+        parameter (str, optional): The field to search in. Defaults to every field.
+
+        Returns:
+        tuple: The keys of the matching records in catalog order, and the fields
+            that were searched (None for every field).
+        """
+        keyword = keyword.lower()
+        with self._lock:
+            changes, self._pending = list(self._pending.values()), {}
+            appended = {}
+            if changes:
+                applied = set()
+                for future in [pool.submit(_apply, changes) for pool in self._pools]:
+                    applied.update(future.result())
+                # Puts that no shard applied are new records; they go to the end of the
+                # last shard unless they were removed again.
+                for position, (operation, key, values) in enumerate(changes):
+                    if operation == "put" and position not in applied:
+                        appended.pop(key, None)
+                        appended[key] = ("put", key, values)
+                    elif operation == "remove":
+                        appended.pop(key, None)
+            appended = list(appended.values())
+            futures = [pool.submit(_search, keyword, parameter, appended if pool is self._pools[-1] else None)
+                       for pool in self._pools]
+            results = [future.result() for future in futures]
+            if not parameter or any(has_field for _, has_field in results):
+                return [key for keys, _ in results for key in keys], (parameter,) if parameter else None
+            futures = [pool.submit(_search_everything, keyword) for pool in self._pools]
+            return [key for future in futures for key in future.result()], None
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for pool in self._pools:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,185 @@
+import collections
+import threading
+import time
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+class SearchCache:
+    def __init__(self, key, fields, maxsize=DEFAULT_CACHE_SIZE, ttl=None):
+        """
+        Initializes a bounded LRU cache of search results keyed by (keyword, parameter).
+
+        The cache is attached to a Catalog like a SearchIndex and sees every add,
+        update and remove. A change drops only the entries whose set of matching
+        records it changes: entries that held the record and no longer match it,
+        and entries that did not hold it and now do. Entries store record keys,
+        which are resolved to the live records on every hit, so a change to a
+        field that is not searched (e.g. a book's count) needs no invalidation.
+
+        Parameters:
+        key (str): The attribute identifying a record (e.g., 'isbn', 'user_id').
+        fields (callable): Returns a dict of field name -> value for a record, as
+            given to the SearchIndex.
+        maxsize (int): The number of queries kept; the least recently used is
+            evicted beyond it. 0 disables the cache.
+        ttl (float, optional): Seconds after which an entry expires. Entries never
+            expire if omitted.
+        """
+        self.key = key
+        self.fields = fields
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0  # bumped by every change, see put()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()  # query -> (keys, key set, keyword, fields, exact, expires_at)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query):
+        """
+        Returns the cached result of a query and marks it as recently used.
+
+        Parameters:
+        query (tuple): The (keyword, parameter) pair.
+
+        Returns:
+        list: The keys of the matching records, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[5] is not None and entry[5] <= time.monotonic():
+                del self._entries[query]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query, keys, fields=None, exact=False, generation=None):
+        """
+        Stores the result of a query.
+
+        Parameters:
+        query (tuple): The (keyword, parameter) pair.
+        keys (list): The keys of the matching records, in result order.
+        fields (tuple, optional): The fields the keyword was looked for in. None
+            means every field.
+        exact (bool): Whether records whose key equals the keyword also match.
+        generation (int, optional): The value of `generation` read before the
+            search ran. The result is not stored if the records changed since.
+        """
+        if not self.maxsize:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[query] = (keys, frozenset(keys), query[0].lower(), fields, exact, expires_at)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _changed(self, record_key, values):
+        """
+        Drops the entries whose results a record with the given values changes.
+
+        Every entry is checked, which keeps a change at O(entries) with no per-result
+        bookkeeping on put.
+
+        Parameters:
+        record_key (str): The key of the added or updated record.
+        values (dict): The record's lowercase field values, or None if it was removed.
+        """
+        self.generation += 1
+        stale = []
+        text = "\0".join(values.values()) if values is not None else ""
+        for query, (_, held, keyword, fields, exact, _) in self._entries.items():
+            if values is None:
+                if record_key in held:
+                    stale.append(query)
+                continue
+            if fields is None and query[1] in values:
+                stale.append(query)  # the parameter has become a field, so only it is searched now
+                continue
+            exact_match = exact and record_key == query[0]
+            if not (exact_match or record_key in held or keyword in text):
+                continue  # cannot match now and did not match before
+            if exact_match:
+                matches = True
+            elif fields is None:
+                matches = any(keyword in value for value in values.values())
+            else:
+                matches = any(field in values and keyword in values[field] for field in fields)
+            if matches != (record_key in held):
+                stale.append(query)
+        for query in stale:
+            del self._entries[query]
+        self.invalidations += len(stale)
+
+    def add(self, record):
+        """
+        Drops the cached results an added or replaced record changes.
+
+        Parameters:
+        record: The record that was added.
+        """
+        with self._lock:
+            if not self._entries:
+                self.generation += 1
+                return
+            values = {field: str(value).lower() for field, value in self.fields(record).items()}
+            self._changed(getattr(record, self.key), values)
+
+    def update(self, record):
+        """
+        Drops the cached results a record changed in place affects.
+
+        Parameters:
+        record: The record that was modified.
+        """
+        self.add(record)
+
+    def remove(self, key):
+        """
+        Drops the cached results that held a removed record.
+
+        Parameters:
+        key (str): The key of the removed record.
+        """
+        with self._lock:
+            self._changed(key, None)
+
+    def clear(self):
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache's counters.
+
+        Returns:
+        dict: Hits, misses, evictions, expirations, invalidations, the hit rate and
+            the current number of entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "size": len(self._entries)}
@@ -0,0 +1,256 @@
+import re
+import threading
+
+GRAM_SIZE = 3
+NARROWING_RATIO = 8
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _grams(token):
+    """
+    Returns every substring of the token up to GRAM_SIZE characters long.
+
+    Parameters:
+    token (str): The token to split.
+
+    Returns:
+    set: The token's n-grams.
+    """
+    return {token[i:i + n] for i in range(len(token)) for n in range(1, GRAM_SIZE + 1) if i + n <= len(token)}
+
+
+class SearchIndex:
+    def __init__(self, key, fields):
+        """
+        Initializes an inverted index supporting case-insensitive substring search.
+
+        Field values are lowercased once and split into word tokens. Each field keeps
+        a token -> document posting list, and the vocabulary of tokens is indexed by
+        n-grams so that partial words ('une' in 'Dune') are resolved without visiting
+        every record. Matches are checked against the stored lowercase values where
+        needed, so results are identical to a plain substring scan.
+
+        Parameters:
+        key (str): The attribute identifying a record (e.g., 'isbn', 'user_id').
+        fields (callable): Returns a dict of field name -> value for a record.
+        """
+        self.key = key
+        self.fields = fields
+        self._postings = {}  # field -> token -> set of document ids
+        self._field_refs = {}  # field -> number of records having it
+        self._vocabulary = {}  # n-gram -> set of tokens
+        self._token_refs = {}  # token -> number of (field, document) postings using it
+        self._doc_ids = {}  # key -> document id, assigned in insertion order
+        self._keys = {}  # document id -> key
+        self._values = {}  # document id -> {field: lowercase value}
+        self._next_doc_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def fields_indexed(self):
+        """
+        Returns the names of the fields present in at least one indexed record.
+
+        Returns:
+        A set-like view of the indexed field names.
+        """
+        return self._field_refs.keys()
+
+    def add(self, record):
+        """
+        Indexes a record, replacing any previous entry with the same key.
+
+        Parameters:
+        record: The record to index.
+        """
+        key = getattr(record, self.key)
+        values = {field: str(value).lower() for field, value in self.fields(record).items()}
+        with self._lock:
+            self._index(key, values)
+
+    def _index(self, key, values):
+        doc_id = self._doc_ids.get(key)
+        if doc_id is None:
+            doc_id = self._doc_ids[key] = self._next_doc_id
+            self._keys[doc_id] = key
+            self._next_doc_id += 1
+        else:
+            self._unindex(doc_id)
+        self._values[doc_id] = values
+        for field, value in values.items():
+            self._field_refs[field] = self._field_refs.get(field, 0) + 1
+            postings = self._postings.setdefault(field, {})
+            for token in set(TOKEN_PATTERN.findall(value)):
+                doc_ids = postings.get(token)
+                if doc_ids is None:
+                    doc_ids = postings[token] = set()
+                doc_ids.add(doc_id)
+                self._ref_token(token)
+
+    def update(self, record):
+        """
+        Re-indexes a record after its fields were changed in place.
+
+        Parameters:
+        record: The record to re-index.
+        """
+        self.add(record)
+
+    def remove(self, key):
+        """
+        Removes a record from the index.
+
+        Parameters:
+        key (str): The key of the record to remove.
+        """
+        with self._lock:
+            doc_id = self._doc_ids.pop(key, None)
+            if doc_id is not None:
+                self._unindex(doc_id)
+                del self._values[doc_id]
+                del self._keys[doc_id]
+
+    def search(self, keyword, fields=None):
+        """
+        Finds the records whose fields contain the keyword, ignoring case.
+
+        Parameters:
+        keyword (str): The text to look for.
+        fields (iterable, optional): The fields to search in. Defaults to all fields.
+
+        Returns:
+        list: The keys of the matching records, in insertion order.
+        """
+        with self._lock:
+            return self._search(keyword.lower(), fields)
+
+    def _search(self, keyword, fields):
+        fields = list(self._field_refs) if fields is None else [f for f in fields if f in self._field_refs]
+        pieces = set(TOKEN_PATTERN.findall(keyword))
+        if not pieces:
+            # Nothing to look up (e.g. only punctuation); check every record instead.
+            candidates = self._values.keys()
+        else:
+            # Start from the most selective word and narrow down with the others while
+            # that is cheaper than checking the remaining candidates directly.
+            postings = sorted((self._matching_postings(piece, fields) for piece in pieces),
+                              key=lambda lists: sum(map(len, lists)))
+            candidates = set().union(*postings[0])
+            for lists in postings[1:]:
+                if not candidates or sum(map(len, lists)) > len(candidates) * NARROWING_RATIO:
+                    break
+                candidates &= set().union(*lists)
+            if len(pieces) == 1 and keyword in pieces:
+                # A single word without separators is matched exactly by its postings.
+                return self.ordered_keys(candidates)
+        results = []
+        for doc_id in candidates:
+            values = self._values[doc_id]
+            if any(field in values and keyword in values[field] for field in fields):
+                results.append(doc_id)
+        return self.ordered_keys(results)
+
+    def ordered(self, keys):
+        """
+        Sorts record keys into the order in which the records were indexed.
+
+        Parameters:
+        keys (iterable): Keys of indexed records.
+
+        Returns:
+        list: The keys in insertion order.
+        """
+        with self._lock:
+            return self.ordered_keys(self._doc_ids[key] for key in keys)
+
+    def ordered_keys(self, doc_ids):
+        """
+        Converts document ids into record keys, in insertion order.
+
+        Parameters:
+        doc_ids (iterable): Document ids of indexed records.
+
+        Returns:
+        list: The corresponding keys in insertion order.
+        """
+        keys = self._keys
+        return [keys[doc_id] for doc_id in sorted(doc_ids)]
+
+    def _matching_postings(self, piece, fields):
+        """
+        Collects the posting lists of the tokens containing the piece in the given fields.
+
+        Parameters:
+        piece (str): A lowercase word fragment.
+        fields (list): The fields to search in.
+
+        Returns:
+        list: Sets of document ids whose union is the set of matching documents.
+        """
+        tokens = self._tokens_containing(piece)
+        matches = []
+        for field in fields:
+            postings = self._postings.get(field)
+            if postings:
+                for token in tokens:
+                    doc_ids = postings.get(token)
+                    if doc_ids:
+                        matches.append(doc_ids)
+        return matches
+
+    def _tokens_containing(self, piece):
+        """
+        Returns the vocabulary tokens that contain the given text.
+
+        Parameters:
+        piece (str): A lowercase word fragment.
+
+        Returns:
+        set: The matching tokens.
+        """
+        if len(piece) <= GRAM_SIZE:
+            return self._vocabulary.get(piece, set())
+        grams = [piece[i:i + GRAM_SIZE] for i in range(len(piece) - GRAM_SIZE + 1)]
+        tokens = None
+        for gram in sorted(grams, key=lambda g: len(self._vocabulary.get(g, ()))):
+            found = self._vocabulary.get(gram)
+            if not found:
+                return set()
+            tokens = set(found) if tokens is None else tokens & found
+        return {token for token in tokens if piece in token}
+
+    def _ref_token(self, token):
+        count = self._token_refs.get(token, 0)
+        if count == 0:
+            for gram in _grams(token):
+                self._vocabulary.setdefault(gram, set()).add(token)
+        self._token_refs[token] = count + 1
+
+    def _unref_token(self, token):
+        count = self._token_refs[token] - 1
+        if count:
+            self._token_refs[token] = count
+            return
+        del self._token_refs[token]
+        for gram in _grams(token):
+            tokens = self._vocabulary[gram]
+            tokens.discard(token)
+            if not tokens:
+                del self._vocabulary[gram]
+
+    def _unindex(self, doc_id):
+        for field, value in self._values[doc_id].items():
+            postings = self._postings.get(field, {})
+            for token in set(TOKEN_PATTERN.findall(value)):
+                doc_ids = postings[token]
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del postings[token]
+                self._unref_token(token)
+            if not postings:
+                self._postings.pop(field, None)
+            self._field_refs[field] -= 1
+            if not self._field_refs[field]:
+                del self._field_refs[field]
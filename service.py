@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import json
+import os
+import sys
+import urllib.parse
+
+from check import Library
+from logger import BufferedLogger
+
+DEFAULT_PAGE_SIZE = 100
+MAX_BODY = 1 << 20
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        """
+        Initializes an error that is reported to the client as an HTTP status.
+
+        Parameters:
+        status (int): The HTTP status code.
+        message (str): The error message sent in the response body.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def _required(data, *fields):
+    """
+    Returns the values of required request fields.
+
+    Parameters:
+    data (dict): The request parameters or body.
+    *fields (str): The names of the required fields.
+
+    Returns:
+    list: The values, in the order of the field names.
+    """
+    missing = [field for field in fields if not data.get(field)]
+    if missing:
+        raise ServiceError(400, f"Missing required fields: {', '.join(missing)}")
+    return [data[field] for field in fields]
+
+
+def _page(records, query):
+    """
+    Returns one page of records as dictionaries.
+
+    Parameters:
+    records (iterable): The records to page through.
+    query (dict): The request parameters, with optional offset and limit.
+
+    Returns:
+    list: The dictionaries for the requested page.
+    """
+    try:
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ServiceError(400, "offset and limit must be integers") from None
+    return [record.to_dict() for record in itertools.islice(records, offset, offset + max(limit, 0))]
+
+
+def _is_listing(query):
+    """Returns whether a list request asks for sorted, cursor-based pagination."""
+    return any(name in query for name in ("sort", "order", "cursor", "available")) or any(
+        name.startswith("attribute.") for name in query)
+
+
+def _query_value(text):
+    """Returns a query parameter as the JSON number or boolean it spells, else as text."""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    return value if isinstance(value, (int, float, bool)) else text
+
+
+def _listing(list_page, query, **options):
+    """
+    Returns one page from a sorted listing, mapping bad parameters to 400 errors.
+
+    Parameters:
+    list_page (callable): Library.list_books_page or Library.list_users_page.
+    query (dict): The request parameters.
+    **options: Further arguments for list_page (e.g., sort, available).
+
+    Returns:
+    tuple: The records and the next page's cursor.
+    """
+    try:
+        limit = int(query.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ServiceError(400, "limit must be an integer") from None
+    attributes = {name[len("attribute."):]: _query_value(value) for name, value in query.items()
+                  if name.startswith("attribute.")}
+    try:
+        return list_page(limit, query.get("cursor"), reverse=query.get("order") == "desc",
+                         attributes=attributes, **options)
+    except ValueError as e:
+        raise ServiceError(400, str(e)) from None
+
+
+class LibraryService:
+    def __init__(self, library, workers=32):
+        """
+        Initializes a JSON-over-HTTP front end for a Library.
+
+        Library calls run on a thread pool so that storage writes never block the
+        event loop. Mutations that arrive while a write is in progress, or within the
+        writers' batching window, are persisted together by the library's writers.
+
+        Parameters:
+        library (Library): The library to serve.
+        workers (int): The number of threads available for library calls.
+        """
+        self.library = library
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                              thread_name_prefix="library")
+        # Handlers run on the thread pool with the query parameters and JSON body and
+        # return a payload, or a (status, payload) pair, or raise ServiceError.
+        self.routes = {
+            ("GET", "/books"): self.list_books,
+            ("POST", "/books"): self.add_book,
+            ("GET", "/books/search"): self.search_books,
+            ("GET", "/users"): self.list_users,
+            ("POST", "/users"): self.add_user,
+            ("GET", "/users/search"): self.search_users,
+            ("POST", "/checkout"): self.check_out_book,
+            ("POST", "/checkin"): self.check_in_book,
+            ("GET", "/stats"): self.stats,
+        }
+
+    def list_books(self, query, body):
+        """
+        GET /books: one page of books.
+
+        Without listing parameters, books are paged by offset in catalog order.
+        With sort (title, author or count), order=desc, available, cursor or
+        attribute.<name>=<value> filters, they are paged by cursor in sort order.
+        The response then carries the next page's cursor.
+        """
+        if not _is_listing(query):
+            return {"books": _page(self.library.books, query)}
+        available = query.get("available")
+        books, cursor = _listing(self.library.list_books_page, query, sort=query.get("sort", "title"),
+                                 available=None if available is None else available.lower() in ("1", "true", "yes"))
+        return {"books": [book.to_dict() for book in books], "next_cursor": cursor}
+
+    def add_book(self, query, body):
+        """POST /books: adds a book, or another copy of an existing one."""
+        title, author, isbn = _required(body, "title", "author", "isbn")
+        count = body.get("count", 1)
+        if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+            raise ServiceError(400, "count must be a non-negative integer")
+        if not isinstance(body.get("available", True), bool):
+            raise ServiceError(400, "available must be true or false")
+        extras = {key: value for key, value in body.items() if key not in ("title", "author", "isbn")}
+        self.library.add_book(title, author, isbn, **extras)
+        return 201, {"book": self.library.books.get(isbn).to_dict()}
+
+    def search_books(self, query, body):
+        """GET /books/search?q=...&field=...: books matching a keyword."""
+        keyword, = _required(query, "q")
+        results = self.library.search_books(keyword, query.get("field", ""))
+        return {"books": _page(results, query)}
+
+    def list_users(self, query, body):
+        """
+        GET /users: one page of users.
+
+        Paged by offset in catalog order, or by cursor with sort (name or user_id),
+        order, cursor and attribute.<name>=<value> filters as for GET /books.
+        """
+        if not _is_listing(query):
+            return {"users": _page(self.library.users, query)}
+        users, cursor = _listing(self.library.list_users_page, query, sort=query.get("sort", "name"))
+        return {"users": [user.to_dict() for user in users], "next_cursor": cursor}
+
+    def add_user(self, query, body):
+        """POST /users: adds a user."""
+        user_id, name = _required(body, "user_id", "name")
+        if user_id in self.library.users:
+            raise ServiceError(409, f"User with ID {user_id} already exists.")
+        extras = {key: value for key, value in body.items() if key not in ("user_id", "name")}
+        self.library.add_user(user_id, name, **extras)
+        return 201, {"user": self.library.users.get(user_id).to_dict()}
+
+    def search_users(self, query, body):
+        """GET /users/search?q=...&field=...: users matching a keyword."""
+        keyword, = _required(query, "q")
+        results = self.library.search_users(keyword, query.get("field", ""))
+        return {"users": _page(results, query)}
+
+    def check_out_book(self, query, body):
+        """POST /checkout: checks out a copy of a book for a user."""
+        isbn, user_id = _required(body, "isbn", "user_id")
+        if isbn not in self.library.books:
+            raise ServiceError(404, f"Book with ISBN {isbn} not found.")
+        if user_id not in self.library.users:
+            raise ServiceError(404, f"User with ID {user_id} not found.")
+        try:
+            checked_out = self.library.check_out_book(isbn, user_id, raise_errors=True)
+        except Exception as e:
+            raise ServiceError(500, f"Book with ISBN {isbn} could not be checked out: {e}") from None
+        if not checked_out:
+            raise ServiceError(409, f"Book with ISBN {isbn} is not available.")
+        return {"book": self.library.books.get(isbn).to_dict()}
+
+    def check_in_book(self, query, body):
+        """POST /checkin: returns a copy of a book, closing the given user's loan if any."""
+        isbn, = _required(body, "isbn")
+        if isbn not in self.library.books:
+            raise ServiceError(404, f"Book with ISBN {isbn} not found.")
+        user_id = body.get("user_id")
+        if self.library.check_in_book(isbn, user_id):
+            return {"book": self.library.books.get(isbn).to_dict()}
+        # check_in_book only reports failure; find out which one it was.
+        if isbn not in self.library.books:
+            raise ServiceError(404, f"Book with ISBN {isbn} not found.")
+        if user_id is not None and not any(loan.isbn == isbn for loan in self.library.loans.loans_for_user(user_id)):
+            raise ServiceError(409, f"User {user_id} has no loan of ISBN {isbn}.")
+        raise ServiceError(500, f"Book with ISBN {isbn} could not be checked in.")
+
+    def stats(self, query, body):
+        """GET /stats: operation latencies and cache counters, see Library.stats."""
+        return self.library.stats()
+
+    async def dispatch(self, method, target, body):
+        """
+        Runs the handler for a request on the thread pool.
+
+        Parameters:
+        method (str): The HTTP method.
+        target (str): The request path and query string.
+        body (bytes): The request body, JSON encoded.
+
+        Returns:
+        tuple: The HTTP status and the response payload.
+        """
+        url = urllib.parse.urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                raise ServiceError(405, f"{method} is not supported on {url.path}")
+            raise ServiceError(404, f"No such endpoint: {url.path}")
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ServiceError(400, "Request body is not valid JSON") from None
+        if not isinstance(data, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, functools.partial(handler, query, data))
+        return result if isinstance(result, tuple) else (200, result)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves HTTP/1.1 requests on one connection until the client closes it.
+
+        Parameters:
+        reader (asyncio.StreamReader): The connection's input stream.
+        writer (asyncio.StreamWriter): The connection's output stream.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise ServiceError(413, "Request body is too large")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target, body)
+                except ServiceError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except ValueError:
+                    status, payload, keep_alive = 400, {"error": "Malformed request"}, False
+                except Exception as e:
+                    self.library.logger.log(f"Error while serving {request_line.strip()!r}: {e}")
+                    status, payload = 500, {"error": str(e)}
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"An error occurred while serving a request: {e}", file=sys.stderr)
+            self.library.logger.log(f"Error while serving a request: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        """
+        Accepts connections until the task is cancelled.
+
+        Parameters:
+        host (str): The address to listen on.
+        port (int): The port to listen on; 0 picks a free port.
+        ready (callable, optional): Called with the bound (host, port) once listening.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def open_library(engine, batch_window, durability="always"):
+    """
+    Creates the Library served by the service.
+
+    Parameters:
+    engine (str): 'json', 'journal', 'snapshot' or 'sqlite'.
+    batch_window (float): Seconds the writers wait to group mutations into one batch.
+    durability (str): The JSON engines' durability level: "always", "interval" or "shutdown".
+
+    Returns:
+    Library: The library, logging through a BufferedLogger.
+    """
+    if engine == "journal":
+        from journal import JournalStorage
+        storage = JournalStorage("books.json", "users.json", durability=durability)
+    elif engine == "snapshot":
+        from snapshot_storage import SnapshotStorage
+        storage = SnapshotStorage("books.snap", "users.json", durability=durability)
+    elif engine == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        storage = SQLiteStorage()
+    else:
+        from storage import Storage
+        storage = Storage(durability=durability)
+    library = Library(storage, BufferedLogger("library.log"))
+    for writer in (library.book_writer, library.user_writer, library.hold_writer, library.loan_writer):
+        writer.window = batch_window
+    return library
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serve the library as a JSON HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--engine", choices=["json", "journal", "snapshot", "sqlite"], default="journal")
+    parser.add_argument("--batch-window", type=float, default=2.0,
+                        help="milliseconds to wait for more mutations before persisting a batch")
+    parser.add_argument("--durability", choices=["always", "interval", "shutdown"], default="always",
+                        help="when the JSON engines write changes to disk")
+    parser.add_argument("--verbose", action="store_true", help="keep the library's console output")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")  # the library prints every operation
+    library = open_library(args.engine, args.batch_window / 1000, args.durability)
+    service = LibraryService(library)
+
+    def ready(address):
+        print(f"Serving on {address[0]}:{address[1]}", file=sys.stderr, flush=True)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        library.storage.close()
+        library.logger.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
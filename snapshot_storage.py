@@ -0,0 +1,515 @@
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from catalog import Catalog
+from metrics import timed
+from models import format_fragment, intern_schema
+from storage import Storage, atomic_write, dump_lines
+
+SNAPSHOT_MAGIC = b"BKSNAP01"
+# magic, book count, ISBN width, generation, hash table slots, then the offsets of the
+# ISBN, count, available, string offset, string length, hash table and string table
+# sections, and the file size
+SNAPSHOT_HEADER = struct.Struct("<8sQQQQ8Q")
+STRINGS_PER_BOOK = 3  # title, author and additional attributes as compact JSON
+DEFAULT_COMPACT_EVERY = 10_000
+ATTRIBUTE_CACHE_SIZE = 65_536  # parsed attribute strings kept per catalog
+SCALARS = (str, int, float, bool, type(None))
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _little_endian(column):
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+@timed("serialize")
+def dump_snapshot(books, generation=0):
+    """
+    Serializes books in the binary snapshot format.
+
+    The file starts with a fixed header followed by columns, each 8-byte aligned,
+    with one entry per book in ISBN order:
+
+    - ISBNs: UTF-8, NUL-padded to the width of the longest one.
+    - counts: signed 64-bit integers.
+    - available: one byte, 0 or 1.
+    - string offsets and lengths: 64-bit offsets and 32-bit lengths into the string
+      table for each book's title, author and additional attributes.
+    - a hash table of 32-bit positions plus one (0 marks an empty slot), at most
+      half full and probed linearly from the CRC-32 of the ISBN.
+    - the string table: UTF-8 text. Equal strings, such as an author's name or a
+      common set of attributes, are stored once.
+
+    All integers are little-endian.
+
+    Parameters:
+    books (iterable): The Book objects to serialize. A later book with the same
+        ISBN replaces an earlier one.
+    generation (int): The number written to the header, see SnapshotStorage.
+
+    Returns:
+    bytes: The snapshot.
+
+    Raises:
+    ValueError: If an ISBN is not a string without NUL characters, a title or
+        author is not a string, or a count is not a 64-bit integer.
+    """
+    latest = {}
+    for book in books:
+        if not isinstance(book.isbn, str) or "\0" in book.isbn:
+            raise ValueError(f"Cannot store ISBN {book.isbn!r} in a snapshot")
+        if not isinstance(book.title, str) or not isinstance(book.author, str):
+            raise ValueError(f"Cannot store the title or author of ISBN {book.isbn} in a snapshot")
+        latest[book.isbn.encode()] = book
+    keys = sorted(latest)
+    width = max(map(len, keys), default=0)
+    strings = {}
+    chunks = []
+    table_size = 0
+    string_offsets = array.array('Q')
+    string_lengths = array.array('I')
+    for key in keys:
+        book = latest[key]
+        for text in (book.title, book.author, format_fragment(book.attribute_dict()) if book._schema else ""):
+            position = strings.get(text)
+            if position is None:
+                data = text.encode()
+                position = strings[text] = (table_size, len(data))
+                chunks.append(data)
+                table_size += len(data)
+            string_offsets.append(position[0])
+            string_lengths.append(position[1])
+    try:
+        counts = array.array('q', (latest[key].count for key in keys))
+    except (TypeError, OverflowError) as e:
+        raise ValueError(f"Cannot store a book count in a snapshot: {e}") from None
+    slots = 1 << (2 * len(keys) - 1).bit_length() if keys else 1
+    mask = slots - 1
+    table = array.array('I', bytes(4 * slots))
+    for position, key in enumerate(keys, 1):
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = position
+    sections = [
+        b"".join(key.ljust(width, b"\0") for key in keys),
+        _little_endian(counts).tobytes(),
+        bytes(1 if latest[key].available else 0 for key in keys),
+        _little_endian(string_offsets).tobytes(),
+        _little_endian(string_lengths).tobytes(),
+        _little_endian(table).tobytes(),
+        b"".join(chunks),
+    ]
+    offsets = []
+    position = SNAPSHOT_HEADER.size
+    for section in sections:
+        position = _align(position)
+        offsets.append(position)
+        position += len(section)
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(keys), width, generation, slots, *offsets, position)]
+    position = SNAPSHOT_HEADER.size
+    for offset, section in zip(offsets, sections):
+        parts.append(b"\0" * (offset - position))
+        parts.append(section)
+        position = offset + len(section)
+    return b"".join(parts)
+
+
+class _IsbnColumn:
+    __slots__ = ("_map", "_start", "_width", "_count")
+
+    def __init__(self, snapshot_map, start, width, count):
+        """
+        Exposes the fixed-width ISBN column of a mapped snapshot as a sequence.
+
+        Parameters:
+        snapshot_map (mmap): The mapped snapshot.
+        start (int): Offset of the column in the file.
+        width (int): Size of each NUL-padded ISBN in bytes.
+        count (int): The number of ISBNs.
+        """
+        self._map = snapshot_map
+        self._start = start
+        self._width = width
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        start = self._start + position * self._width
+        return self._map[start:start + self._width]
+
+
+class SnapshotCatalog(Catalog):
+    def __init__(self, snapshot_file):
+        """
+        Initializes a catalog served from a memory-mapped binary snapshot.
+
+        Opening the snapshot only reads its header. ISBN lookups probe the mapped
+        hash table, and status() reads a book's count and availability
+        straight from their columns. A Book object is built only when a book is
+        looked up with get(), and then cached, so later changes to it are seen by
+        every caller. Iterating yields books in ISBN order, followed by books
+        added since the snapshot was written, without caching them.
+
+        Parameters:
+        snapshot_file (str): Path to a file written by dump_snapshot().
+
+        Raises:
+        ValueError: If the file is empty, truncated or not a snapshot.
+        """
+        super().__init__(key="isbn")
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, count, width, self.generation, slots, isbns, counts, available, string_offsets, string_lengths,
+             table, self._strings, size) = SNAPSHOT_HEADER.unpack_from(self._map)
+            if magic != SNAPSHOT_MAGIC or size != len(self._map):
+                raise ValueError(f"{snapshot_file} is not a book snapshot or is truncated")
+        except (struct.error, ValueError):
+            self._map.close()
+            raise
+        view = self._view = memoryview(self._map)
+        self._isbns = _IsbnColumn(self._map, isbns, width, count)
+        self._width = width
+        self._available = view[available:available + count]
+        self._counts = view[counts:counts + 8 * count].cast('q')
+        self._string_offsets = view[string_offsets:string_offsets + 8 * STRINGS_PER_BOOK * count].cast('Q')
+        self._string_lengths = view[string_lengths:string_lengths + 4 * STRINGS_PER_BOOK * count].cast('I')
+        self._table = view[table:table + 4 * slots].cast('I')
+        self._mask = slots - 1
+        if sys.byteorder != "little":
+            # Copies instead of views: the columns are stored little-endian.
+            self._counts = _little_endian(array.array('q', self._counts))
+            self._string_offsets = _little_endian(array.array('Q', self._string_offsets))
+            self._string_lengths = _little_endian(array.array('I', self._string_lengths))
+            self._table = _little_endian(array.array('I', self._table))
+        self._attributes = {}  # string offset -> (schema, values), for scalar values only
+        self._size = count
+        self._count = count
+        self._removed = set()
+
+    def close(self):
+        """
+        Unmaps the snapshot. Books already looked up stay usable.
+        """
+        for column in (self._available, self._counts, self._string_offsets, self._string_lengths, self._table,
+                       self._view):
+            if isinstance(column, memoryview):
+                column.release()
+        self._map.close()
+
+    def _find(self, isbn):
+        """
+        Looks up the position of an ISBN in the snapshot.
+
+        Parameters:
+        isbn (str): The ISBN to look up.
+
+        Returns:
+        int: The book's position, or None if the snapshot has no such ISBN.
+        """
+        if not isinstance(isbn, str):
+            return None
+        target = isbn.encode()
+        if len(target) > self._width:
+            return None
+        slot = zlib.crc32(target) & self._mask
+        target = target.ljust(self._width, b"\0")
+        while True:
+            entry = self._table[slot]
+            if not entry:
+                return None
+            if self._isbns[entry - 1] == target:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+
+    def _string(self, index):
+        start = self._strings + self._string_offsets[index]
+        return str(self._map[start:start + self._string_lengths[index]], 'utf-8')
+
+    def _load(self, position, isbn=None):
+        """
+        Builds the Book stored at a position of the snapshot, without caching it.
+        """
+        from book import Book
+        book = Book.__new__(Book)
+        book.isbn = isbn or self._isbns[position].rstrip(b"\0").decode()
+        first = STRINGS_PER_BOOK * position
+        book.title = self._string(first)
+        book.author = self._string(first + 1)
+        book.count = self._counts[position]
+        book.available = self._available[position] != 0
+        offset = self._string_offsets[first + 2]
+        cached = self._attributes.get(offset)
+        if cached is None:
+            text = self._string(first + 2)
+            attributes = json.loads(text) if text else {}
+            cached = (intern_schema(attributes), tuple(attributes.values()))
+            # Books with the same attributes share the string; values that could be
+            # changed in place, like lists, are not shared between books.
+            if len(self._attributes) < ATTRIBUTE_CACHE_SIZE and all(value.__class__ in SCALARS
+                                                                     for value in cached[1]):
+                self._attributes[offset] = cached
+        book._schema, book._values = cached
+        return book
+
+    def status(self, key):
+        book = self._records.get(key)
+        if book is not None:
+            return book.count, book.available
+        if key in self._removed:
+            return None
+        position = self._find(key)
+        if position is None:
+            return None
+        return self._counts[position], self._available[position] != 0
+
+    def __iter__(self):
+        changed = dict(self._records)
+        removed = set(self._removed)
+        seen = set()
+        for position in range(self._size):
+            isbn = self._isbns[position].rstrip(b"\0").decode()
+            if isbn in removed:
+                continue
+            book = changed.get(isbn)
+            if book is None:
+                yield self._load(position, isbn)
+            else:
+                seen.add(isbn)
+                yield book
+        for isbn, book in changed.items():
+            if isbn not in seen:
+                yield book
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        if key in self._records:
+            return True
+        return key not in self._removed and self._find(key) is not None
+
+    def get(self, key, default=None):
+        book = self._records.get(key)
+        if book is not None:
+            return book
+        if key in self._removed:
+            return default
+        position = self._find(key)
+        if position is None:
+            return default
+        book = self._load(position)
+        return self._records.setdefault(key, book)
+
+    def add(self, record):
+        key = getattr(record, self.key)
+        if key not in self:
+            self._count += 1
+        self._removed.discard(key)
+        super().add(record)
+
+    def remove(self, key):
+        record = self.get(key)
+        if record is None:
+            return None
+        self._records.pop(key, None)
+        self._removed.add(key)
+        self._count -= 1
+        for index in self._indexes:
+            index.remove(key)
+        return record
+
+    def add_index(self, index, populate=True):
+        if populate:
+            for record in self:
+                index.add(record)
+        self._indexes.append(index)
+        return index
+
+
+class SnapshotStorage(Storage):
+    def __init__(self, books_file='books.snap', users_file='users.json', durability="always", flush_interval=0.05,
+                 compact_every=DEFAULT_COMPACT_EVERY):
+        """
+        Initializes a storage engine that keeps books in a memory-mapped binary snapshot.
+
+        load_books returns a SnapshotCatalog, so startup does not parse every book.
+        The snapshot is only rewritten by save_books. Single-book saves append the
+        book to a JSON Lines change log next to it ('<books_file>.log'), which is
+        replayed on load. Once the log holds `compact_every` entries, the snapshot
+        is rewritten and the log removed. Each log entry carries the generation of
+        the snapshot it applies to, so entries left behind by a crash during a
+        rewrite are ignored. Users are stored as regular JSON.
+
+        Parameters:
+        books_file (str): Path to the snapshot file for storing books.
+        users_file (str): Path to the JSON file for storing users.
+        durability (str): When log appends and user saves reach the disk:
+            "always", "interval" or "shutdown" (see Storage).
+        flush_interval (float): Seconds between background writes in "interval" mode.
+        compact_every (int): Number of log entries after which the snapshot is rewritten.
+        """
+        super().__init__(books_file, users_file, durability=durability, flush_interval=flush_interval)
+        self.log_file = f"{books_file}.log"
+        self.compact_every = compact_every
+        self._generation = None  # of the snapshot on disk, read on first use
+        self._log_entries = 0
+
+    def _current_generation(self):
+        if self._generation is None:
+            try:
+                with open(self.books_file, 'rb') as f:
+                    self._generation = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))[3]
+            except (OSError, struct.error):
+                self._generation = 0
+        return self._generation
+
+    @timed("save_books")
+    def save_books(self, books):
+        """
+        Rewrites the snapshot with every book and removes the change log.
+
+        Parameters:
+        books (iterable): The Book objects to be saved.
+        """
+        try:
+            generation = self._current_generation() + 1
+            with self._write_lock:
+                atomic_write(self.books_file, dump_snapshot(books, generation))
+                self._generation = generation
+                try:
+                    os.remove(self.log_file)
+                except FileNotFoundError:
+                    pass
+            self._log_entries = 0
+        except (IOError, ValueError) as e:
+            print(f"An error occurred while saving books: {e}")
+
+    @timed("save_book")
+    def save_book(self, book, books):
+        """
+        Appends the new version of a single book to the change log.
+
+        Parameters:
+        book (Book): The book that was added or updated.
+        books (iterable): All books, written out when the log is compacted.
+        """
+        self.save_book_batch([book], books)
+
+    @timed("save_book_batch")
+    def save_book_batch(self, changed, books):
+        """
+        Appends the new versions of several books to the change log in one write.
+
+        Parameters:
+        changed (list): The books that were added or updated.
+        books (iterable): All books, written out when the log is compacted.
+        """
+        if not os.path.exists(self.books_file):
+            self.save_books(books)
+            return
+        generation = self._current_generation()
+        try:
+            self._append_text(self.log_file, dump_lines({"snapshot": generation, "data": book.to_dict()}
+                                                        for book in changed))
+        except IOError as e:
+            print(f"An error occurred while saving books: {e}")
+            return
+        self._log_entries += len(changed)
+        if self._log_entries >= self.compact_every:
+            self.save_books(books)
+
+    def _replay_log(self, catalog):
+        """
+        Applies the change log entries for the catalog's snapshot generation.
+
+        The log is read with Storage._read_log, which handles torn and
+        unreadable lines.
+
+        Parameters:
+        catalog (SnapshotCatalog): The catalog opened from the snapshot.
+        """
+        from book import Book
+        entries = 0
+        for entry in self._read_log(self.log_file):
+            if entry["snapshot"] == catalog.generation:
+                catalog.add(Book.from_dict(entry["data"]))
+                entries += 1
+        self._log_entries = entries
+
+    @timed("load_books")
+    def load_books(self):
+        """
+        Opens the snapshot as a memory-mapped catalog and applies the change log.
+
+        Returns:
+        SnapshotCatalog: The catalog, or an empty list if the file does not exist
+            or cannot be read.
+        """
+        if not os.path.exists(self.books_file):
+            print(f"{self.books_file} not found. Returning an empty list.")
+            return []
+        try:
+            catalog = SnapshotCatalog(self.books_file)
+        except (ValueError, struct.error) as e:
+            print(f"An error occurred while loading books: {e}")
+            self._set_aside(self.books_file)
+            return []
+        self._generation = catalog.generation
+        self._replay_log(catalog)
+        return catalog
+
+
+def convert_json_to_snapshot(json_file='books.json', snapshot_file='books.snap'):
+    """
+    Converts a books.json file into the snapshot format used by SnapshotStorage.
+
+    Parameters:
+    json_file (str): Path to the existing JSON file.
+    snapshot_file (str): Path of the snapshot to write.
+
+    Returns:
+    int: The number of books converted.
+    """
+    books = Storage(books_file=json_file).load_books()
+    SnapshotStorage(books_file=snapshot_file).save_books(books)
+    return len(books)
+
+
+def convert_snapshot_to_json(snapshot_file='books.snap', json_file='books.json'):
+    """
+    Converts a snapshot, including its change log, back into a books.json file.
+
+    Parameters:
+    snapshot_file (str): Path to the existing snapshot.
+    json_file (str): Path of the JSON file to write.
+
+    Returns:
+    int: The number of books converted.
+    """
+    books = SnapshotStorage(books_file=snapshot_file).load_books()
+    Storage(books_file=json_file).save_books(books)
+    return len(books)
+
+
+if __name__ == "__main__":
+    # Usage: python snapshot_storage.py [books.json] [books.snap]
+    #        python snapshot_storage.py --to-json [books.snap] [books.json]
+    if sys.argv[1:2] == ["--to-json"]:
+        print(f"Converted {convert_snapshot_to_json(*sys.argv[2:4])} books.")
+    else:
+        print(f"Converted {convert_json_to_snapshot(*sys.argv[1:3])} books.")
@@ -0,0 +1,325 @@
+import json
+import sqlite3
+import sys
+import threading
+
+from metrics import timed
+from storage import Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    available INTEGER NOT NULL,
+    attributes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    attributes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS holds (
+    isbn TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    placed_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    ready_at REAL,
+    PRIMARY KEY (isbn, user_id)
+);
+CREATE TABLE IF NOT EXISTS loans (
+    loan_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    isbn TEXT NOT NULL,
+    checked_out_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    returned_at REAL
+);
+CREATE INDEX IF NOT EXISTS open_loans ON loans (loan_id) WHERE returned_at IS NULL;
+"""
+
+UPSERT_BOOK = """
+INSERT INTO books (isbn, title, author, count, available, attributes) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(isbn) DO UPDATE SET title = excluded.title, author = excluded.author,
+    count = excluded.count, available = excluded.available, attributes = excluded.attributes
+"""
+UPSERT_USER = """
+INSERT INTO users (user_id, name, attributes) VALUES (?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET name = excluded.name, attributes = excluded.attributes
+"""
+DELETE_USER = "DELETE FROM users WHERE user_id = ?"
+SELECT_BOOKS = "SELECT isbn, title, author, count, available, attributes FROM books ORDER BY rowid"
+SELECT_USERS = "SELECT user_id, name, attributes FROM users ORDER BY rowid"
+INSERT_HOLD = "INSERT INTO holds (isbn, user_id, priority, placed_at, status, ready_at) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_HOLDS = "SELECT isbn, user_id, priority, placed_at, status, ready_at FROM holds ORDER BY rowid"
+UPSERT_LOAN = """
+INSERT INTO loans (loan_id, user_id, isbn, checked_out_at, due_at, returned_at) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(loan_id) DO UPDATE SET returned_at = excluded.returned_at
+"""
+SELECT_OPEN_LOANS = """
+SELECT user_id, isbn, checked_out_at, due_at, returned_at, loan_id FROM loans
+WHERE returned_at IS NULL ORDER BY rowid
+"""
+
+
+def _book_row(book):
+    return (book.isbn, book.title, book.author, book.count, int(book.available),
+            json.dumps(book.attribute_dict()))
+
+
+def _user_row(user):
+    return (user.user_id, user.name, json.dumps(user.attribute_dict()))
+
+
+def _loan_row(loan):
+    return (loan.loan_id, loan.user_id, loan.isbn, loan.checked_out_at, loan.due_at, loan.returned_at)
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, db_file='library.db'):
+        """
+        Initializes a storage engine backed by an SQLite database.
+
+        Books and users live in tables keyed by isbn and user_id, with additional
+        attributes kept in a JSON column. The database runs in WAL mode, so single
+        record writes only touch the affected rows.
+
+        Parameters:
+        db_file (str): Path to the SQLite database file.
+        """
+        super().__init__()
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()  # Transactions on the shared connection must not interleave
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        super().close()
+        self.connection.close()
+
+    @timed("file_io")
+    def _write(self, *batches, replace_table=None):
+        """
+        Runs write statements in a single transaction.
+
+        Parameters:
+        *batches (tuple): (statement, rows) pairs, with one parameter tuple per row.
+        replace_table (str, optional): A table to empty before writing.
+
+        Returns:
+        bool: True if the transaction was committed.
+        """
+        try:
+            with self._lock, self.connection:
+                if replace_table:
+                    self.connection.execute(f"DELETE FROM {replace_table}")
+                for statement, rows in batches:
+                    self.connection.executemany(statement, rows)
+            return True
+        except sqlite3.Error as e:
+            print(f"An error occurred while writing to {self.db_file}: {e}")
+            return False
+
+    @timed("save_books")
+    def save_books(self, books):
+        """
+        Replaces all stored books with the given ones.
+
+        Parameters:
+        books (iterable): The Book objects to be saved.
+        """
+        self._write((UPSERT_BOOK, [_book_row(book) for book in books]), replace_table="books")
+
+    @timed("save_book")
+    def save_book(self, book, books=None):
+        """
+        Inserts or updates a single book.
+
+        Parameters:
+        book (Book): The book that was added or updated.
+        books (iterable, optional): Unused; the other rows are left untouched.
+        """
+        self._write((UPSERT_BOOK, [_book_row(book)]))
+
+    @timed("save_book_batch")
+    def save_book_batch(self, changed, books=None):
+        """
+        Inserts or updates several books in one transaction.
+
+        Parameters:
+        changed (list): The books that were added or updated.
+        books (iterable, optional): Unused; the other rows are left untouched.
+        """
+        self._write((UPSERT_BOOK, [_book_row(book) for book in changed]))
+
+    @timed("load_books")
+    def load_books(self):
+        """
+        Loads all books from the database in insertion order.
+
+        Returns:
+        list: A list of Book objects.
+        """
+        from book import Book
+        try:
+            return [Book(title, author, isbn, count, bool(available), **json.loads(attributes))
+                    for isbn, title, author, count, available, attributes
+                    in self.connection.execute(SELECT_BOOKS)]
+        except sqlite3.Error as e:
+            print(f"An error occurred while loading books: {e}")
+            return []
+
+    @timed("save_users")
+    def save_users(self, users):
+        """
+        Replaces all stored users with the given ones.
+
+        Parameters:
+        users (iterable): The User objects to be saved.
+        """
+        self._write((UPSERT_USER, [_user_row(user) for user in users]), replace_table="users")
+
+    @timed("save_user")
+    def save_user(self, user, users=None):
+        """
+        Inserts or updates a single user.
+
+        Parameters:
+        user (User): The user that was added or updated.
+        users (iterable, optional): Unused; the other rows are left untouched.
+        """
+        self._write((UPSERT_USER, [_user_row(user)]))
+
+    @timed("remove_user")
+    def remove_user(self, user, users=None):
+        """
+        Deletes a single user.
+
+        Parameters:
+        user (User): The user that was deleted.
+        users (iterable, optional): Unused; the other rows are left untouched.
+        """
+        self._write((DELETE_USER, [(user.user_id,)]))
+
+    @timed("save_user_batch")
+    def save_user_batch(self, saved, removed, users=None):
+        """
+        Applies several user upserts and deletes in one transaction.
+
+        Parameters:
+        saved (list): The users that were added or updated.
+        removed (list): The users that were deleted.
+        users (iterable, optional): Unused; the other rows are left untouched.
+        """
+        self._write((UPSERT_USER, [_user_row(user) for user in saved]),
+                    (DELETE_USER, [(user.user_id,) for user in removed]))
+
+    @timed("load_users")
+    def load_users(self):
+        """
+        Loads all users from the database in insertion order.
+
+        Returns:
+        list: A list of User objects.
+        """
+        from user import User
+        try:
+            return [User(user_id, name, **json.loads(attributes))
+                    for user_id, name, attributes in self.connection.execute(SELECT_USERS)]
+        except sqlite3.Error as e:
+            print(f"An error occurred while loading users: {e}")
+            return []
+
+    @timed("save_holds")
+    def save_holds(self, holds):
+        """
+        Replaces all stored holds with the given ones.
+
+        Parameters:
+        holds (iterable): The Hold objects to be saved.
+        """
+        self._write((INSERT_HOLD, [(hold.isbn, hold.user_id, hold.priority, hold.placed_at, hold.status,
+                                    hold.ready_at) for hold in holds]), replace_table="holds")
+
+    @timed("load_holds")
+    def load_holds(self):
+        """
+        Loads all active holds from the database in the order they were saved.
+
+        Returns:
+        list: A list of Hold objects.
+        """
+        from holds import Hold
+        try:
+            return [Hold(*row) for row in self.connection.execute(SELECT_HOLDS)]
+        except sqlite3.Error as e:
+            print(f"An error occurred while loading holds: {e}")
+            return []
+
+    @timed("save_loan_batch")
+    def save_loan_batch(self, opened, closed, loans=None):
+        """
+        Inserts opened loans and marks closed ones as returned in one transaction.
+
+        Closed loans stay in the table as history.
+
+        Parameters:
+        opened (list): The Loan objects that were opened.
+        closed (list): The Loan objects that were closed.
+        loans (LoanLedger, optional): Unused; the other rows are left untouched.
+        """
+        self._write((UPSERT_LOAN, [_loan_row(loan) for loan in opened + closed]))
+
+    @timed("load_loans")
+    def load_loans(self):
+        """
+        Loads the open loans from the database in the order they were made.
+
+        Returns:
+        list: A list of Loan objects.
+        """
+        from loans import Loan
+        try:
+            return [Loan(*row) for row in self.connection.execute(SELECT_OPEN_LOANS)]
+        except sqlite3.Error as e:
+            print(f"An error occurred while loading loans: {e}")
+            return []
+
+
+def migrate_from_json(books_file='books.json', users_file='users.json', db_file='library.db'):
+    """
+    Copies books and users from the JSON files into an SQLite database.
+
+    Existing rows in the database are replaced.
+
+    Parameters:
+    books_file (str): Path to the JSON file holding books.
+    users_file (str): Path to the JSON file holding users.
+    db_file (str): Path to the SQLite database to fill.
+
+    Returns:
+    tuple: The number of books and users migrated.
+    """
+    source = Storage(books_file, users_file)
+    books = source.load_books()
+    users = source.load_users()
+    target = SQLiteStorage(db_file)
+    try:
+        target.save_books(books)
+        target.save_users(users)
+    finally:
+        target.close()
+    return len(books), len(users)
+
+
+if __name__ == "__main__":
+    # Usage: python sqlite_storage.py [books.json] [users.json] [library.db]
+    books_count, users_count = migrate_from_json(*sys.argv[1:4])
+    print(f"Migrated {books_count} books and {users_count} users.")
@@ -1,30 +1,398 @@
+import atexit
 import json
+import os
+import threading
+import time
+
+from metrics import timed
+
+DURABILITY_LEVELS = ("always", "interval", "shutdown")
+
+
+@timed("fsync")
+def fsync(fd):
+    """
+    Flushes a file's data to disk.
+
+    Parameters:
+    fd (int): An open descriptor of the file.
+    """
+    os.fsync(fd)
+
+
+@timed("file_io")
+def read_file(path):
+    """
+    Reads a whole text file.
+
+    Parameters:
+    path (str): The file to read.
+
+    Returns:
+    str: The file's contents.
+    """
+    with open(path, 'r') as f:
+        return f.read()
+
+
+@timed("file_io")
+def atomic_write(path, text):
+    """
+    Replaces a file's contents so that a crash leaves either the old or the new file.
+
+    The text is written to '<path>.tmp', flushed to disk with fsync and renamed
+    over the original. The directory is synced as well so the rename survives a
+    power loss.
+
+    Parameters:
+    path (str): The file to replace.
+    text (str or bytes): The new contents.
+    """
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'wb' if isinstance(text, bytes) else 'w') as f:
+        f.write(text)
+        f.flush()
+        fsync(f.fileno())
+    os.replace(temp_file, path)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return  # directories cannot be opened on some platforms
+    try:
+        fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@timed("file_io")
+def quarantine_lines(path, damaged):
+    """
+    Moves unreadable lines out of a JSON Lines log so that the rest of it stays usable.
+
+    The lines are appended to '<path>.corrupt' and synced, for inspection, before
+    the log is rewritten atomically without them.
+
+    Parameters:
+    path (str): The log file.
+    damaged (list): The (offset, length) of each unreadable line, in file order.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    kept = []
+    start = 0
+    with open(f"{path}.corrupt", 'ab') as corrupt:
+        for offset, length in damaged:
+            kept.append(data[start:offset])
+            corrupt.write(data[offset:offset + length])
+            start = offset + length
+        corrupt.flush()
+        fsync(corrupt.fileno())
+    kept.append(data[start:])
+    atomic_write(path, b"".join(kept))
+    print(f"Moved {len(damaged)} unreadable line(s) of {path} to {path}.corrupt.")
+
+
+@timed("serialize")
+def dump_records(records, indent=4):
+    """
+    Serializes records as a JSON list, reusing each unchanged record's cached text.
+
+    With an indent the output matches json.dump(..., indent=indent). Without one,
+    each record is written compactly on its own line.
+
+    Parameters:
+    records (iterable): The Book or User objects to serialize.
+    indent (int, optional): The indentation to use, or None for compact output.
+
+    Returns:
+    str: The JSON document.
+    """
+    fragments = [record.json_fragment(indent) for record in records]
+    if not fragments:
+        return "[]"
+    return "[\n" + ",\n".join(fragments) + "\n]"
+
+
+@timed("serialize")
+def dump_lines(entries):
+    """
+    Serializes dictionaries as compact JSON, one per line.
+
+    Parameters:
+    entries (iterable): The dictionaries to serialize.
+
+    Returns:
+    str: The lines, each ending with a newline.
+    """
+    return "".join(json.dumps(entry, separators=(',', ':')) + "\n" for entry in entries)
+
+
+@timed("deserialize")
+def parse_records(text, factory):
+    """
+    Parses a JSON list into records.
+
+    Parameters:
+    text (str): The JSON document.
+    factory (callable): Builds a record from its dictionary, e.g. Book.from_dict.
+
+    Returns:
+    list: The records.
+    """
+    return [factory(data) for data in json.loads(text)]
+
 
 class Storage:
-    def __init__(self, books_file='books.json', users_file='users.json'):
+    def __init__(self, books_file='books.json', users_file='users.json', indent=4,
+                 durability="always", flush_interval=0.05, holds_file=None, loans_file=None,
+                 compact_loans_every=1000):
         """
         Initializes the Storage object with file paths for storing books and users data.
 
+        Files are replaced atomically, so a crash during a save never leaves a
+        truncated file behind. The durability level sets when changes reach the disk:
+
+        - "always": every save is written and fsynced before it returns.
+        - "interval": saves return at once; a background thread writes the latest
+          state at most every `flush_interval` seconds, so a burst of saves shares
+          one write and one fsync.
+        - "shutdown": changes are written only by flush() or close(), which also
+          runs at interpreter exit.
+
         Parameters:
         books_file (str): Path to the JSON file for storing books data.
         users_file (str): Path to the JSON file for storing users data.
+        indent (int, optional): Indentation of the JSON files. None writes compact
+            files with one record per line.
+        durability (str): "always", "interval" or "shutdown".
+        flush_interval (float): Seconds between background writes in "interval" mode.
+        holds_file (str, optional): Path to the JSON file for storing holds. Defaults
+            to 'holds.json' next to the books file.
+        loans_file (str, optional): Path to the JSON Lines log of open loans. Defaults
+            to 'loans.jsonl' next to the books file. Returned loans are appended to
+            '<name>-history.jsonl' beside it.
+        compact_loans_every (int): Minimum number of log entries after which the loan
+            log is rewritten with only the open loans.
         """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_LEVELS)}, not {durability!r}")
         self.books_file = books_file
         self.users_file = users_file
+        self.holds_file = holds_file or os.path.join(os.path.dirname(books_file), "holds.json")
+        self.loans_file = loans_file or os.path.join(os.path.dirname(books_file), "loans.jsonl")
+        self.loan_history_file = f"{os.path.splitext(self.loans_file)[0]}-history.jsonl"
+        self.compact_loans_every = compact_loans_every
+        self._loan_entries = 0  # entries in the loan log since it was last compacted
+        self.indent = indent
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self._deferred = {}  # path -> records waiting to be written
+        self._unsynced = set()  # appended files waiting for fsync
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        if durability == "interval":
+            self._thread = threading.Thread(target=self._run, name=f"storage-{books_file}", daemon=True)
+            self._thread.start()
+        if durability != "always":
+            atexit.register(self.close)
+
+    def _run(self):
+        """
+        Writes deferred changes every flush_interval seconds until the storage is closed.
+        """
+        while True:
+            with self._condition:
+                while not (self._deferred or self._unsynced or self._closed):
+                    self._condition.wait()
+                # Let the rest of the burst arrive before writing.
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write_file(self, path, records, label):
+        """
+        Writes records to a JSON file now or later, depending on the durability level.
+
+        Parameters:
+        path (str): The file to write.
+        records (iterable): The Book or User objects to write.
+        label (str): 'books' or 'users', for error messages.
+        """
+        if self.durability == "always" or self._closed:
+            try:
+                with self._write_lock:
+                    atomic_write(path, dump_records(records, self.indent))
+            except IOError as e:
+                print(f"An error occurred while saving {label}: {e}")
+            return
+        with self._condition:
+            self._deferred[path] = (records, label)
+            self._condition.notify()
+
+    def _set_aside(self, path):
+        """
+        Renames an unreadable file so that the next save does not overwrite it.
+
+        Parameters:
+        path (str): The file that could not be parsed.
+        """
+        corrupt_file = f"{path}.corrupt-{int(time.time())}"
+        try:
+            os.replace(path, corrupt_file)
+            print(f"Moved the unreadable file to {corrupt_file}.")
+        except OSError as e:
+            print(f"An error occurred while moving {path} aside: {e}")
+
+    def _sync_append(self, f):
+        """
+        Makes data appended to an open file durable according to the durability level.
+
+        Parameters:
+        f (file): The file that was appended to, still open.
+        """
+        if self.durability == "always":
+            f.flush()
+            fsync(f.fileno())
+            return
+        with self._condition:
+            self._unsynced.add(f.name)
+            self._condition.notify()
+
+    @timed("file_io")
+    def _append_text(self, path, text):
+        """
+        Appends text to a file and makes it durable according to the durability level.
+
+        Parameters:
+        path (str): The file to append to.
+        text (str): The text to append.
+        """
+        with open(path, 'a') as f:
+            f.write(text)
+            self._sync_append(f)
+
+    def _read_log(self, path):
+        """
+        Yields the entries of a JSON Lines log, such as a journal, in order.
+
+        A final line without a newline was torn by a crash mid-append; it is cut
+        off so that later appends start on a clean line. Any other line that
+        cannot be parsed is skipped, and once the whole log has been read such
+        lines are moved to '<path>.corrupt' (see quarantine_lines), so the entries
+        around them are still applied and kept.
+
+        Callers must read every entry; the file is repaired after the last one.
+
+        Parameters:
+        path (str): The log to read. A missing file has no entries.
+
+        Returns:
+        iterator: The entries as dictionaries.
+        """
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        damaged = []
+        torn = False
+        offset = 0
+        with f:
+            for number, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    torn = True
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    print(f"Skipping unreadable line {number} of {path}: {e}")
+                    damaged.append((offset, len(line)))
+                else:
+                    yield entry
+                offset += len(line)
+        if torn:
+            print(f"Discarding incomplete entry at the end of {path}.")
+            os.truncate(path, offset)
+        if damaged:
+            quarantine_lines(path, damaged)
 
+    @timed("flush")
+    def flush(self):
+        """
+        Writes all deferred changes and fsyncs appended files.
+        """
+        with self._condition:
+            deferred, self._deferred = self._deferred, {}
+            unsynced, self._unsynced = self._unsynced, set()
+        with self._write_lock:
+            for path, (records, label) in deferred.items():
+                try:
+                    atomic_write(path, dump_records(records, self.indent))
+                except IOError as e:
+                    print(f"An error occurred while saving {label}: {e}")
+            for path in unsynced:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                    try:
+                        fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError as e:
+                    print(f"An error occurred while syncing {path}: {e}")
+
+    def close(self):
+        """
+        Writes all deferred changes and stops the background writer.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self.flush()
+
+    @timed("save_books")
     def save_books(self, books):
         """
         Saves the list of books to a JSON file.
 
+        Only books changed since the last save are serialized again.
+
         Parameters:
         books (list): A list of Book objects to be saved.
         """
-        try:
-            with open(self.books_file, 'w') as f:
-                json.dump([book.to_dict() for book in books], f, indent=4)
-        except IOError as e:
-            print(f"An error occurred while saving books: {e}")
+        self._write_file(self.books_file, books, "books")
+
+    @timed("save_book")
+    def save_book(self, book, books):
+        """
+        Persists a single added or updated book.
+
+        The JSON storage has no per-record format, so this rewrites the whole file.
+        Other storage engines override it to write only the changed record.
+
+        Parameters:
+        book (Book): The book that was added or updated.
+        books (iterable): All books, for engines that rewrite the whole catalog.
+        """
+        self.save_books(books)
+
+    @timed("save_book_batch")
+    def save_book_batch(self, changed, books):
+        """
+        Persists several added or updated books at once.
 
+        Parameters:
+        changed (list): The books that were added or updated.
+        books (iterable): All books, for engines that rewrite the whole catalog.
+        """
+        if len(changed) == 1:
+            self.save_book(changed[0], books)
+        else:
+            self.save_books(books)
+
+    @timed("load_books")
     def load_books(self):
         """
         Loads the list of books from a JSON file.
@@ -34,28 +402,62 @@ class Storage:
         """
         try:
             from book import Book
-            with open(self.books_file, 'r') as f:
-                return [Book.from_dict(data) for data in json.load(f)]
+            return parse_records(read_file(self.books_file), Book.from_dict)
         except FileNotFoundError:
             print(f"{self.books_file} not found. Returning an empty list.")
             return []
         except json.JSONDecodeError as e:
             print(f"An error occurred while loading books: {e}")
+            self._set_aside(self.books_file)
             return []
 
+    @timed("save_users")
     def save_users(self, users):
         """
         Saves the list of users to a JSON file.
 
+        Only users changed since the last save are serialized again.
+
         Parameters:
         users (list): A list of User objects to be saved.
         """
-        try:
-            with open(self.users_file, 'w') as f:
-                json.dump([user.to_dict() for user in users], f, indent=4)
-        except IOError as e:
-            print(f"An error occurred while saving users: {e}")
+        self._write_file(self.users_file, users, "users")
+
+    @timed("save_user")
+    def save_user(self, user, users):
+        """
+        Persists a single added or updated user.
 
+        Parameters:
+        user (User): The user that was added or updated.
+        users (iterable): All users, for engines that rewrite the whole file.
+        """
+        self.save_users(users)
+
+    @timed("remove_user")
+    def remove_user(self, user, users):
+        """
+        Persists the deletion of a single user.
+
+        Parameters:
+        user (User): The user that was deleted.
+        users (iterable): The remaining users, for engines that rewrite the whole file.
+        """
+        self.save_users(users)
+
+    @timed("save_user_batch")
+    def save_user_batch(self, saved, removed, users):
+        """
+        Persists several added, updated or deleted users at once.
+
+        Parameters:
+        saved (list): The users that were added or updated.
+        removed (list): The users that were deleted.
+        users (iterable): The current users, for engines that rewrite the whole file.
+        """
+        self.save_users(users)
+
+    @timed("load_users")
     def load_users(self):
         """
         Loads the list of users from a JSON file.
@@ -65,11 +467,94 @@ class Storage:
         """
         try:
             from user import User
-            with open(self.users_file, 'r') as f:
-                return [User.from_dict(data) for data in json.load(f)]
+            return parse_records(read_file(self.users_file), User.from_dict)
         except FileNotFoundError:
             print(f"{self.users_file} not found. Returning an empty list.")
             return []
         except json.JSONDecodeError as e:
             print(f"An error occurred while loading users: {e}")
+            self._set_aside(self.users_file)
+            return []
+
+    @timed("save_holds")
+    def save_holds(self, holds):
+        """
+        Saves all active holds to a JSON file.
+
+        Parameters:
+        holds (iterable): The Hold objects to be saved.
+        """
+        self._write_file(self.holds_file, holds, "holds")
+
+    @timed("load_holds")
+    def load_holds(self):
+        """
+        Loads the active holds from a JSON file.
+
+        Returns:
+        list: A list of Hold objects, or an empty list if none were saved.
+        """
+        try:
+            from holds import Hold
+            return parse_records(read_file(self.holds_file), Hold.from_dict)
+        except FileNotFoundError:
             return []
+        except json.JSONDecodeError as e:
+            print(f"An error occurred while loading holds: {e}")
+            self._set_aside(self.holds_file)
+            return []
+
+    @timed("save_loan_batch")
+    def save_loan_batch(self, opened, closed, loans):
+        """
+        Records loans that were opened or closed.
+
+        Each change is appended to the loan log, and every closed loan is appended
+        in full to the history file. Once the log holds more entries than both
+        `compact_loans_every` and twice the number of open loans, it is rewritten
+        with only the open loans, so loading never replays the whole history.
+
+        Parameters:
+        opened (list): The Loan objects that were opened.
+        closed (list): The Loan objects that were closed.
+        loans (LoanLedger): All open loans, written out when the log is compacted.
+        """
+        entries = [{"op": "open", "data": loan.to_dict()} for loan in opened]
+        entries.extend({"op": "close", "loan_id": loan.loan_id} for loan in closed)
+        try:
+            if closed:
+                # History first: after a crash a loan may be closed twice, never lost.
+                self._append_text(self.loan_history_file, dump_lines(loan.to_dict() for loan in closed))
+            self._append_text(self.loans_file, dump_lines(entries))
+            self._loan_entries += len(entries)
+            if self._loan_entries >= max(self.compact_loans_every, 2 * len(loans)):
+                loans = list(loans)
+                text = dump_lines({"op": "open", "data": loan.to_dict()} for loan in loans)
+                with self._write_lock:
+                    atomic_write(self.loans_file, text)
+                self._loan_entries = len(loans)
+        except IOError as e:
+            print(f"An error occurred while saving loans: {e}")
+
+    @timed("load_loans")
+    def load_loans(self):
+        """
+        Loads the open loans by replaying the loan log.
+
+        The log is read with _read_log, which handles torn and unreadable lines.
+
+        Returns:
+        list: A list of open Loan objects, or an empty list if none were saved.
+        """
+        from loans import Loan
+        loans = {}
+        entries = 0
+        for entry in self._read_log(self.loans_file):
+            if entry["op"] == "open":
+                loan = Loan.from_dict(entry["data"])
+                loans[loan.loan_id] = loan
+            elif entry["op"] == "close":
+                loans.pop(entry["loan_id"], None)
+            entries += 1
+        self._loan_entries = entries
+        return list(loans.values())
@@ -1,7 +1,26 @@
+import operator
+import threading
+
 from storage import Storage
 from logger import Logger
+from catalog import Catalog
+from search_index import SearchIndex
+from search_cache import DEFAULT_CACHE_SIZE, SearchCache
+from listing import DEFAULT_PAGE_SIZE, Listing
+from models import CompactRecord, intern_schema
+from concurrency import CoalescingWriter, KeyedLocks
+from metrics import timed
+
+USER_FIELDS = frozenset(("user_id", "name"))
+USER_SORT_ORDERS = {
+    "name": lambda user: user.name.casefold(),
+    "user_id": operator.attrgetter("user_id"),
+}
+
+class User(CompactRecord):
+    __slots__ = ("user_id", "name")
+    _state = operator.attrgetter(*__slots__, "_schema", "_values")
 
-class User:
     def __init__(self, user_id, name, **kwargs):
         """
         Initializes a new User instance with required and optional attributes.
@@ -13,7 +32,7 @@ class User:
         """
         self.user_id = user_id
         self.name = name
-        self.additional_attributes = kwargs  # Store any additional attributes
+        self._set_attributes(kwargs)  # Store any additional attributes
 
     def __str__(self):
         """
@@ -23,7 +42,7 @@ class User:
         str: A string with the user's details.
         """
         details = f"User: {self.name} (ID: {self.user_id})"
-        for key, value in self.additional_attributes.items():
+        for key, value in zip(self._schema, self._values):
             details += f", {key.capitalize()}: {value}"
         return details
 
@@ -38,34 +57,83 @@ class User:
             "user_id": self.user_id,
             "name": self.name
         }
-        data.update(self.additional_attributes)
+        data.update(zip(self._schema, self._values))
         return data
 
+    def search_fields(self):
+        """
+        Returns the searchable fields of the user.
+
+        The user ID is matched exactly rather than by substring, so it is not included.
+
+        Returns:
+        dict: The name and additional attributes keyed by field name.
+        """
+        fields = {"name": self.name}
+        fields.update(zip(self._schema, self._values))
+        return fields
+
     @classmethod
     def from_dict(cls, data):
         """
         Creates a User object from a dictionary.
 
+        The dictionary is left unchanged.
+
         Parameters:
         data (dict): The dictionary containing user data.
 
         Returns:
         User: A new User instance created from the dictionary data.
         """
-        user_id = data.pop("user_id")
-        name = data.pop("name")
-        return cls(user_id, name, **data)
+        user = cls.__new__(cls)
+        user.user_id = data["user_id"]
+        user.name = data["name"]
+        schema = intern_schema(key for key in data if key not in USER_FIELDS)
+        user._schema = schema
+        user._values = tuple(data[key] for key in schema)
+        return user
 
 
 class ManageUsers:
-    def __init__(self) -> None:
+    def __init__(self, storage=None, logger=None, users=None, cache_size=DEFAULT_CACHE_SIZE,
+                 cache_ttl=None) -> None:
         """
         Initializes the ManageUsers instance, loading users from storage.
+
+        Parameters:
+        storage (Storage, optional): The storage engine to use. Defaults to JSON file storage.
+        logger (Logger, optional): The logger to use. Defaults to a Logger writing to 'users.log'.
+        users (Catalog or iterable, optional): Users that were already loaded. When
+            given, the storage is not read.
+        cache_size (int): The number of user searches whose results are cached. 0
+            disables the cache.
+        cache_ttl (float, optional): Seconds after which a cached search expires.
+        """
+        self.storage = storage or Storage(users_file='users.json')
+        if users is None:
+            users = self.storage.load_users()
+        self.users = users if isinstance(users, Catalog) else Catalog(users, key="user_id")
+        self.user_index = None  # Built on the first search, see user_search_index()
+        self.search_cache = SearchCache("user_id", User.search_fields, cache_size, cache_ttl)
+        self.listing = Listing(self.users, USER_SORT_ORDERS, USER_FIELDS)
+        self.logger = logger or Logger("users.log")
+        self.user_locks = KeyedLocks()
+        self.user_writer = CoalescingWriter(self._flush_users)
+        self._user_index_lock = threading.Lock()
+
+    def _flush_users(self, changes):
         """
-        self.storage = Storage(users_file='users.json')
-        self.users = self.storage.load_users()
-        self.logger = Logger("users.log")
+        Persists a batch of user changes collected by the user writer.
 
+        Parameters:
+        changes (list): ("save", user) or ("remove", user) pairs.
+        """
+        saved = [user for operation, user in changes if operation == "save"]
+        removed = [user for operation, user in changes if operation == "remove"]
+        self.storage.save_user_batch(saved, removed, self.users)
+
+    @timed("add_user")
     def add_user(self, user_id, name, **kwargs):
         """
         Adds a new user to the system or updates an existing user.
@@ -76,19 +144,81 @@ class ManageUsers:
         **kwargs: Additional attributes for the user (e.g., location, dob).
         """
         try:
-            if any(user.user_id == user_id for user in self.users):
-                print(f"User with ID {user_id} already exists.")
-                return
-            
-            new_user = User(user_id, name, **kwargs)
-            self.users.append(new_user)
-            self.storage.save_users(self.users)
-            self.logger.log(f"Added user: {new_user}")
+            with self.user_locks.lock_for(user_id):
+                if user_id in self.users:
+                    print(f"User with ID {user_id} already exists.")
+                    return
+
+                new_user = User(user_id, name, **kwargs)
+                self.users.add(new_user)
+            self.user_writer.write(user_id, ("save", new_user))
+            self.logger.log(f"Added user: {new_user}", event="add_user", user_id=user_id)
             print(f"User added: {new_user}")
         except Exception as e:
             print(f"An error occurred while adding a user: {e}")
             self.logger.log(f"Error while adding user: {e}")
 
+    @timed("add_users_bulk")
+    def add_users_bulk(self, records):
+        """
+        Adds many users at once, persisting and logging once for the whole batch.
+
+        As with add_user, a user ID that already exists (or appears earlier in the
+        batch) is left unchanged.
+
+        Parameters:
+        records (iterable): Dictionaries with user_id and name, plus optional
+            additional attributes.
+
+        Returns:
+        dict: The number of users added, skipped as duplicates and skipped as invalid.
+
+        Raises:
+        Exception: Whatever reading the records raises, e.g. a ValueError for a
+            malformed row, after the users added so far have been saved.
+        """
+        summary = {"added": 0, "duplicates": 0, "skipped": 0}
+        changed = {}
+        try:
+            for data in records:
+                user_id = data.get("user_id")
+                if not user_id or not data.get("name"):
+                    summary["skipped"] += 1
+                    continue
+                with self.user_locks.lock_for(user_id):
+                    if user_id in self.users:
+                        summary["duplicates"] += 1
+                        continue
+                    user = User.from_dict(data)
+                    self.users.add(user)
+                changed[user_id] = ("save", user)
+                summary["added"] += 1
+        except Exception as e:
+            self.logger.log(f"Error while adding users in bulk after {len(changed)} users: {e}")
+            raise
+        finally:
+            if changed:
+                self.user_writer.write_many(changed)
+        self.logger.log(f"Bulk added users: {summary['added']} added, "
+                        f"{summary['duplicates']} duplicates, {summary['skipped']} skipped")
+        print(f"Users imported: {summary['added']} added, {summary['duplicates']} duplicates, "
+              f"{summary['skipped']} skipped.")
+        return summary
+
+    def user_search_index(self):
+        """
+        Returns the full-text index over the users, building it on first use.
+
+        Returns:
+        SearchIndex: The index, kept up to date by the catalog afterwards.
+        """
+        with self._user_index_lock:
+            if self.user_index is None:
+                self.user_index = self.users.add_index(SearchIndex("user_id", User.search_fields))
+                self.users.add_index(self.search_cache, populate=False)
+        return self.user_index
+
+    @timed("list_users")
     def list_users(self):
         """
         Lists all users currently in the system.
@@ -99,6 +229,44 @@ class ManageUsers:
             for user in self.users:
                 print(user)
 
+    def iter_users(self, sort="name", reverse=False, cursor=None, attributes=None):
+        """
+        Yields users in a sort order, optionally filtered, one at a time.
+
+        Parameters:
+        sort (str): 'name' or 'user_id'. Ties are ordered by user ID.
+        reverse (bool): List in descending order.
+        cursor (str, optional): Start after the user a previous page ended with.
+        attributes (dict, optional): Additional attribute -> required value, e.g.
+            {'location': 'Paris'}.
+
+        Returns:
+        iterator: The matching User objects.
+
+        Raises:
+        ValueError: If the sort order or the cursor is invalid.
+        """
+        for user in self.listing.iterate(sort, attributes, cursor, reverse):
+            yield user
+
+    def list_users_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort="name", reverse=False, attributes=None):
+        """
+        Returns one page of users in a sort order, optionally filtered.
+
+        Parameters:
+        limit (int): The page size.
+        cursor (str, optional): The cursor returned with the previous page.
+        sort, reverse, attributes: As for iter_users().
+
+        Returns:
+        tuple: The User objects, and the cursor of the next page (None after the last page).
+
+        Raises:
+        ValueError: If the limit is not positive, or the sort order or the cursor is invalid.
+        """
+        return self.listing.page(sort, attributes, cursor, reverse, limit)
+
+    @timed("search_users")
     def search_users(self, keyword, parameter=""):
         """
         Searches for users by a specific parameter and keyword.
@@ -106,29 +274,39 @@ class ManageUsers:
         Parameters:
         parameter (str): The attribute to search by (e.g., name, user_id).
         keyword (str): The keyword to search for in the specified attribute.
+
+        Returns:
+        list: The matching User objects.
         """
         try:
-            results = []
-            if parameter == "name":
-                results = [user for user in self.users if keyword.lower() in user.name.lower()]
-            elif parameter == "user_id":
-                results = [user for user in self.users if keyword == user.user_id]
-            else:
-                for user in self.users:
-                    if parameter in user.additional_attributes and keyword.lower() in str(user.additional_attributes[parameter]).lower():
-                        results.append(user)
-                    elif keyword.lower() in user.name.lower() or keyword == user.user_id:
-                        results.append(user)
-
+            index = self.user_search_index()
+            query = (keyword, parameter)
+            keys = self.search_cache.get(query)
+            if keys is None:
+                generation = self.search_cache.generation
+                if parameter == "name":
+                    keys, fields, exact = index.search(keyword, ["name"]), ("name",), False
+                elif parameter == "user_id":
+                    keys, fields, exact = ([keyword] if keyword in self.users else []), (), True
+                else:
+                    keys = set(index.search(keyword, [parameter, "name"]))
+                    if keyword in self.users:
+                        keys.add(keyword)
+                    keys, fields, exact = index.ordered(keys), (parameter, "name"), True
+                self.search_cache.put(query, keys, fields, exact, generation)
+            results = [self.users.get(key) for key in keys]
             if results:
                 for user in results:
                     print(user)
             else:
                 print(f"No users found for {parameter}: {keyword}")
+            return results
         except Exception as e:
             print(f"An error occurred during user search: {e}")
             self.logger.log(f"Error during user search: {e}")
+            return []
 
+    @timed("update_user")
     def update_user(self, user_id, **kwargs):
         """
         Updates a user's information based on the user ID.
@@ -138,13 +316,16 @@ class ManageUsers:
         **kwargs: Attributes to update (e.g., name, location).
         """
         try:
-            user = next((u for u in self.users if u.user_id == user_id), None)
+            with self.user_locks.lock_for(user_id):
+                user = self.users.get(user_id)
+                if user:
+                    if 'name' in kwargs:
+                        user.name = kwargs['name']
+                    user.additional_attributes.update({k: v for k, v in kwargs.items() if k != 'name'})
+                    self.users.update(user)
             if user:
-                if 'name' in kwargs:
-                    user.name = kwargs['name']
-                user.additional_attributes.update({k: v for k, v in kwargs.items() if k != 'name'})
-                self.storage.save_users(self.users)
-                self.logger.log(f"Updated user: {user}")
+                self.user_writer.write(user_id, ("save", user))
+                self.logger.log(f"Updated user: {user}", event="update_user", user_id=user_id)
                 print(f"User updated: {user}")
             else:
                 print(f"User with ID {user_id} not found.")
@@ -152,6 +333,7 @@ class ManageUsers:
             print(f"An error occurred while updating the user: {e}")
             self.logger.log(f"Error while updating user: {e}")
 
+    @timed("delete_user")
     def delete_user(self, user_id):
         """
         Deletes a user from the system based on the user ID.
@@ -160,11 +342,11 @@ class ManageUsers:
         user_id (str): The ID of the user to delete.
         """
         try:
-            user = next((u for u in self.users if u.user_id == user_id), None)
+            with self.user_locks.lock_for(user_id):
+                user = self.users.remove(user_id)
             if user:
-                self.users.remove(user)
-                self.storage.save_users(self.users)
-                self.logger.log(f"Deleted user: {user}")
+                self.user_writer.write(user_id, ("remove", user))
+                self.logger.log(f"Deleted user: {user}", event="delete_user", user_id=user_id)
                 print(f"User deleted: {user}")
             else:
                 print(f"User with ID {user_id} not found.")